@@ -15,6 +15,9 @@ from sentry_sdk.integrations.flask import FlaskIntegration
 
 from config import config
 from app.repositories.user_repository import UserRepository
+from app.repositories.mongo import MongoConnectionManager
+from app.services.import_jobs import ImportJobRunner
+from app.services.model_service import model_service
 from app.security.encryption import EncryptionService, init_encryption_service
 from app.utils.logging_config import setup_logging
 
@@ -93,6 +96,9 @@ def create_app(config_name='development'):
     
     # Initialize repositories
     user_repo = UserRepository()
+    MongoConnectionManager(app)
+    ImportJobRunner(app)
+    model_service.init_app(app)
     
     # Setup login manager user loader
     @login_manager.user_loader
@@ -1,19 +1,29 @@
 """
 API v1 routes
 """
-from flask import request, jsonify
+from flask import request, jsonify, current_app, Response, stream_with_context, url_for
 from flask_login import login_required, current_user
 from app.blueprints.api.v1 import api_bp
-from app.repositories.patient_repository import PatientRepository
-from app.services.patient_service import PatientService
+from werkzeug.local import LocalProxy
+from pymongo.errors import PyMongoError
+from app.repositories.mongo import get_patient_repository, get_import_job_repository, get_query_executor
+from app.repositories.import_job_repository import serialize_job
+from app.repositories.user_repository import ADMIN_ROLE
+from app.repositories.patient_repository import DATASET_FIELDS, search_window
+from app.services.patient_service import PatientService, IMPORT_MODES, BULK_SUCCESS_STATUSES
+from app.services.import_jobs import get_import_jobs
+from app.services.model_service import model_service, ModelUnavailableError
+from app.utils.export import ndjson_lines, csv_lines
+from app.utils.import_readers import import_format
 from app.security.rate_limit import rate_limit_api
 import jwt
 from datetime import datetime, timedelta
 from functools import wraps
 
-# Initialize services
-patient_repo = PatientRepository()
-patient_service = PatientService(patient_repo)
+# Initialize services (the repository resolves to the app-scoped connection)
+patient_repo = LocalProxy(get_patient_repository)
+patient_service = PatientService(patient_repo, executor=LocalProxy(get_query_executor))
+import_job_repo = LocalProxy(get_import_job_repository)
 
 # Limiter will be initialized in app factory
 limiter = None
@@ -25,6 +35,11 @@ def init_limiter(app):
     from flask_limiter.util import get_remote_address
     limiter = Limiter(app=app, key_func=get_remote_address)
 
+def parse_fields():
+    """Parse the comma-separated ``fields`` query parameter"""
+    fields = request.args.get('fields', '')
+    return [field.strip() for field in fields.split(',') if field.strip()] or None
+
 def jwt_required(f):
     """JWT authentication decorator"""
     @wraps(f)
@@ -40,6 +55,7 @@ def jwt_required(f):
             # Store in request for use in route handlers
             request.current_user_id = payload['user_id']
             request.current_username = payload['username']
+            request.current_user_role = payload.get('role')
         except jwt.ExpiredSignatureError:
             return jsonify({'error': 'Token has expired'}), 401
         except (jwt.InvalidTokenError, Exception) as e:
@@ -75,6 +91,7 @@ def api_login():
         token = jwt.encode({
             'user_id': user.id,
             'username': user.username,
+            'role': user.role,
             'exp': expiration,
             'iat': datetime.utcnow()
         }, secret, algorithm='HS256')
@@ -95,11 +112,27 @@ def api_login():
 @api_bp.route('/patients', methods=['GET'])
 @jwt_required
 def api_list_patients():
-    """Get all patients (paginated)"""
+    """
+    Get all patients (paginated)
+    
+    Pass the ``next_cursor``/``prev_cursor`` values from a previous response
+    as ``after``/``before`` to page through results. ``page`` is still
+    accepted for offset pagination but gets slower on deep pages.
+    ``fields`` takes a comma-separated list of fields to return and ``count``
+    (exact, estimated, cached or none) chooses how ``total`` is computed.
+    """
     page = request.args.get('page', 1, type=int)
     per_page = min(request.args.get('per_page', 20, type=int), 100)
+    after = request.args.get('after')
+    before = request.args.get('before')
+    count = request.args.get('count') or current_app.config.get('API_COUNT_STRATEGY', 'cached')
     
-    patients, total = patient_service.get_patients(page, per_page)
+    try:
+        patients, total, page_info = patient_service.get_patients(
+            page, per_page, after=after, before=before, fields=parse_fields(), count=count
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     
     return jsonify({
         'success': True,
@@ -108,7 +141,10 @@ def api_list_patients():
             'page': page,
             'per_page': per_page,
             'total': total,
-            'pages': (total + per_page - 1) // per_page
+            'pages': (total + per_page - 1) // per_page if total is not None else None,
+            'has_next': page_info['has_next'],
+            'next_cursor': page_info['next'],
+            'prev_cursor': page_info['prev']
         }
     }), 200
 
@@ -116,7 +152,10 @@ def api_list_patients():
 @jwt_required
 def api_get_patient(patient_id):
     """Get patient by ID"""
-    patient = patient_service.get_patient(patient_id)
+    try:
+        patient = patient_service.get_patient(patient_id, fields=parse_fields())
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     
     if not patient:
         return jsonify({'success': False, 'error': 'Patient not found'}), 404
@@ -171,25 +210,306 @@ def api_delete_patient(patient_id):
     else:
         return jsonify({'success': False, 'error': message}), 404
 
+def bulk_items(key):
+    """
+    Get the list of items under ``key`` in a bulk request's JSON body
+    
+    Returns:
+        Tuple of (items, error response); one of them is None
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get(key) if isinstance(data, dict) else None
+    limit = current_app.config.get('API_BULK_MAX_ITEMS', 1000)
+    if not isinstance(items, list) or not items:
+        return None, (jsonify({'success': False, 'error': f"'{key}' must be a non-empty list"}), 400)
+    if len(items) > limit:
+        return None, (jsonify({'success': False, 'error': f"At most {limit} items per request"}), 400)
+    return items, None
+
+def bulk_response(results, success_statuses=BULK_SUCCESS_STATUSES):
+    """Respond with per-item results and a count of each status"""
+    summary = {}
+    for result in results:
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+    return jsonify({
+        'success': all(result['status'] in success_statuses for result in results),
+        'summary': summary,
+        'results': results
+    }), 200
+
+@api_bp.route('/patients/bulk', methods=['POST'])
+@jwt_required
+def api_bulk_create_patients():
+    """
+    Create many patients at once
+    
+    Takes JSON ``{"patients": [...]}``. Every item gets a result with its
+    index and status; invalid or duplicate items don't stop the others.
+    """
+    items, error = bulk_items('patients')
+    if error:
+        return error
+    results = patient_service.bulk_create_patients(items, request.current_username)
+    return bulk_response(results)
+
+@api_bp.route('/patients/bulk', methods=['PATCH'])
+@jwt_required
+def api_bulk_update_patients():
+    """
+    Update many patients at once
+    
+    Takes JSON ``{"patients": [{"patient_id": ..., <fields to change>}, ...]}``.
+    """
+    items, error = bulk_items('patients')
+    if error:
+        return error
+    results = patient_service.bulk_update_patients(items, request.current_username)
+    return bulk_response(results)
+
+@api_bp.route('/patients/bulk', methods=['DELETE'])
+@jwt_required
+def api_bulk_delete_patients():
+    """
+    Delete many patients at once
+    
+    Takes JSON ``{"patient_ids": [...]}``.
+    """
+    patient_ids, error = bulk_items('patient_ids')
+    if error:
+        return error
+    results = patient_service.bulk_delete_patients(patient_ids, request.current_username)
+    return bulk_response(results)
+
 @api_bp.route('/patients/search', methods=['GET'])
 @jwt_required
 def api_search_patients():
-    """Search patients"""
+    """Search patients (ranked, paginated)"""
     query = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page, _ = search_window(page, request.args.get('per_page', 20, type=int))
     
     if not query:
         return jsonify({'success': False, 'error': 'Search query required'}), 400
     
-    results = patient_service.search_patients(query)
+    try:
+        results, total = patient_service.search_patients(query, page, per_page, fields=parse_fields())
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     for patient in results:
         patient['_id'] = str(patient['_id'])
     
     return jsonify({
         'success': True,
         'data': results,
-        'count': len(results)
+        'count': len(results),
+        'pagination': {
+            'page': page,
+            'per_page': per_page,
+            'total': total,
+            'pages': (total + per_page - 1) // per_page
+        }
     }), 200
 
+@api_bp.route('/patients/export', methods=['GET'])
+@jwt_required
+def api_export_patients():
+    """
+    Stream patients as NDJSON or CSV
+    
+    Accepts ``format`` (ndjson or csv), the search ``q`` filter and ``fields``.
+    Rows are streamed from a database cursor, so exports of any size run
+    in constant memory.
+    """
+    export_format = request.args.get('format', 'ndjson').lower()
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({'success': False, 'error': 'Format must be ndjson or csv'}), 400
+    
+    query = request.args.get('q', '').strip() or None
+    fields = parse_fields()
+    
+    try:
+        patients = patient_service.export_patients(
+            query, fields, batch_size=current_app.config.get('EXPORT_BATCH_SIZE', 1000)
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except PyMongoError as e:
+        current_app.logger.error(f"Export query failed: {str(e)}")
+        return jsonify({'success': False, 'error': 'Export is unavailable, try again later'}), 503
+    
+    if export_format == 'csv':
+        body = csv_lines(patients, fields or DATASET_FIELDS)
+        mimetype = 'text/csv'
+    else:
+        body = ndjson_lines(patients)
+        mimetype = 'application/x-ndjson'
+    
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=patients.{export_format}'}
+    )
+
+@api_bp.route('/patients/import', methods=['POST'])
+@jwt_required
+def api_import_patients():
+    """
+    Start a background import of an uploaded CSV, Parquet or Arrow file
+    
+    Takes a multipart ``file`` and an optional ``mode`` (insert or upsert).
+    Responds straight away with a job id to poll at ``/imports/<job_id>``.
+    """
+    file = request.files.get('file')
+    if not file or file.filename == '':
+        return jsonify({'success': False, 'error': 'No file selected'}), 400
+    if import_format(file.filename) is None:
+        return jsonify({'success': False, 'error': 'Only CSV, Parquet or Arrow files are allowed'}), 400
+    
+    try:
+        job_id = get_import_jobs().submit_upload(
+            file, request.current_username, request.form.get('mode', 'insert')
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status_url': url_for('api.api_get_import', job_id=job_id)
+    }), 202
+
+def import_job_owner():
+    """Username whose import jobs the requester may see, or None (all jobs) for admins"""
+    return None if request.current_user_role == ADMIN_ROLE else request.current_username
+
+@api_bp.route('/imports', methods=['GET'])
+@jwt_required
+def api_list_imports():
+    """List the requester's recent import jobs (every user's for admins)"""
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    jobs = [serialize_job(job) for job in import_job_repo.list_jobs(limit=limit, username=import_job_owner())]
+    return jsonify({'success': True, 'data': jobs}), 200
+
+@api_bp.route('/imports/<job_id>', methods=['GET'])
+@jwt_required
+def api_get_import(job_id):
+    """Get an import job's status, progress and row errors"""
+    job = import_job_repo.get_job(job_id, username=import_job_owner())
+    if not job:
+        return jsonify({'success': False, 'error': 'Import job not found'}), 404
+    return jsonify({'success': True, 'data': serialize_job(job)}), 200
+
+def get_upload_session(upload_id):
+    """
+    Get a chunked upload session owned by the requesting user
+    
+    Returns:
+        Tuple of (session, error response); one of them is None
+    """
+    session = get_import_jobs().uploads.get(upload_id)
+    if not session or session['created_by'] != request.current_username:
+        return None, (jsonify({'success': False, 'error': 'Upload not found'}), 404)
+    return session, None
+
+@api_bp.route('/uploads', methods=['POST'])
+@jwt_required
+def api_create_upload():
+    """
+    Start a resumable chunked upload of a CSV, Parquet or Arrow file
+    
+    Takes JSON with ``filename``, an optional ``mode`` (insert or upsert) and
+    an optional ``sha256`` of the whole file, checked once it is assembled.
+    Parts are then sent with PUT to ``/uploads/<upload_id>/parts/<number>``.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'error': 'A JSON object is required'}), 400
+    filename = data.get('filename', '')
+    mode = data.get('mode', 'insert')
+    sha256 = data.get('sha256')
+    if not isinstance(filename, str) or not isinstance(mode, str):
+        return jsonify({'success': False, 'error': 'filename and mode must be strings'}), 400
+    if sha256 is not None and not isinstance(sha256, str):
+        return jsonify({'success': False, 'error': 'sha256 must be a hex SHA-256 digest'}), 400
+    if import_format(filename) is None:
+        return jsonify({'success': False, 'error': 'Only CSV, Parquet or Arrow files are allowed'}), 400
+    if mode not in IMPORT_MODES:
+        return jsonify({'success': False, 'error': f"Import mode must be one of: {', '.join(IMPORT_MODES)}"}), 400
+    
+    runner = get_import_jobs()
+    try:
+        session = runner.uploads.create(filename, request.current_username, mode, sha256)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    return jsonify({
+        'success': True,
+        'upload_id': session['upload_id'],
+        'part_size': runner.part_size,
+        'max_parts': runner.uploads.max_parts,
+        'upload_url': url_for('api.api_get_upload', upload_id=session['upload_id'])
+    }), 201
+
+@api_bp.route('/uploads/<upload_id>', methods=['GET'])
+@jwt_required
+def api_get_upload(upload_id):
+    """Get an upload's received parts, to find where to resume"""
+    session, error = get_upload_session(upload_id)
+    if error:
+        return error
+    return jsonify({'success': True, 'data': session}), 200
+
+@api_bp.route('/uploads/<upload_id>/parts/<int:part_number>', methods=['PUT'])
+@jwt_required
+def api_upload_part(upload_id, part_number):
+    """
+    Store one part of a chunked upload
+    
+    The raw request body is the part and the ``X-Content-SHA256`` header its
+    hex digest. Parts are streamed to disk and can be re-sent to retry.
+    """
+    session, error = get_upload_session(upload_id)
+    if error:
+        return error
+    
+    try:
+        part = get_import_jobs().uploads.write_part(
+            upload_id, part_number, request.stream, request.headers.get('X-Content-SHA256', '')
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    return jsonify({'success': True, 'data': part}), 200
+
+@api_bp.route('/uploads/<upload_id>/complete', methods=['POST'])
+@jwt_required
+def api_complete_upload(upload_id):
+    """Assemble a chunked upload and start its background import"""
+    session, error = get_upload_session(upload_id)
+    if error:
+        return error
+    
+    try:
+        job_id = get_import_jobs().submit_chunked(upload_id, request.current_username)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status_url': url_for('api.api_get_import', job_id=job_id)
+    }), 202
+
+@api_bp.route('/uploads/<upload_id>', methods=['DELETE'])
+@jwt_required
+def api_abort_upload(upload_id):
+    """Abandon a chunked upload and delete its parts"""
+    session, error = get_upload_session(upload_id)
+    if error:
+        return error
+    get_import_jobs().uploads.abort(upload_id)
+    return jsonify({'success': True, 'message': 'Upload deleted'}), 200
+
 @api_bp.route('/statistics', methods=['GET'])
 @jwt_required
 def api_statistics():
@@ -197,3 +517,34 @@ def api_statistics():
     stats = patient_service.get_statistics()
     return jsonify({'success': True, 'data': stats}), 200
 
+@api_bp.route('/predict/batch', methods=['POST'])
+@jwt_required
+def api_predict_batch():
+    """
+    Predict stroke risk for many patients with one model call
+    
+    Takes JSON ``{"patients": [{"gender": ..., "age": ..., ...}, ...]}``
+    with the same features as the single prediction form. Items that can't
+    be scored are reported as invalid without failing the rest.
+    """
+    items, error = bulk_items('patients')
+    if error:
+        return error
+    try:
+        results = model_service.predict_batch(items)
+    except ModelUnavailableError as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+    except Exception as e:
+        current_app.logger.exception("Batch prediction error")
+        return jsonify({'success': False, 'error': f"Prediction failed: {str(e)}"}), 500
+    return bulk_response(results, success_statuses=('predicted',))
+
+@api_bp.route('/predict/cache', methods=['GET'])
+@jwt_required
+def api_prediction_cache():
+    """Get the prediction cache's size, hit/miss counters and evictions"""
+    stats = model_service.cache_stats()
+    if stats is None:
+        return jsonify({'success': False, 'error': 'Prediction cache is disabled'}), 404
+    return jsonify({'success': True, 'data': stats}), 200
+
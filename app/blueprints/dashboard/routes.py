@@ -4,9 +4,10 @@ Dashboard routes
 from flask import render_template
 from flask_login import login_required
 from app.blueprints.dashboard import dashboard_bp
-from app.repositories.patient_repository import PatientRepository
+from werkzeug.local import LocalProxy
+from app.repositories.mongo import get_patient_repository
 
-patient_repo = PatientRepository()
+patient_repo = LocalProxy(get_patient_repository)
 
 @dashboard_bp.route('/')
 @login_required
@@ -19,5 +20,8 @@ def index():
                          stroke_patients=stats.get('stroke_patients', 0),
                          male_count=stats.get('male_count', 0),
                          female_count=stats.get('female_count', 0),
-                         average_age=stats.get('average_age', 0))
+                         average_age=stats.get('average_age', 0),
+                         by_work_type=stats.get('by_work_type', {}),
+                         by_smoking_status=stats.get('by_smoking_status', {}),
+                         by_residence_type=stats.get('by_residence_type', {}))
 
@@ -1,22 +1,29 @@
 """
 Patient management routes
 """
-from flask import render_template, request, redirect, url_for, flash, jsonify, Blueprint
+from flask import render_template, request, redirect, url_for, flash, jsonify, Blueprint, current_app, abort
 from flask_login import login_required, current_user
+from werkzeug.local import LocalProxy
 from app.blueprints.patients import patients_bp
-from app.repositories.patient_repository import PatientRepository
+from app.repositories.mongo import get_patient_repository, get_import_job_repository, get_query_executor
+from app.repositories.import_job_repository import serialize_job
 from app.services.patient_service import PatientService
 from app.security.rate_limit import rate_limit_crud, rate_limit_search, rate_limit_import
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-import pandas as pd
-from app.services.model_service import model_service
+from app.services.import_jobs import get_import_jobs
+from app.utils.import_readers import import_format
+from app.services.model_service import model_service, ModelUnavailableError
 from app import csrf 
 
 
-# Initialize services
-patient_repo = PatientRepository()
-patient_service = PatientService(patient_repo)
+# Initialize services (the repository resolves to the app-scoped connection)
+patient_repo = LocalProxy(get_patient_repository)
+patient_service = PatientService(patient_repo, executor=LocalProxy(get_query_executor))
+import_job_repo = LocalProxy(get_import_job_repository)
+
+# Columns rendered by the patient list and search result tables
+LIST_VIEW_FIELDS = ['id', 'gender', 'age', 'hypertension', 'heart_disease', 'work_type', 'bmi', 'stroke']
 
 # Limiter will be initialized in app factory
 limiter = None
@@ -32,16 +39,24 @@ def init_limiter(app):
 @login_required
 def list_patients():
     """View all patients"""
-    page = request.args.get('page', 1, type=int)
+    after = request.args.get('after')
+    before = request.args.get('before')
     per_page = 20
     
-    patients, total = patient_service.get_patients(page, per_page)
-    total_pages = (total + per_page - 1) // per_page
+    try:
+        patients, total, cursors = patient_service.get_patients(
+            per_page=per_page, after=after, before=before, fields=LIST_VIEW_FIELDS,
+            count=current_app.config.get('PATIENT_LIST_COUNT_STRATEGY', 'estimated')
+        )
+    except ValueError as e:
+        flash(str(e), 'warning')
+        return redirect(url_for('patients.list_patients'))
     
     return render_template('patients.html',
                          patients=patients,
-                         page=page,
-                         total_pages=total_pages)
+                         total=total,
+                         next_cursor=cursors['next'],
+                         prev_cursor=cursors['prev'])
 
 @patients_bp.route('/add', methods=['GET', 'POST'])
 @login_required
@@ -147,16 +162,24 @@ def search():
     if not query:
         return redirect(url_for('patients.list_patients'))
     
-    results = patient_service.search_patients(query)
+    page = request.args.get('page', 1, type=int)
+    per_page = 20
+    
+    results, total = patient_service.search_patients(query, page, per_page, fields=LIST_VIEW_FIELDS)
     for patient in results:
         patient['_id'] = str(patient['_id'])
     
-    return render_template('search_results.html', patients=results, query=query)
+    return render_template('search_results.html',
+                         patients=results,
+                         query=query,
+                         total=total,
+                         page=page,
+                         total_pages=(total + per_page - 1) // per_page)
 
 @patients_bp.route('/import', methods=['GET', 'POST'])
 @login_required
 def import_data():
-    """Import CSV data into MongoDB"""
+    """Start a background import of CSV, Parquet or Arrow data into MongoDB"""
     if request.method == 'POST':
         if 'file' not in request.files:
             flash('No file selected.', 'danger')
@@ -167,29 +190,45 @@ def import_data():
             flash('No file selected.', 'danger')
             return redirect(url_for('patients.import_data'))
         
-        if not file.filename.endswith('.csv'):
-            flash('Only CSV files are allowed.', 'danger')
+        if import_format(file.filename) is None:
+            flash('Only CSV, Parquet or Arrow files are allowed.', 'danger')
             return redirect(url_for('patients.import_data'))
         
         try:
-            # Read CSV
-            df = pd.read_csv(file)
-            
-            # Convert to dict and import
-            records = df.to_dict('records')
-            success, message, count = patient_service.import_patients(records, current_user.username)
-            
-            if success:
-                flash(message, 'success')
-                return redirect(url_for('patients.list_patients'))
-            else:
-                flash(message, 'danger')
-                return redirect(url_for('patients.import_data'))
+            # Spool the upload and import it in the background
+            mode = 'upsert' if request.form.get('upsert') else 'insert'
+            job_id = get_import_jobs().submit_upload(file, current_user.username, mode)
+            flash('Import started. This page updates as rows are imported.', 'info')
+            return redirect(url_for('patients.import_status', job_id=job_id))
         except Exception as e:
             flash(f'Error importing data: {str(e)}', 'danger')
             return redirect(url_for('patients.import_data'))
     
-    return render_template('import_data.html')
+    jobs = [serialize_job(job) for job in import_job_repo.list_jobs(limit=10, username=import_job_owner())]
+    return render_template('import_data.html', jobs=jobs)
+
+def import_job_owner():
+    """Username whose import jobs the current user may see, or None (all jobs) for admins"""
+    return None if current_user.is_admin else current_user.username
+
+@patients_bp.route('/import/<job_id>')
+@login_required
+def import_status(job_id):
+    """Show the progress of an import job"""
+    job = import_job_repo.get_job(job_id, username=import_job_owner())
+    if not job:
+        # Also for other users' jobs, so their ids can't be probed
+        abort(404)
+    return render_template('import_job.html', job=serialize_job(job))
+
+@patients_bp.route('/import/<job_id>/status')
+@login_required
+def import_status_json(job_id):
+    """Get an import job's progress as JSON (polled by the job page)"""
+    job = import_job_repo.get_job(job_id, username=import_job_owner())
+    if not job:
+        return jsonify({'success': False, 'error': 'Import job not found'}), 404
+    return jsonify({'success': True, 'data': serialize_job(job)})
 
 
 
@@ -214,6 +253,8 @@ def predict_patient():
     try:
         result = model_service.predict_proba(data)
         return jsonify(result)
+    except ModelUnavailableError as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         current_app.logger.exception("Prediction error")
         return jsonify({'error': str(e)}), 500
@@ -221,8 +262,7 @@ def predict_patient():
 # Example UI action: predict for an existing patient by _id
 @patients_bp.route('/<patient_id>/predict', methods=['POST'])
 def predict_for_patient(patient_id):
-    repo = PatientRepository()
-    patient = repo.get_by_id(patient_id)
+    patient = patient_service.get_patient(patient_id)
     if not patient:
         flash("Patient not found", "danger")
         return redirect(url_for('patients.list_patients'))
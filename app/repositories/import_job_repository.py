@@ -0,0 +1,171 @@
+"""
+Import job repository for MongoDB operations
+"""
+from pymongo import MongoClient, IndexModel
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional, Any
+from bson.objectid import ObjectId
+import pymongo
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Job lifecycle: queued -> running -> succeeded | failed
+JOB_STATUSES = ('queued', 'running', 'succeeded', 'failed')
+UNFINISHED_STATUSES = ('queued', 'running')
+
+INTERRUPTED_MESSAGE = 'Import interrupted: the server stopped before it finished. Please import the file again.'
+
+IMPORT_JOB_INDEXES = [
+    IndexModel([('created_at', pymongo.DESCENDING)], name='created_at_-1'),
+    # A user's recent jobs (list_jobs with a username)
+    IndexModel([('created_by', pymongo.ASCENDING), ('created_at', pymongo.DESCENDING)],
+               name='created_by_1_created_at_-1'),
+]
+
+def serialize_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Get a job document in API form (string ``id`` instead of ``_id``)"""
+    job = dict(job)
+    job['id'] = str(job.pop('_id'))
+    return job
+
+class ImportJobRepository:
+    """Repository for background import jobs"""
+
+    def __init__(self, uri='mongodb://localhost:27017/', db_name='stroke_prediction_db',
+                 client: Optional[MongoClient] = None):
+        """
+        Initialize MongoDB connection
+
+        Args:
+            uri: MongoDB URI, used only when no client is given
+            db_name: Database name
+            client: Shared client to borrow. If omitted, the repository opens
+                and owns its own client.
+        """
+        try:
+            self._owns_client = client is None
+            self.client = MongoClient(uri, serverSelectionTimeoutMS=5000) if client is None else client
+            self.db = self.client[db_name]
+            self.jobs = self.db['import_jobs']
+
+            if self._owns_client:
+                self.client.server_info()
+        except Exception as e:
+            logger.error(f"Error connecting to MongoDB: {str(e)}")
+            raise
+
+    def create_indexes(self):
+        """Build the indexes declared in ``IMPORT_JOB_INDEXES``"""
+        self.jobs.create_indexes(IMPORT_JOB_INDEXES)
+
+    def create_job(self, filename: str, mode: str, username: str) -> str:
+        """
+        Record a new queued import job
+
+        Returns:
+            The job id
+        """
+        result = self.jobs.insert_one({
+            'status': 'queued',
+            'filename': filename,
+            'mode': mode,
+            'created_by': username,
+            'created_at': datetime.now(),
+            'updated_at': datetime.now(),
+            'started_at': None,
+            'finished_at': None,
+            'message': None,
+            'progress': {},
+            'errors': []
+        })
+        logger.info(f"Import job created: {result.inserted_id} by {username}")
+        return str(result.inserted_id)
+
+    def mark_running(self, job_id: str):
+        """Mark a job as started"""
+        self.jobs.update_one(
+            {'_id': ObjectId(job_id)},
+            {'$set': {'status': 'running', 'started_at': datetime.now(), 'updated_at': datetime.now()}}
+        )
+
+    def update_progress(self, job_id: str, totals: Dict[str, Any]):
+        """Store a job's running totals (row errors are kept separately)"""
+        progress = {key: value for key, value in totals.items() if key != 'errors'}
+        self.jobs.update_one(
+            {'_id': ObjectId(job_id)},
+            {'$set': {'progress': progress, 'errors': totals.get('errors', []), 'updated_at': datetime.now()}}
+        )
+
+    def touch_jobs(self, job_ids: List[str]):
+        """Refresh ``updated_at`` of unfinished jobs, to show the process running them is alive"""
+        self.jobs.update_many(
+            {'_id': {'$in': [ObjectId(job_id) for job_id in job_ids]},
+             'status': {'$in': list(UNFINISHED_STATUSES)}},
+            {'$set': {'updated_at': datetime.now()}}
+        )
+
+    def finish_job(self, job_id: str, success: bool, message: str, profile: Optional[Dict[str, Any]] = None):
+        """Mark a job as succeeded or failed with its summary message and stage profile"""
+        self.jobs.update_one(
+            {'_id': ObjectId(job_id)},
+            {'$set': {
+                'status': 'succeeded' if success else 'failed',
+                'message': message,
+                'profile': profile,
+                'finished_at': datetime.now()
+            }}
+        )
+        logger.info(f"Import job finished: {job_id} ({'succeeded' if success else 'failed'})")
+
+    def fail_interrupted_jobs(self, idle_seconds: float) -> int:
+        """
+        Mark queued or running jobs that stopped making progress as failed
+
+        Jobs live in the memory of the process that queued them, so a job
+        left unfinished by a restart would otherwise report 'queued' or
+        'running' forever. The process running a job refreshes its
+        ``updated_at`` with a heartbeat (see ``touch_jobs``), so only jobs
+        whose process has stopped go idle for ``idle_seconds``; jobs other
+        app processes are still running or queueing are left alone.
+
+        Returns:
+            Number of jobs marked failed
+        """
+        cutoff = datetime.now() - timedelta(seconds=idle_seconds)
+        result = self.jobs.update_many(
+            {'status': {'$in': list(UNFINISHED_STATUSES)}, '$or': [
+                {'updated_at': {'$lt': cutoff}},
+                # Jobs recorded before updated_at was set on creation
+                {'updated_at': {'$exists': False}, 'created_at': {'$lt': cutoff}}
+            ]},
+            {'$set': {'status': 'failed', 'message': INTERRUPTED_MESSAGE, 'finished_at': datetime.now()}}
+        )
+        if result.modified_count:
+            logger.warning(f"Marked {result.modified_count} interrupted import jobs as failed")
+        return result.modified_count
+
+    def get_job(self, job_id: str, username: Optional[str] = None) -> Optional[Dict]:
+        """Get a job by id, optionally only if ``username`` started it"""
+        try:
+            query = {'_id': ObjectId(job_id)}
+            if username:
+                query['created_by'] = username
+            return self.jobs.find_one(query)
+        except Exception as e:
+            logger.error(f"Error fetching import job: {str(e)}")
+            return None
+
+    def list_jobs(self, limit: int = 20, username: Optional[str] = None) -> List[Dict]:
+        """Get the most recent jobs, optionally only those started by ``username``"""
+        query = {'created_by': username} if username else {}
+        try:
+            return list(self.jobs.find(query, {'errors': 0}).sort('created_at', pymongo.DESCENDING).limit(limit))
+        except Exception as e:
+            logger.error(f"Error fetching import jobs: {str(e)}")
+            return []
+
+    def close(self):
+        """Close MongoDB connection (borrowed clients are left open)"""
+        if self._owns_client:
+            self.client.close()
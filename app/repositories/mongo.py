@@ -0,0 +1,138 @@
+"""
+App-scoped MongoDB connection manager
+"""
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from flask import current_app
+from pymongo import MongoClient
+
+from app.repositories.patient_repository import PatientRepository
+from app.repositories.import_job_repository import ImportJobRepository
+
+logger = logging.getLogger(__name__)
+
+class MongoConnectionManager:
+    """
+    Owns the single MongoClient (and its connection pool) for an app
+    
+    Repositories borrow the shared client instead of opening their own,
+    so each worker process holds one pool regardless of how many
+    blueprints use the database.
+    
+    Independent queries of one request (e.g. a page and its total count)
+    can run concurrently on the manager's ``query_executor`` thread pool,
+    which shares the same client and connection pool.
+    """
+    
+    def __init__(self, app=None):
+        self.client: Optional[MongoClient] = None
+        self.db_name: Optional[str] = None
+        self.count_cache_ttl = 10.0
+        self.ensure_indexes = False
+        self.query_workers = 8
+        self._patient_repo: Optional[PatientRepository] = None
+        self._import_job_repo: Optional[ImportJobRepository] = None
+        self._query_executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        """Create the shared client from the app configuration"""
+        config = app.config
+        self.client = MongoClient(
+            config['MONGO_URI'],
+            maxPoolSize=config.get('MONGO_MAX_POOL_SIZE', 100),
+            minPoolSize=config.get('MONGO_MIN_POOL_SIZE', 0),
+            serverSelectionTimeoutMS=config.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000),
+            connectTimeoutMS=config.get('MONGO_CONNECT_TIMEOUT_MS', 10000),
+            socketTimeoutMS=config.get('MONGO_SOCKET_TIMEOUT_MS'),
+            compressors=config.get('MONGO_COMPRESSORS') or None,
+            # Defer connecting until first use so forked workers don't inherit sockets
+            connect=False
+        )
+        self.db_name = config['MONGO_DB_NAME']
+        self.count_cache_ttl = config.get('COUNT_CACHE_TTL', 10.0)
+        self.ensure_indexes = config.get('MONGO_ENSURE_INDEXES', False)
+        self.query_workers = config.get('MONGO_QUERY_WORKERS', 8)
+        self._patient_repo = None
+        self._import_job_repo = None
+        app.extensions['mongo'] = self
+        logger.info("MongoDB connection manager initialized")
+    
+    @property
+    def patient_repository(self) -> PatientRepository:
+        """Get the patient repository bound to the shared client"""
+        if self._patient_repo is None:
+            with self._lock:
+                if self._patient_repo is None:
+                    repo = PatientRepository(
+                        db_name=self.db_name, client=self.client, count_cache_ttl=self.count_cache_ttl
+                    )
+                    if self.ensure_indexes:
+                        # Convenience for development; deployments run scripts/manage_indexes.py
+                        repo.create_indexes()
+                    else:
+                        self._check_search_index(repo)
+                    self._patient_repo = repo
+        return self._patient_repo
+    
+    @property
+    def import_job_repository(self) -> ImportJobRepository:
+        """Get the import job repository bound to the shared client"""
+        if self._import_job_repo is None:
+            with self._lock:
+                if self._import_job_repo is None:
+                    repo = ImportJobRepository(db_name=self.db_name, client=self.client)
+                    if self.ensure_indexes:
+                        repo.create_indexes()
+                    self._import_job_repo = repo
+        return self._import_job_repo
+    
+    @property
+    def query_executor(self) -> ThreadPoolExecutor:
+        """Thread pool for running a request's independent queries concurrently"""
+        if self._query_executor is None:
+            with self._lock:
+                if self._query_executor is None:
+                    self._query_executor = ThreadPoolExecutor(
+                        max_workers=self.query_workers, thread_name_prefix='mongo-query'
+                    )
+        return self._query_executor
+    
+    @staticmethod
+    def _check_search_index(repo: PatientRepository):
+        """Warn if the text search index hasn't been built (indexes are left to deploy time)"""
+        try:
+            if not repo.has_search_index():
+                # Search still works, by substring, until the index exists
+                logger.warning("Text index 'patient_text_search' is missing; "
+                               "run scripts/manage_indexes.py to build it")
+        except Exception as e:
+            logger.warning(f"Could not check the patient search index: {str(e)}")
+    
+    def close(self):
+        """Close the shared client, its pool and the query thread pool"""
+        if self.client is not None:
+            self.client.close()
+        if self._query_executor is not None:
+            self._query_executor.shutdown(wait=False)
+        logger.info("MongoDB connection manager closed")
+
+def get_mongo() -> MongoConnectionManager:
+    """Get the connection manager for the current app"""
+    return current_app.extensions['mongo']
+
+def get_patient_repository() -> PatientRepository:
+    """Get the app-scoped patient repository"""
+    return get_mongo().patient_repository
+
+def get_import_job_repository() -> ImportJobRepository:
+    """Get the app-scoped import job repository"""
+    return get_mongo().import_job_repository
+
+def get_query_executor() -> ThreadPoolExecutor:
+    """Get the app-scoped thread pool for concurrent queries"""
+    return get_mongo().query_executor
@@ -1,63 +1,438 @@
 """
 Patient repository for MongoDB operations
 """
-from pymongo import MongoClient
+from pymongo import MongoClient, IndexModel, UpdateOne
+from concurrent.futures import Executor
 from datetime import datetime
-from typing import List, Dict, Optional, Any
+from functools import partial
+from typing import List, Dict, Optional, Any, Iterable, Iterator
+from bson import json_util
 from bson.objectid import ObjectId
+from pymongo.errors import BulkWriteError, OperationFailure
+import numbers
+import re
+import pymongo
 import logging
 
+from app.utils.cache import TTLCache
+from app.utils.pagination import encode_cursor, keyset_query
+
 logger = logging.getLogger(__name__)
 
+# Categorical fields broken down in the statistics, keyed by result name
+STATISTICS_BREAKDOWNS = {
+    'by_gender': 'gender',
+    'by_work_type': 'work_type',
+    'by_smoking_status': 'smoking_status',
+    'by_residence_type': 'Residence_type'
+}
+
+# Columns of the source stroke dataset, in CSV order
+DATASET_FIELDS = [
+    'id', 'gender', 'age', 'hypertension', 'heart_disease', 'ever_married',
+    'work_type', 'Residence_type', 'avg_glucose_level', 'bmi', 'smoking_status', 'stroke'
+]
+
+# Fields that may be requested in a projection
+PATIENT_FIELDS = DATASET_FIELDS + [
+    'email', 'created_at', 'created_by', 'updated_at', 'updated_by',
+    'imported_at', 'imported_by'
+]
+
+# How totals are counted for pagination:
+#   exact     - count_documents on every call
+#   estimated - collection metadata for unfiltered counts, exact otherwise
+#   cached    - exact count reused for COUNT_CACHE_TTL seconds
+#   none      - no total; callers rely on "has next page" instead
+COUNT_STRATEGIES = ('exact', 'estimated', 'cached', 'none')
+
+# Fields covered by the text index used for patient search
+SEARCH_FIELDS = ['gender', 'work_type', 'smoking_status', 'Residence_type']
+
+# Upper bounds on search result pages and on how deep search can page
+SEARCH_MAX_PER_PAGE = 100
+SEARCH_RESULT_LIMIT = 1000
+
+# Text search relevance projection and ranking
+TEXT_SCORE = {'$meta': 'textScore'}
+TEXT_SEARCH_SORT = [('score', TEXT_SCORE), ('_id', pymongo.DESCENDING)]
+
+# Order of substring matches, which have no relevance score
+SUBSTRING_SEARCH_SORT = [('_id', pymongo.DESCENDING)]
+
+# Server error code for a $text query on a collection without a text index
+INDEX_NOT_FOUND = 27
+
+# search_patients / export with q=: $text over the categorical fields
+TEXT_SEARCH_INDEX = IndexModel([(field, pymongo.TEXT) for field in SEARCH_FIELDS],
+                               name='patient_text_search', default_language='none')
+
+# Indexes on the patients collection, one per query shape they serve.
+# Built by create_indexes (see scripts/manage_indexes.py), not on every connection;
+# the app only checks that the text search index exists (has_search_index).
+PATIENT_INDEXES = [
+    # get_patient_by_record_id, ID search, duplicate-ID protection on import
+    IndexModel([('id', pymongo.ASCENDING)], name='id_1', unique=True),
+    # get_patients_page / get_all_patients: sort on created_at, keyset range on (created_at, _id)
+    IndexModel([('created_at', pymongo.DESCENDING), ('_id', pymongo.DESCENDING)],
+               name='created_at_-1__id_-1'),
+    TEXT_SEARCH_INDEX,
+]
+
+# _id of the materialized statistics document in the patient_stats collection
+STATISTICS_DOC_ID = 'patients'
+
+# Fields an upsert import only writes when it creates the document
+UPSERT_INSERT_ONLY_FIELDS = ('_id', 'created_at', 'imported_at', 'imported_by')
+
+def statistics_delta(patient: Dict[str, Any], sign: int = 1) -> Dict[str, float]:
+    """
+    Get the counter increments contributed by a single patient
+    
+    Args:
+        patient: Patient document
+        sign: 1 when the patient is added, -1 when it is removed
+    """
+    delta = {'total': sign}
+    if patient.get('stroke') == 1:
+        delta['stroke'] = sign
+    age = patient.get('age')
+    if isinstance(age, numbers.Real) and not isinstance(age, bool):
+        delta['age_sum'] = sign * float(age)
+        delta['age_count'] = sign
+    for name, field in STATISTICS_BREAKDOWNS.items():
+        value = patient.get(field)
+        if value is not None:
+            # Counter keys are document paths, so dots cannot appear in them
+            delta[f"{name}.{str(value).replace('.', '_')}"] = sign
+    return delta
+
+def build_projection(fields: Optional[Iterable[str]]) -> Optional[Dict[str, int]]:
+    """
+    Build a MongoDB projection that returns only the given fields
+    
+    Returns None (whole documents) when no fields are given.
+    
+    Raises:
+        ValueError: if a field is not a known patient field
+    """
+    if not fields:
+        return None
+    unknown = [field for field in fields if field not in PATIENT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return {field: 1 for field in fields}
+
+def search_filter(search_query: str) -> Dict[str, Any]:
+    """
+    Build the MongoDB filter for a search query
+    
+    Numeric queries match the record ID; anything else uses the text index.
+    """
+    try:
+        return {'id': int(search_query)}
+    except ValueError:
+        return text_search_filter(search_query)
+
+def text_search_filter(search_query: str) -> Dict[str, Any]:
+    """Build a ``$text`` filter matching whole words of the search fields"""
+    return {'$text': {'$search': search_query}}
+
+def substring_search_filter(search_query: str) -> Dict[str, Any]:
+    """Build a filter matching the query anywhere in a search field, ignoring case"""
+    pattern = re.escape(search_query)
+    return {'$or': [{field: {'$regex': pattern, '$options': 'i'}} for field in SEARCH_FIELDS]}
+
+def search_find_args(query: Dict[str, Any],
+                     projection: Optional[Dict[str, int]]) -> tuple[Optional[Dict[str, int]], List[tuple]]:
+    """
+    Get the projection and sort for a page of search results
+    
+    Text matches are ranked by relevance; substring matches newest first.
+    
+    Returns:
+        (projection, sort)
+    """
+    if '$text' in query:
+        return {**(projection or {}), 'score': TEXT_SCORE}, TEXT_SEARCH_SORT
+    return projection, SUBSTRING_SEARCH_SORT
+
+def finish_search_results(results: List[Dict]) -> List[Dict]:
+    """Convert ``_id`` to a string and drop the relevance score of each result"""
+    for patient in results:
+        patient['_id'] = str(patient['_id'])
+        patient.pop('score', None)
+    return results
+
+def is_missing_text_index(error: Exception) -> bool:
+    """Whether ``error`` is the server rejecting ``$text`` for lack of a text index"""
+    return isinstance(error, OperationFailure) and error.code == INDEX_NOT_FOUND
+
+def search_window(page: int, per_page: int) -> tuple[int, int]:
+    """
+    Clamp search paging arguments
+    
+    Returns:
+        (per_page, skip)
+    """
+    per_page = max(1, min(per_page, SEARCH_MAX_PER_PAGE))
+    return per_page, (max(page, 1) - 1) * per_page
+
+def merge_statistics_deltas(*deltas: Dict[str, float]) -> Dict[str, float]:
+    """Sum several counter increments into one, dropping zero entries"""
+    merged = {}
+    for delta in deltas:
+        for key, value in delta.items():
+            merged[key] = merged.get(key, 0) + value
+    return {key: value for key, value in merged.items() if value != 0}
+
+def keyset_page_query(after: Optional[str], before: Optional[str],
+                      projection: Optional[Dict[str, int]]) -> tuple[Dict, List, Optional[Dict[str, int]]]:
+    """
+    Build the filter, sort and projection for a keyset page
+    
+    Returns:
+        (query, sort, projection)
+    
+    Raises:
+        ValueError: if a cursor token is malformed
+    """
+    if before:
+        query = keyset_query(before, 'before')
+        sort = [('created_at', pymongo.ASCENDING), ('_id', pymongo.ASCENDING)]
+    else:
+        query = keyset_query(after, 'after') if after else {}
+        sort = [('created_at', pymongo.DESCENDING), ('_id', pymongo.DESCENDING)]
+    
+    # created_at is needed to build cursors even if the caller didn't ask for it
+    if projection is not None and 'created_at' not in projection:
+        projection = {**projection, 'created_at': 1}
+    return query, sort, projection
+
+def finish_keyset_page(patients: List[Dict], limit: int, after: Optional[str], before: Optional[str],
+                       projection: Optional[Dict[str, int]]) -> tuple[List[Dict], Optional[str], Optional[str]]:
+    """
+    Turn the ``limit + 1`` documents fetched for a keyset page into a page
+    
+    Returns:
+        (patients, next_cursor, prev_cursor)
+    """
+    has_more = len(patients) > limit
+    patients = patients[:limit]
+    
+    if before:
+        patients.reverse()
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, bool(after)
+    
+    next_cursor = encode_cursor(patients[-1]) if patients and has_next else None
+    prev_cursor = encode_cursor(patients[0]) if patients and has_prev else None
+    
+    strip_created_at = projection is not None and 'created_at' not in projection
+    for patient in patients:
+        patient['_id'] = str(patient['_id'])
+        if strip_created_at:
+            patient.pop('created_at', None)
+    return patients, next_cursor, prev_cursor
+
+def count_cache_key(query: Optional[Dict]) -> str:
+    """Get a stable cache key for a count query"""
+    return json_util.dumps(query or {}, sort_keys=True)
+
+def statistics_pipeline() -> List[Dict[str, Any]]:
+    """
+    Get the aggregation computing all statistics counters
+    
+    A single ``$facet`` stage produces every counter, so the collection is
+    scanned once rather than once per figure.
+    """
+    facets = {
+        'totals': [
+            {'$group': {
+                '_id': None,
+                'total': {'$sum': 1},
+                'stroke': {'$sum': {'$cond': [{'$eq': ['$stroke', 1]}, 1, 0]}},
+                'age_sum': {'$sum': '$age'},
+                'age_count': {'$sum': {'$cond': [{'$isNumber': '$age'}, 1, 0]}}
+            }}
+        ]
+    }
+    for name, field in STATISTICS_BREAKDOWNS.items():
+        facets[name] = [{'$group': {'_id': f'${field}', 'count': {'$sum': 1}}}]
+    return [{'$facet': facets}]
+
+def counters_from_facets(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert the ``statistics_pipeline`` output into stored counters"""
+    totals = result.get('totals') or [{}]
+    counters = {
+        'total': totals[0].get('total', 0),
+        'stroke': totals[0].get('stroke', 0),
+        'age_sum': totals[0].get('age_sum', 0),
+        'age_count': totals[0].get('age_count', 0)
+    }
+    for name in STATISTICS_BREAKDOWNS:
+        counters[name] = {
+            str(bucket['_id']).replace('.', '_'): bucket['count']
+            for bucket in result.get(name, [])
+            if bucket['_id'] is not None
+        }
+    return counters
+
+def format_statistics(counters: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert stored counters into the statistics returned to callers"""
+    age_count = counters.get('age_count', 0)
+    stats = {
+        'total_patients': counters.get('total', 0),
+        'stroke_patients': counters.get('stroke', 0),
+        'average_age': round(counters.get('age_sum', 0) / age_count, 2) if age_count else 0
+    }
+    for name in STATISTICS_BREAKDOWNS:
+        stats[name] = {
+            value: count
+            for value, count in counters.get(name, {}).items()
+            if count > 0
+        }
+    stats['male_count'] = stats['by_gender'].get('Male', 0)
+    stats['female_count'] = stats['by_gender'].get('Female', 0)
+    return stats
+
+def _plan_stages(plan: Any) -> List[str]:
+    """Collect every stage name in an explain plan tree"""
+    stages = []
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            stages.append(plan['stage'])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(_plan_stages(item))
+    return stages
+
 class PatientRepository:
     """Repository for patient data operations"""
     
-    def __init__(self, uri='mongodb://localhost:27017/', db_name='stroke_prediction_db'):
-        """Initialize MongoDB connection"""
+    def __init__(self, uri='mongodb://localhost:27017/', db_name='stroke_prediction_db',
+                 client: Optional[MongoClient] = None, count_cache_ttl: float = 10.0):
+        """
+        Initialize MongoDB connection
+        
+        Args:
+            uri: MongoDB URI, used only when no client is given
+            db_name: Database name
+            client: Shared client to borrow (e.g. from MongoConnectionManager).
+                If omitted, the repository opens and owns its own client.
+            count_cache_ttl: Seconds a count is reused by the 'cached' strategy
+        """
+        self._count_cache = TTLCache(maxsize=256, ttl=count_cache_ttl)
         try:
-            self.client = MongoClient(uri, serverSelectionTimeoutMS=5000)
+            self._owns_client = client is None
+            self.client = MongoClient(uri, serverSelectionTimeoutMS=5000) if client is None else client
             self.db = self.client[db_name]
             self.patients = self.db['patients']
+            self.stats = self.db['patient_stats']
             
             # Test connection
-            self.client.server_info()
-            
-            # Create indexes
-            self.create_indexes()
+            if self._owns_client:
+                self.client.server_info()
             
             logger.info("MongoDB connection established successfully")
         except Exception as e:
             logger.error(f"Error connecting to MongoDB: {str(e)}")
             raise
     
-    def create_indexes(self):
-        """Create indexes for better query performance"""
-        try:
-            self.patients.create_index('id', unique=True)
-            self.patients.create_index('gender')
-            self.patients.create_index('stroke')
-            self.patients.create_index('age')
-            self.patients.create_index('work_type')
-            self.patients.create_index('smoking_status')
-            logger.info("MongoDB indexes created successfully")
-        except Exception as e:
-            logger.error(f"Error creating indexes: {str(e)}")
+    def create_indexes(self, drop_unmanaged: bool = False) -> List[str]:
+        """
+        Build the indexes declared in ``PATIENT_INDEXES``
+        
+        Intended to run once at deploy time. Existing indexes with the same
+        definition are left untouched.
+        
+        Args:
+            drop_unmanaged: Also drop indexes that are not declared (e.g. the
+                single-field indexes older versions created)
+        
+        Returns:
+            Names of the indexes dropped
+        """
+        self.patients.create_indexes(PATIENT_INDEXES)
+        logger.info("MongoDB indexes created successfully")
+        
+        dropped = []
+        if drop_unmanaged:
+            managed = {index.document['name'] for index in PATIENT_INDEXES} | {'_id_'}
+            for name in self.patients.index_information():
+                if name not in managed:
+                    self.patients.drop_index(name)
+                    dropped.append(name)
+                    logger.info(f"Dropped unmanaged index: {name}")
+        return dropped
+    
+    def has_search_index(self) -> bool:
+        """Whether the text index ranked search depends on exists (it is built by create_indexes)"""
+        return TEXT_SEARCH_INDEX.document['name'] in self.patients.index_information()
+    
+    def query_shapes(self) -> List[Dict[str, Any]]:
+        """
+        Get a representative example of each query the repository issues
+        
+        Filters are built with the same helpers the read methods use, so the
+        shapes stay in step with the code.
+        """
+        sample = {'_id': ObjectId(), 'created_at': datetime.now()}
+        listing_sort = [('created_at', pymongo.DESCENDING), ('_id', pymongo.DESCENDING)]
+        return [
+            {'name': 'get_patient_by_record_id', 'filter': {'id': 1}, 'sort': None},
+            {'name': 'get_patients_page (first page)', 'filter': {}, 'sort': listing_sort},
+            {'name': 'get_patients_page (after cursor)',
+             'filter': keyset_query(encode_cursor(sample), 'after'), 'sort': listing_sort},
+            {'name': 'get_all_patients (offset)', 'filter': {}, 'sort': [('created_at', pymongo.DESCENDING)]},
+            {'name': 'search_patients (id)', 'filter': search_filter('1'), 'sort': None},
+            {'name': 'search_patients (text)', 'filter': search_filter('Private'), 'sort': None},
+            {'name': 'search_patients (substring)', 'filter': substring_search_filter('Priv'),
+             'sort': SUBSTRING_SEARCH_SORT},
+            {'name': 'iter_patients (export)', 'filter': {}, 'sort': [('_id', pymongo.ASCENDING)]},
+        ]
+    
+    def explain_query_shapes(self) -> List[Dict[str, Any]]:
+        """
+        Run ``explain()`` on every query shape and report the plan stages
+        
+        Returns:
+            One entry per shape with 'name', 'stages' and 'collscan' (True
+            if the winning plan scans the whole collection)
+        """
+        report = []
+        for shape in self.query_shapes():
+            cursor = self.patients.find(shape['filter']).limit(20)
+            if shape['sort']:
+                cursor = cursor.sort(shape['sort'])
+            plan = cursor.explain().get('queryPlanner', {}).get('winningPlan', {})
+            stages = _plan_stages(plan)
+            report.append({
+                'name': shape['name'],
+                'stages': stages,
+                'collscan': 'COLLSCAN' in stages
+            })
+        return report
     
     def insert_patient(self, patient_data: Dict[str, Any]) -> str:
         """Insert a new patient record"""
         try:
             patient_data['created_at'] = datetime.now()
             result = self.patients.insert_one(patient_data)
+            self._count_cache.clear()
             logger.info(f"Patient inserted: ID {patient_data.get('id')}")
             return str(result.inserted_id)
         except Exception as e:
             logger.error(f"Error inserting patient: {str(e)}")
             raise
     
-    def get_patient_by_id(self, patient_id: str) -> Optional[Dict]:
+    def get_patient_by_id(self, patient_id: str, projection: Optional[Dict[str, int]] = None) -> Optional[Dict]:
         """Get patient by database ID (ObjectId)"""
         try:
-            return self.patients.find_one({'_id': ObjectId(patient_id)})
+            return self.patients.find_one({'_id': ObjectId(patient_id)}, projection)
         except Exception as e:
             logger.error(f"Error fetching patient: {str(e)}")
             return None
@@ -88,16 +463,62 @@ class PatientRepository:
         """Delete patient record"""
         try:
             result = self.patients.delete_one({'_id': ObjectId(patient_id)})
+            self._count_cache.clear()
             logger.info(f"Patient deleted: {patient_id}")
             return result.deleted_count
         except Exception as e:
             logger.error(f"Error deleting patient: {str(e)}")
             raise
     
-    def get_all_patients(self, skip: int = 0, limit: int = 20) -> List[Dict]:
+    def find_record_ids(self, record_ids: List[int]) -> set:
+        """Get which of ``record_ids`` already exist, in one ``$in`` query"""
+        cursor = self.patients.find({'id': {'$in': record_ids}}, {'id': 1, '_id': 0})
+        return {patient['id'] for patient in cursor}
+    
+    def get_patients_by_record_ids(self, record_ids: List[int]) -> Dict[int, Dict]:
+        """Get patients by record ID in one ``$in`` query, keyed by record ID"""
+        return {patient['id']: patient for patient in self.patients.find({'id': {'$in': record_ids}})}
+    
+    def get_patients_by_ids(self, patient_ids: List[str]) -> Dict[str, Dict]:
+        """Get patients by database ID in one ``$in`` query, keyed by ID string"""
+        cursor = self.patients.find({'_id': {'$in': [ObjectId(patient_id) for patient_id in patient_ids]}})
+        return {str(patient['_id']): patient for patient in cursor}
+    
+    def bulk_write(self, operations: List[Any]) -> tuple[Dict[str, int], Dict[int, Dict[str, Any]]]:
+        """
+        Apply write operations in one unordered ``bulk_write``
+        
+        Operations that fail don't stop the others.
+        
+        Returns:
+            (counts, errors) where counts has 'inserted', 'matched', 'modified'
+            and 'deleted', and errors maps operation index to its write error
+        """
+        try:
+            details = self.patients.bulk_write(operations, ordered=False).bulk_api_result
+        except BulkWriteError as e:
+            details = e.details
+        except Exception as e:
+            logger.error(f"Error in bulk write: {str(e)}")
+            raise
+        finally:
+            self._count_cache.clear()
+        
+        counts = {
+            'inserted': details['nInserted'],
+            'matched': details['nMatched'],
+            'modified': details['nModified'],
+            'deleted': details['nRemoved']
+        }
+        errors = {error['index']: error for error in details.get('writeErrors', [])}
+        logger.info(f"Bulk write: {counts}, {len(errors)} errors")
+        return counts, errors
+    
+    def get_all_patients(self, skip: int = 0, limit: int = 20,
+                         projection: Optional[Dict[str, int]] = None) -> List[Dict]:
         """Get all patients with pagination"""
         try:
-            patients = list(self.patients.find().skip(skip).limit(limit).sort('created_at', -1))
+            patients = list(self.patients.find({}, projection).skip(skip).limit(limit).sort('created_at', -1))
             # Convert ObjectId to string for JSON serialization
             for patient in patients:
                 patient['_id'] = str(patient['_id'])
@@ -106,9 +527,74 @@ class PatientRepository:
             logger.error(f"Error fetching patients: {str(e)}")
             return []
     
-    def count_patients(self, query: Optional[Dict] = None) -> int:
-        """Count total patients"""
+    def get_patients_page(self, limit: int = 20, after: Optional[str] = None,
+                          before: Optional[str] = None,
+                          projection: Optional[Dict[str, int]] = None) -> tuple[List[Dict], Optional[str], Optional[str]]:
+        """
+        Get a page of patients using keyset (cursor) pagination
+        
+        Pages are ordered by ``created_at`` then ``_id`` (both descending), so
+        each page is an index range scan whose cost does not depend on depth.
+        
+        Returns:
+            (patients, next_cursor, prev_cursor)
+        
+        Raises:
+            ValueError: if a cursor token is malformed
+        """
+        query, sort, fetch_projection = keyset_page_query(after, before, projection)
+        try:
+            # Fetch one extra document to learn whether another page exists
+            patients = list(self.patients.find(query, fetch_projection).sort(sort).limit(limit + 1))
+        except Exception as e:
+            logger.error(f"Error fetching patients page: {str(e)}")
+            return [], None, None
+        return finish_keyset_page(patients, limit, after, before, projection)
+    
+    def iter_patients(self, query: Optional[Dict] = None, projection: Optional[Dict[str, int]] = None,
+                      batch_size: int = 1000) -> Iterator[Dict]:
+        """
+        Stream patients matching a query without loading them all
+        
+        Documents are pulled from the server ``batch_size`` at a time, so
+        memory use stays constant however many documents match.
+        """
+        cursor = self.patients.find(query or {}, projection, batch_size=batch_size).sort('_id', pymongo.ASCENDING)
+        try:
+            for patient in cursor:
+                patient['_id'] = str(patient['_id'])
+                yield patient
+        finally:
+            cursor.close()
+    
+    def count_patients(self, query: Optional[Dict] = None, strategy: str = 'exact') -> Optional[int]:
+        """
+        Count total patients
+        
+        Args:
+            query: Filter to count, or None for the whole collection
+            strategy: One of ``COUNT_STRATEGIES``
+        
+        Returns:
+            The count, or None for the 'none' strategy
+        """
+        if strategy not in COUNT_STRATEGIES:
+            raise ValueError(f"Count strategy must be one of: {', '.join(COUNT_STRATEGIES)}")
+        if strategy == 'none':
+            return None
+        
         try:
+            if strategy == 'estimated' and not query:
+                return self.patients.estimated_document_count()
+            
+            if strategy == 'cached':
+                key = count_cache_key(query)
+                count = self._count_cache.get(key)
+                if count is None:
+                    count = self.patients.count_documents(query or {})
+                    self._count_cache.set(key, count)
+                return count
+            
             if query:
                 return self.patients.count_documents(query)
             return self.patients.count_documents({})
@@ -116,68 +602,137 @@ class PatientRepository:
             logger.error(f"Error counting patients: {str(e)}")
             return 0
     
-    def search_patients(self, search_query: str) -> List[Dict]:
-        """Search patients by various criteria"""
-        try:
-            # Try to search by ID first
-            try:
-                patient_id = int(search_query)
-                results = list(self.patients.find({'id': patient_id}))
-                if results:
-                    for patient in results:
-                        patient['_id'] = str(patient['_id'])
-                    return results
-            except ValueError:
-                pass
-            
-            # Text search
-            query = {
-                '$or': [
-                    {'gender': {'$regex': search_query, '$options': 'i'}},
-                    {'work_type': {'$regex': search_query, '$options': 'i'}},
-                    {'smoking_status': {'$regex': search_query, '$options': 'i'}},
-                    {'Residence_type': {'$regex': search_query, '$options': 'i'}}
-                ]
-            }
-            results = list(self.patients.find(query))
-            for patient in results:
-                patient['_id'] = str(patient['_id'])
-            return results
+    def resolve_search_filter(self, search_query: str) -> Dict[str, Any]:
+        """
+        Pick the filter a search query is answered with
+        
+        Numeric queries match the record ID when a record has it. Otherwise
+        the text index is used if it matches anything; when it doesn't (e.g.
+        a partial word such as "smok") or the index is missing, the fields
+        are matched by case-insensitive substring instead. Search and export
+        both resolve their filter here, so they select the same patients.
+        
+        Raises:
+            OperationFailure: if a query fails for any other reason
+        """
+        query = search_filter(search_query)
+        if 'id' in query and self.patients.count_documents(query, limit=1):
+            return query
+        
+        query = text_search_filter(search_query)
+        try:
+            if self.patients.count_documents(query, limit=1):
+                return query
+        except OperationFailure as e:
+            if not is_missing_text_index(e):
+                raise
+            logger.warning("Text index 'patient_text_search' is missing; searching by substring")
+        return substring_search_filter(search_query)
+    
+    def search_patients(self, search_query: str, page: int = 1, per_page: int = 20,
+                        projection: Optional[Dict[str, int]] = None,
+                        executor: Optional[Executor] = None) -> tuple[List[Dict], int]:
+        """
+        Search patients by various criteria
+        
+        The filter is chosen by ``resolve_search_filter``. Text matches are
+        ranked by relevance and substring matches listed newest first; both
+        are paginated and capped at ``SEARCH_RESULT_LIMIT``. With an
+        ``executor`` the total is counted on it while the page is fetched.
+        
+        Returns:
+            (patients, total)
+        """
+        per_page, skip = search_window(page, per_page)
+        try:
+            query = self.resolve_search_filter(search_query)
+            if 'id' in query:
+                results = list(self.patients.find(query, projection))
+                return finish_search_results(results), len(results)
+            return self._search_page(query, skip, per_page, projection, executor)
         except Exception as e:
             logger.error(f"Error searching patients: {str(e)}")
-            return []
+            raise
+    
+    def _search_page(self, query: Dict[str, Any], skip: int, per_page: int,
+                     projection: Optional[Dict[str, int]],
+                     executor: Optional[Executor] = None) -> tuple[List[Dict], int]:
+        """Get one page of matches for a search filter and their capped total"""
+        count = partial(self.patients.count_documents, query, limit=SEARCH_RESULT_LIMIT)
+        # The count round trip overlaps with fetching the page
+        pending_total = executor.submit(count) if executor is not None else None
+        
+        results = []
+        if skip < SEARCH_RESULT_LIMIT:
+            fetch_projection, sort = search_find_args(query, projection)
+            results = list(
+                self.patients.find(query, fetch_projection)
+                .sort(sort)
+                .skip(skip)
+                .limit(min(per_page, SEARCH_RESULT_LIMIT - skip))
+            )
+        total = pending_total.result() if pending_total is not None else count()
+        return finish_search_results(results), min(total, SEARCH_RESULT_LIMIT)
+    
+    def compute_statistics(self) -> Dict[str, Any]:
+        """Compute raw statistics counters from the patients collection"""
+        result = next(self.patients.aggregate(statistics_pipeline()), {})
+        return counters_from_facets(result)
+    
+    def rebuild_statistics(self) -> Dict[str, Any]:
+        """Recompute the materialized statistics document from scratch"""
+        counters = self.compute_statistics()
+        counters['rebuilt_at'] = datetime.now()
+        self.stats.replace_one({'_id': STATISTICS_DOC_ID}, counters, upsert=True)
+        logger.info("Patient statistics rebuilt")
+        return counters
+    
+    def increment_statistics(self, delta: Dict[str, float]) -> bool:
+        """
+        Atomically apply counter increments to the statistics document
+        
+        Nothing is written if the document does not exist yet; it will be
+        built in full on the next read.
+        """
+        if not delta:
+            return True
+        try:
+            result = self.stats.update_one({'_id': STATISTICS_DOC_ID}, {'$inc': delta})
+            return result.matched_count > 0
+        except Exception as e:
+            logger.error(f"Error updating statistics: {str(e)}")
+            return False
+    
+    def invalidate_statistics(self):
+        """Drop the statistics document so the next read rebuilds it"""
+        try:
+            self.stats.delete_one({'_id': STATISTICS_DOC_ID})
+        except Exception as e:
+            logger.error(f"Error invalidating statistics: {str(e)}")
     
     def get_statistics(self) -> Dict[str, Any]:
-        """Get database statistics"""
+        """
+        Get database statistics
+        
+        Reads the incrementally maintained statistics document, building it
+        first if it does not exist.
+        """
         try:
-            total = self.count_patients()
-            stroke_patients = self.count_patients({'stroke': 1})
-            male_count = self.count_patients({'gender': 'Male'})
-            female_count = self.count_patients({'gender': 'Female'})
-            
-            # Average age
-            pipeline = [
-                {'$group': {'_id': None, 'avg_age': {'$avg': '$age'}}}
-            ]
-            avg_age_result = list(self.patients.aggregate(pipeline))
-            avg_age = avg_age_result[0]['avg_age'] if avg_age_result else 0
-            
-            return {
-                'total_patients': total,
-                'stroke_patients': stroke_patients,
-                'male_count': male_count,
-                'female_count': female_count,
-                'average_age': round(avg_age, 2)
-            }
+            counters = self.stats.find_one({'_id': STATISTICS_DOC_ID})
+            if counters is None:
+                counters = self.rebuild_statistics()
         except Exception as e:
             logger.error(f"Error getting statistics: {str(e)}")
             return {}
+        return format_statistics(counters)
     
     def bulk_insert_patients(self, patients_list: List[Dict]) -> int:
         """Bulk insert patient records"""
         try:
             for patient in patients_list:
                 patient['imported_at'] = datetime.now()
+                patient.setdefault('created_at', patient['imported_at'])
+            self._count_cache.clear()
             result = self.patients.insert_many(patients_list, ordered=False)
             logger.info(f"Bulk inserted {len(result.inserted_ids)} patients")
             return len(result.inserted_ids)
@@ -185,8 +740,55 @@ class PatientRepository:
             logger.error(f"Error bulk inserting patients: {str(e)}")
             raise
     
+    def upsert_patients(self, patients_list: List[Dict]) -> Dict[str, Any]:
+        """
+        Insert or update patient records keyed on their record ``id``
+        
+        Stored documents whose fields already match are left untouched, so
+        re-importing the same rows is cheap and reports them as unchanged.
+        
+        Returns:
+            Counts of 'inserted', 'updated' and 'unchanged' rows, and the
+            positions in ``patients_list`` of inserted rows as 'inserted_positions'
+        """
+        try:
+            now = datetime.now()
+            operations = []
+            for patient in patients_list:
+                fields = {key: value for key, value in patient.items() if key not in UPSERT_INSERT_ONLY_FIELDS}
+                operations.append(UpdateOne(
+                    {'id': patient['id']},
+                    {
+                        '$set': fields,
+                        '$setOnInsert': {
+                            'created_at': patient.get('created_at', now),
+                            'imported_at': now,
+                            'imported_by': patient.get('imported_by')
+                        }
+                    },
+                    upsert=True
+                ))
+            self._count_cache.clear()
+            result = self.patients.bulk_write(operations, ordered=False)
+            counts = {
+                'inserted': result.upserted_count,
+                'updated': result.modified_count,
+                'unchanged': result.matched_count - result.modified_count,
+                'inserted_positions': sorted(result.upserted_ids)
+            }
+            logger.info(
+                f"Upserted patients: {counts['inserted']} inserted, "
+                f"{counts['updated']} updated, {counts['unchanged']} unchanged"
+            )
+            return counts
+        except Exception as e:
+            logger.error(f"Error upserting patients: {str(e)}")
+            raise
+    
     def close(self):
-        """Close MongoDB connection"""
+        """Close MongoDB connection (borrowed clients are left open)"""
+        if not self._owns_client:
+            return
         try:
             self.client.close()
             logger.info("MongoDB connection closed")
@@ -9,6 +9,9 @@ from flask_login import UserMixin
 
 logger = logging.getLogger(__name__)
 
+# Role allowed to see every user's data (e.g. all import jobs)
+ADMIN_ROLE = 'admin'
+
 class User(UserMixin):
     """User model for Flask-Login"""
     
@@ -37,6 +40,11 @@ class User(UserMixin):
         """Set user active status"""
         self._is_active = bool(value)
     
+    @property
+    def is_admin(self):
+        """Check if user has the admin role"""
+        return self.role == ADMIN_ROLE
+    
     def is_authenticated(self):
         """Check if user is authenticated"""
         return self.is_active
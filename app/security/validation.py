@@ -2,9 +2,12 @@
 Input validation and sanitization utilities
 """
 import re
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Iterator, Optional
 import logging
 
+import numpy as np
+import pandas as pd
+
 logger = logging.getLogger(__name__)
 
 def validate_email(email: str) -> bool:
@@ -32,6 +35,31 @@ def sanitize_input(data: str) -> str:
             .replace("'", '&#x27;')
             .replace('/', '&#x2F;'))
 
+# Allowed values for patient fields
+VALID_GENDERS = ['Male', 'Female', 'Other']
+BINARY_VALUES = ['0', '1']
+EVER_MARRIED_VALUES = ['Yes', 'No']
+VALID_WORK_TYPES = ['Children', 'Govt_job', 'Never_worked', 'Private', 'Self-employed']
+RESIDENCE_TYPES = ['Rural', 'Urban']
+VALID_SMOKING_STATUSES = ['formerly smoked', 'never smoked', 'smokes', 'Unknown']
+_SMOKING_STATUSES_LOWER = frozenset(status.lower() for status in VALID_SMOKING_STATUSES)
+
+# Patient validation messages, in the order validate_patient_data reports them
+AGE_RANGE_ERROR = "Age must be between 0 and 120"
+AGE_NUMBER_ERROR = "Age must be a valid number"
+GENDER_ERROR = f"Gender must be one of: {', '.join(VALID_GENDERS)}"
+HYPERTENSION_ERROR = "Hypertension must be 0 or 1"
+HEART_DISEASE_ERROR = "Heart disease must be 0 or 1"
+EVER_MARRIED_ERROR = "Ever married must be Yes or No"
+WORK_TYPE_ERROR = f"Work type must be one of: {', '.join(VALID_WORK_TYPES)}"
+RESIDENCE_TYPE_ERROR = "Residence type must be Rural or Urban"
+GLUCOSE_RANGE_ERROR = "Average glucose level must be between 0 and 500"
+GLUCOSE_NUMBER_ERROR = "Average glucose level must be a valid number"
+BMI_RANGE_ERROR = "BMI must be between 0 and 100"
+BMI_NUMBER_ERROR = "BMI must be a valid number"
+SMOKING_STATUS_ERROR = f"Smoking status must be one of: {', '.join(VALID_SMOKING_STATUSES)}"
+STROKE_ERROR = "Stroke must be 0 or 1"
+
 def validate_patient_data(data: Dict[str, Any]) -> List[str]:
     """Validate patient data fields"""
     errors = []
@@ -40,67 +68,197 @@ def validate_patient_data(data: Dict[str, Any]) -> List[str]:
     try:
         age = float(data.get('age', 0))
         if age < 0 or age > 120:
-            errors.append("Age must be between 0 and 120")
+            errors.append(AGE_RANGE_ERROR)
     except (ValueError, TypeError):
-        errors.append("Age must be a valid number")
+        errors.append(AGE_NUMBER_ERROR)
     
     # Validate gender
-    valid_genders = ['Male', 'Female', 'Other']
-    if data.get('gender') not in valid_genders:
-        errors.append(f"Gender must be one of: {', '.join(valid_genders)}")
+    if data.get('gender') not in VALID_GENDERS:
+        errors.append(GENDER_ERROR)
     
     # Validate hypertension
     hypertension = data.get('hypertension')
-    if str(hypertension) not in ['0', '1']:
-        errors.append("Hypertension must be 0 or 1")
+    if str(hypertension) not in BINARY_VALUES:
+        errors.append(HYPERTENSION_ERROR)
     
     # Validate heart_disease
     heart_disease = data.get('heart_disease')
-    if str(heart_disease) not in ['0', '1']:
-        errors.append("Heart disease must be 0 or 1")
+    if str(heart_disease) not in BINARY_VALUES:
+        errors.append(HEART_DISEASE_ERROR)
     
     # Validate ever_married
-    if data.get('ever_married') not in ['Yes', 'No']:
-        errors.append("Ever married must be Yes or No")
+    if data.get('ever_married') not in EVER_MARRIED_VALUES:
+        errors.append(EVER_MARRIED_ERROR)
     
     # Validate work_type
-    valid_work_types = ['Children', 'Govt_job', 'Never_worked', 'Private', 'Self-employed']
-    if data.get('work_type') not in valid_work_types:
-        errors.append(f"Work type must be one of: {', '.join(valid_work_types)}")
+    if data.get('work_type') not in VALID_WORK_TYPES:
+        errors.append(WORK_TYPE_ERROR)
     
     # Validate residence_type
-    if data.get('Residence_type') not in ['Rural', 'Urban']:
-        errors.append("Residence type must be Rural or Urban")
+    if data.get('Residence_type') not in RESIDENCE_TYPES:
+        errors.append(RESIDENCE_TYPE_ERROR)
     
     # Validate avg_glucose_level
     try:
         glucose = float(data.get('avg_glucose_level', 0))
         if glucose < 0 or glucose > 500:
-            errors.append("Average glucose level must be between 0 and 500")
+            errors.append(GLUCOSE_RANGE_ERROR)
     except (ValueError, TypeError):
-        errors.append("Average glucose level must be a valid number")
+        errors.append(GLUCOSE_NUMBER_ERROR)
     
     # Validate BMI
     try:
         bmi = float(data.get('bmi', 0))
         if bmi < 0 or bmi > 100:
-            errors.append("BMI must be between 0 and 100")
+            errors.append(BMI_RANGE_ERROR)
     except (ValueError, TypeError):
-        errors.append("BMI must be a valid number")
+        errors.append(BMI_NUMBER_ERROR)
     
     # Validate smoking_status
-    valid_smoking = ['formerly smoked', 'never smoked', 'smokes', 'Unknown']
     smoking_status = data.get('smoking_status', '').lower()
-    if smoking_status not in [s.lower() for s in valid_smoking]:
-        errors.append(f"Smoking status must be one of: {', '.join(valid_smoking)}")
+    if smoking_status not in _SMOKING_STATUSES_LOWER:
+        errors.append(SMOKING_STATUS_ERROR)
     
     # Validate stroke
     stroke = data.get('stroke')
-    if str(stroke) not in ['0', '1']:
-        errors.append("Stroke must be 0 or 1")
+    if str(stroke) not in BINARY_VALUES:
+        errors.append(STROKE_ERROR)
     
     return errors
 
+def _map_values(values: np.ndarray, func: Callable[[Any], Any], dtype) -> np.ndarray:
+    """
+    Apply a scalar function to every value of an object column
+    
+    Strings are factorized first so ``func`` runs once per distinct value;
+    missing values are passed through individually so None and NaN keep
+    their own results.
+    """
+    result = np.empty(len(values), dtype=dtype)
+    kind = pd.api.types.infer_dtype(values, skipna=True)
+    if kind not in ('string', 'empty'):
+        result[:] = [func(value) for value in values]
+        return result
+    
+    missing = pd.isna(values)
+    codes, uniques = pd.factorize(values[~missing])
+    table = np.empty(len(uniques), dtype=dtype)
+    table[:] = [func(value) for value in uniques]
+    result[~missing] = table[codes]
+    if missing.any():
+        result[missing] = [func(value) for value in values[missing]]
+    return result
+
+def _frame_column(frame: pd.DataFrame, field: str, default: Any) -> np.ndarray:
+    """Values of a column, or ``default`` for every row if it is absent (like dict.get)"""
+    if field in frame.columns:
+        column = frame[field]
+        if isinstance(column.dtype, np.dtype) and column.dtype.kind in 'biuf':
+            return column.to_numpy()
+        return column.to_numpy(dtype=object)
+    values = np.empty(len(frame), dtype=object)
+    values[:] = [default] * len(frame)
+    return values
+
+def _to_float(value: Any) -> Optional[float]:
+    """float(value), or None if it can't be converted"""
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+def _range_errors(values: np.ndarray, low: float, high: float) -> tuple[np.ndarray, np.ndarray]:
+    """Masks of (out of range, not a number) for a numeric field"""
+    if values.dtype.kind in 'biuf':
+        numbers = values.astype(float)
+        not_a_number = np.zeros(len(values), dtype=bool)
+    else:
+        parsed = _map_values(values, _to_float, object)
+        not_a_number = np.equal(parsed, None).astype(bool)
+        numbers = np.where(not_a_number, np.nan, parsed).astype(float)
+    # NaN compares False both ways, matching float('nan') in the row validator
+    with np.errstate(invalid='ignore'):
+        out_of_range = (numbers < low) | (numbers > high)
+    return out_of_range, not_a_number
+
+def _binary_errors(values: np.ndarray) -> np.ndarray:
+    """Mask of values whose string form isn't '0' or '1'"""
+    if values.dtype.kind in 'iu':
+        return ~np.isin(values, [0, 1])
+    if values.dtype.kind in 'bf':
+        # str() of a bool or float is never '0' or '1'
+        return np.ones(len(values), dtype=bool)
+    return ~_map_values(values, lambda value: str(value) in BINARY_VALUES, bool)
+
+def _choice_errors(values: np.ndarray, choices: List[str]) -> np.ndarray:
+    """Mask of values not in ``choices``"""
+    if values.dtype.kind in 'biuf':
+        return np.ones(len(values), dtype=bool)
+    return ~_map_values(values, lambda value: value in choices, bool)
+
+def _smoking_status_errors(values: np.ndarray) -> np.ndarray:
+    """Mask of smoking statuses that don't match case-insensitively"""
+    if values.dtype.kind in 'biuf':
+        return np.ones(len(values), dtype=bool)
+    # Non-strings are rejected here; the row validator raises on them instead
+    return ~_map_values(
+        values, lambda value: isinstance(value, str) and value.lower() in _SMOKING_STATUSES_LOWER, bool
+    )
+
+def validate_patient_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Validate patient data a whole DataFrame at a time
+    
+    Applies the same rules as validate_patient_data to every row of
+    ``frame``, checking each column at once instead of row by row.
+    
+    Returns:
+        A boolean error mask with the frame's index and one column per
+        validation message (in validate_patient_data order); True marks a
+        row that fails that check
+    """
+    age_range, age_number = _range_errors(_frame_column(frame, 'age', 0), 0, 120)
+    glucose_range, glucose_number = _range_errors(_frame_column(frame, 'avg_glucose_level', 0), 0, 500)
+    bmi_range, bmi_number = _range_errors(_frame_column(frame, 'bmi', 0), 0, 100)
+    
+    return pd.DataFrame({
+        AGE_RANGE_ERROR: age_range,
+        AGE_NUMBER_ERROR: age_number,
+        GENDER_ERROR: _choice_errors(_frame_column(frame, 'gender', None), VALID_GENDERS),
+        HYPERTENSION_ERROR: _binary_errors(_frame_column(frame, 'hypertension', None)),
+        HEART_DISEASE_ERROR: _binary_errors(_frame_column(frame, 'heart_disease', None)),
+        EVER_MARRIED_ERROR: _choice_errors(_frame_column(frame, 'ever_married', None), EVER_MARRIED_VALUES),
+        WORK_TYPE_ERROR: _choice_errors(_frame_column(frame, 'work_type', None), VALID_WORK_TYPES),
+        RESIDENCE_TYPE_ERROR: _choice_errors(_frame_column(frame, 'Residence_type', None), RESIDENCE_TYPES),
+        GLUCOSE_RANGE_ERROR: glucose_range,
+        GLUCOSE_NUMBER_ERROR: glucose_number,
+        BMI_RANGE_ERROR: bmi_range,
+        BMI_NUMBER_ERROR: bmi_number,
+        SMOKING_STATUS_ERROR: _smoking_status_errors(_frame_column(frame, 'smoking_status', '')),
+        STROKE_ERROR: _binary_errors(_frame_column(frame, 'stroke', None))
+    }, index=frame.index)
+
+def frame_error_messages(error_mask: pd.DataFrame) -> Iterator[tuple[int, List[str]]]:
+    """
+    Yield (row position, messages) for each invalid row of an error mask
+    
+    The messages match what validate_patient_data returns for that row.
+    """
+    mask = error_mask.to_numpy()
+    messages = np.array(error_mask.columns, dtype=object)
+    for position in np.flatnonzero(mask.any(axis=1)):
+        yield int(position), list(messages[mask[position]])
+
+def sanitize_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """Return a copy of a DataFrame with sanitize_input applied to every string value"""
+    sanitized = frame.copy()
+    for name in sanitized.columns:
+        if isinstance(sanitized[name].dtype, np.dtype) and sanitized[name].dtype.kind in 'biufcmM':
+            continue
+        values = sanitized[name].to_numpy(dtype=object)
+        sanitized[name] = pd.Series(_map_values(values, sanitize_input, object), index=sanitized.index)
+    return sanitized
+
 def validate_password_strength(password: str) -> tuple[bool, List[str]]:
     """
     Validate password strength
@@ -0,0 +1,207 @@
+"""
+Resumable chunked uploads spooled to disk
+"""
+import hashlib
+import json
+import os
+import re
+import secrets
+import shutil
+import tempfile
+import time
+import logging
+from typing import IO, Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bytes copied per read when streaming parts to and from disk
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# Gaps listed in the error when an upload is assembled with parts missing
+MISSING_PARTS_SHOWN = 10
+
+_UPLOAD_ID = re.compile(r'^[0-9a-f]{32}$')
+_SHA256 = re.compile(r'^[0-9a-f]{64}$')
+
+class ChunkedUploadStore:
+    """
+    Stores upload sessions whose parts arrive as separate requests
+
+    Each session is a directory under ``root`` holding its metadata and one
+    file per received part, so parts can be retried or sent in any order
+    and only one part is ever in a worker's memory (as a streamed body).
+    Every part is checked against its SHA-256 before it is kept, and part
+    numbers above ``max_parts`` are refused so a session can't grow without
+    bound.
+    """
+
+    def __init__(self, root: str, session_ttl: float = 86400, max_parts: int = 10000):
+        self.root = root
+        self.session_ttl = session_ttl
+        self.max_parts = max_parts
+
+    def create(self, filename: str, username: str, mode: str = 'insert',
+               sha256: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Start a new upload session
+
+        Raises:
+            ValueError: if ``sha256`` is given but isn't a hex SHA-256 digest
+        """
+        if sha256 is not None and not _SHA256.match(sha256.lower()):
+            raise ValueError("sha256 must be a hex SHA-256 digest")
+        self.purge_expired()
+
+        upload_id = secrets.token_hex(16)
+        session = {
+            'upload_id': upload_id,
+            'filename': filename,
+            'mode': mode,
+            'created_by': username,
+            'created_at': time.time(),
+            'sha256': sha256.lower() if sha256 else None
+        }
+        os.makedirs(self._path(upload_id))
+        with open(self._path(upload_id, 'upload.json'), 'w') as f:
+            json.dump(session, f)
+        logger.info(f"Upload session created: {upload_id} by {username}")
+        return session
+
+    def get(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        """Get a session with its received parts, or None if it doesn't exist"""
+        if not _UPLOAD_ID.match(upload_id or ''):
+            return None
+        try:
+            with open(self._path(upload_id, 'upload.json')) as f:
+                session = json.load(f)
+        except (OSError, ValueError):
+            return None
+        session['parts'] = self.list_parts(upload_id)
+        return session
+
+    def list_parts(self, upload_id: str) -> List[Dict[str, Any]]:
+        """Received parts in order, with their sizes and checksums"""
+        parts = []
+        for name in os.listdir(self._path(upload_id)):
+            match = re.match(r'^part-(\d+)$', name)
+            if not match:
+                continue
+            with open(self._path(upload_id, f'{name}.sha256')) as f:
+                checksum = f.read().strip()
+            parts.append({
+                'number': int(match.group(1)),
+                'size': os.path.getsize(self._path(upload_id, name)),
+                'sha256': checksum
+            })
+        return sorted(parts, key=lambda part: part['number'])
+
+    def write_part(self, upload_id: str, number: int, stream: IO[bytes], sha256: str) -> Dict[str, Any]:
+        """
+        Stream one part to disk and keep it if its checksum matches
+
+        Re-sending a part number replaces the earlier copy, so a failed or
+        interrupted part can simply be retried.
+
+        Raises:
+            ValueError: if the part number or checksum is invalid, or the
+                received bytes don't match ``sha256``
+        """
+        if number < 1:
+            raise ValueError("Part numbers start at 1")
+        if number > self.max_parts:
+            raise ValueError(f"Part numbers go up to {self.max_parts}")
+        if not sha256 or not _SHA256.match(sha256.lower()):
+            raise ValueError("A hex SHA-256 checksum of the part is required")
+
+        name = f'part-{number:06d}'
+        fd, temp_path = tempfile.mkstemp(prefix=f'{name}.', suffix='.tmp', dir=self._path(upload_id))
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                while True:
+                    block = stream.read(COPY_BUFFER_SIZE)
+                    if not block:
+                        break
+                    digest.update(block)
+                    f.write(block)
+                    size += len(block)
+
+            if digest.hexdigest() != sha256.lower():
+                raise ValueError(f"Checksum mismatch for part {number}")
+
+            with open(self._path(upload_id, f'{name}.sha256'), 'w') as f:
+                f.write(digest.hexdigest())
+            os.replace(temp_path, self._path(upload_id, name))
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return {'number': number, 'size': size, 'sha256': digest.hexdigest()}
+
+    def assemble(self, upload_id: str, destination_dir: str, suffix: str = '.csv') -> str:
+        """
+        Concatenate the parts into one file and remove the session
+
+        ``suffix`` is the assembled file's extension.
+
+        Returns:
+            Path of the assembled file (the caller owns it)
+
+        Raises:
+            ValueError: if parts are missing, or the file doesn't match the
+                session's whole-file checksum
+        """
+        session = self.get(upload_id)
+        numbers = [part['number'] for part in session['parts']]
+        if not numbers:
+            raise ValueError("No parts have been uploaded")
+        missing = sorted(set(range(1, numbers[-1] + 1)) - set(numbers))
+        if missing:
+            shown = ', '.join(str(number) for number in missing[:MISSING_PARTS_SHOWN])
+            more = ', ...' if len(missing) > MISSING_PARTS_SHOWN else ''
+            raise ValueError(f"Missing parts ({len(missing)}): {shown}{more}")
+
+        os.makedirs(destination_dir, exist_ok=True)
+        fd, path = tempfile.mkstemp(suffix=suffix, dir=destination_dir)
+        digest = hashlib.sha256()
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for number in numbers:
+                    with open(self._path(upload_id, f'part-{number:06d}'), 'rb') as part:
+                        while True:
+                            block = part.read(COPY_BUFFER_SIZE)
+                            if not block:
+                                break
+                            digest.update(block)
+                            out.write(block)
+
+            if session['sha256'] and digest.hexdigest() != session['sha256']:
+                raise ValueError("Checksum mismatch for the assembled file")
+        except Exception:
+            os.remove(path)
+            raise
+
+        self.abort(upload_id)
+        logger.info(f"Upload assembled: {upload_id} ({len(numbers)} parts)")
+        return path
+
+    def abort(self, upload_id: str):
+        """Delete a session and its parts"""
+        if _UPLOAD_ID.match(upload_id or ''):
+            shutil.rmtree(self._path(upload_id), ignore_errors=True)
+
+    def purge_expired(self):
+        """Delete sessions untouched for longer than ``session_ttl`` seconds"""
+        if not os.path.isdir(self.root):
+            return
+        cutoff = time.time() - self.session_ttl
+        for upload_id in os.listdir(self.root):
+            path = self._path(upload_id)
+            if _UPLOAD_ID.match(upload_id) and os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+                logger.info(f"Expired upload session removed: {upload_id}")
+
+    def _path(self, upload_id: str, *names: str) -> str:
+        """Path of a session directory or a file inside it"""
+        return os.path.join(self.root, upload_id, *names)
@@ -0,0 +1,241 @@
+"""
+Background patient import jobs
+"""
+import os
+import tempfile
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from flask import current_app
+
+from app.repositories.import_job_repository import ImportJobRepository
+from app.repositories.mongo import (
+    MongoConnectionManager, get_mongo, get_patient_repository, get_import_job_repository
+)
+from app.repositories.patient_repository import PatientRepository
+from app.services.chunked_uploads import ChunkedUploadStore
+from app.services.patient_service import PatientService, IMPORT_MODES
+from app.utils.import_profile import ImportProfile
+from app.utils.import_readers import file_chunks
+
+logger = logging.getLogger(__name__)
+
+class ImportJobRunner:
+    """
+    Runs patient imports in background worker threads
+
+    Uploads are spooled to IMPORT_UPLOAD_FOLDER and recorded in the
+    import_jobs collection, so the request that starts an import returns a
+    job id straight away. The job's running totals are stored after every
+    chunk for the status endpoints to report, and a per-stage timing
+    profile when it finishes. Large files can instead arrive in parts
+    through ``uploads``, which are assembled in the same folder.
+
+    While this process has jobs queued or running, a heartbeat thread
+    refreshes their ``updated_at`` every ``heartbeat_interval`` seconds, so
+    the interrupted-job sweep of other processes never fails them.
+    """
+
+    def __init__(self, app=None):
+        self.upload_folder: Optional[str] = None
+        self.chunk_size = 1000
+        self.max_workers = 2
+        self.part_size = 8 * 1024 * 1024
+        self.idle_timeout = 600
+        self.heartbeat_interval = 60
+        self.uploads: Optional[ChunkedUploadStore] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._active_jobs: Dict[str, ImportJobRepository] = {}
+        self._heartbeat: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._recovered = False
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Read job settings from the app configuration"""
+        config = app.config
+        self.upload_folder = config.get('IMPORT_UPLOAD_FOLDER') or os.path.join(
+            tempfile.gettempdir(), 'stroke_imports'
+        )
+        self.chunk_size = config.get('IMPORT_CHUNK_SIZE', 1000)
+        self.max_workers = config.get('IMPORT_JOB_WORKERS', 2)
+        self.part_size = config.get('UPLOAD_PART_SIZE', 8 * 1024 * 1024)
+        self.idle_timeout = config.get('IMPORT_JOB_IDLE_TIMEOUT', 600)
+        self.heartbeat_interval = config.get('IMPORT_JOB_HEARTBEAT', 60)
+        max_size = config.get('UPLOAD_MAX_SIZE', 2 * 1024 * 1024 * 1024)
+        self.uploads = ChunkedUploadStore(
+            os.path.join(self.upload_folder, 'parts'), config.get('UPLOAD_SESSION_TTL', 86400),
+            max_parts=-(-max_size // self.part_size)
+        )
+        app.extensions['import_jobs'] = self
+        # On the first request rather than here, so forked workers don't inherit a connection
+        app.before_request(self.recover_interrupted_jobs)
+
+    def recover_interrupted_jobs(self):
+        """
+        Mark jobs a previous process left queued or running as failed
+
+        Runs once per process, in the background so the first request isn't
+        held up. Those jobs were only queued in that process's memory, so
+        they will never finish.
+        """
+        if self._recovered:
+            return
+        with self._lock:
+            if self._recovered:
+                return
+            self._recovered = True
+        mongo = get_mongo()
+        threading.Thread(target=self._fail_interrupted_jobs, args=(mongo,),
+                         name='import-job-recovery', daemon=True).start()
+
+    def _fail_interrupted_jobs(self, mongo: MongoConnectionManager):
+        try:
+            mongo.import_job_repository.fail_interrupted_jobs(self.idle_timeout)
+        except Exception as e:
+            logger.error(f"Error recovering interrupted import jobs: {str(e)}")
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Worker pool, started on first use so forked app workers each get their own"""
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix='import-job'
+                    )
+        return self._executor
+
+    def submit_upload(self, file, username: str, mode: str = 'insert') -> str:
+        """
+        Spool an uploaded file to disk and queue its import
+
+        Returns:
+            The job id
+
+        Raises:
+            ValueError: if ``mode`` is not one of IMPORT_MODES
+        """
+        if mode not in IMPORT_MODES:
+            raise ValueError(f"Import mode must be one of: {', '.join(IMPORT_MODES)}")
+        os.makedirs(self.upload_folder, exist_ok=True)
+        # Keep the extension; it selects the reader
+        fd, path = tempfile.mkstemp(suffix=os.path.splitext(file.filename)[1].lower(), dir=self.upload_folder)
+        os.close(fd)
+        file.save(path)
+        return self.submit_file(path, file.filename, username, mode)
+
+    def submit_file(self, path: str, filename: str, username: str, mode: str = 'insert') -> str:
+        """
+        Queue the import of a CSV, Parquet or Arrow file already on disk
+
+        The job takes ownership of ``path`` and deletes it once the import
+        has finished.
+
+        Returns:
+            The job id
+
+        Raises:
+            ValueError: if ``mode`` is not one of IMPORT_MODES
+        """
+        if mode not in IMPORT_MODES:
+            raise ValueError(f"Import mode must be one of: {', '.join(IMPORT_MODES)}")
+        # Resolve the repositories here; worker threads run outside the app context
+        patient_repo = get_patient_repository()
+        job_repo = get_import_job_repository()
+
+        job_id = job_repo.create_job(filename, mode, username)
+        with self._lock:
+            self._active_jobs[job_id] = job_repo
+        self._start_heartbeat()
+        self.executor.submit(self._run, job_id, path, username, mode, patient_repo, job_repo)
+        return job_id
+
+    def submit_chunked(self, upload_id: str, username: str) -> str:
+        """
+        Assemble a chunked upload and queue its import
+
+        Returns:
+            The job id
+
+        Raises:
+            ValueError: if parts are missing or the assembled file fails its checksum
+        """
+        session = self.uploads.get(upload_id)
+        path = self.uploads.assemble(
+            upload_id, self.upload_folder, suffix=os.path.splitext(session['filename'])[1].lower()
+        )
+        try:
+            return self.submit_file(path, session['filename'], username, session['mode'])
+        except Exception:
+            os.remove(path)
+            raise
+
+    def _run(self, job_id: str, path: str, username: str, mode: str,
+             patient_repo: PatientRepository, job_repo: ImportJobRepository):
+        """Import a spooled file, recording progress and the outcome on the job"""
+        # Timings only; tracing memory would slow every request in this process
+        profile = ImportProfile()
+        try:
+            job_repo.mark_running(job_id)
+            success, message, _ = PatientService(patient_repo).import_patient_chunks(
+                file_chunks(path, chunksize=self.chunk_size), username, mode=mode, profile=profile,
+                progress=lambda totals: job_repo.update_progress(job_id, totals.as_dict())
+            )
+        except Exception as e:
+            logger.error(f"Error running import job {job_id}: {str(e)}")
+            success, message = False, f"Error importing patients: {str(e)}"
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+        profile.stop()
+        try:
+            job_repo.finish_job(job_id, success, message, profile.report())
+        except Exception as e:
+            logger.error(f"Error finishing import job {job_id}: {str(e)}")
+        finally:
+            with self._lock:
+                self._active_jobs.pop(job_id, None)
+
+    def _start_heartbeat(self):
+        """Start the heartbeat thread on first use, so forked app workers each get their own"""
+        if self._heartbeat is None:
+            with self._lock:
+                if self._heartbeat is None:
+                    self._heartbeat = threading.Thread(target=self._beat, name='import-job-heartbeat', daemon=True)
+                    self._heartbeat.start()
+
+    def _beat(self):
+        """Refresh ``updated_at`` of this process's unfinished jobs until shutdown"""
+        while not self._stopping.wait(self.heartbeat_interval):
+            self.touch_active_jobs()
+
+    def touch_active_jobs(self):
+        """Mark every job this process has queued or running as still alive"""
+        with self._lock:
+            active = dict(self._active_jobs)
+        by_repo: Dict[ImportJobRepository, List[str]] = {}
+        for job_id, job_repo in active.items():
+            by_repo.setdefault(job_repo, []).append(job_id)
+        for job_repo, job_ids in by_repo.items():
+            try:
+                job_repo.touch_jobs(job_ids)
+            except Exception as e:
+                logger.error(f"Error refreshing import job heartbeat: {str(e)}")
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting jobs, optionally waiting for running ones"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+        self._stopping.set()
+
+def get_import_jobs() -> ImportJobRunner:
+    """Get the import job runner for the current app"""
+    return current_app.extensions['import_jobs']
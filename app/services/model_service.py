@@ -1,54 +1,315 @@
 import os
+import time
+import logging
+import threading
 import joblib
 import pandas as pd
 import numpy as np
 
+from app.utils.cache import TTLCache
+from app.utils.feature_encoder import FeatureEncoder
+from app.utils.forest import FlatForest
+from app.utils.model_store import ModelStore
+
+logger = logging.getLogger(__name__)
+
+# Model inputs, in the order the pipeline was trained on
+FEATURE_COLUMNS = ['gender', 'age', 'hypertension', 'heart_disease', 'work_type', 'bmi', 'smoking_status']
+
+# 'sklearn' scores with the fitted classifier, 'flat' with the array-based forest evaluator
+INFERENCE_ENGINES = ('sklearn', 'flat')
+
+DEFAULT_MODEL_DIR = os.path.join(os.path.dirname(__file__), '..', 'models')
+
+class ModelUnavailableError(Exception):
+    """No model could be loaded"""
+
+class LoadedModel:
+    """One loaded model version and everything derived from it, swapped in as a unit"""
+    
+    def __init__(self, model, encoder, forest, version, fingerprint, generation):
+        self.model = model
+        self.classifier = model.steps[-1][1] if hasattr(model, 'steps') else None
+        self.encoder = encoder
+        self.forest = forest
+        self.version = version
+        self.fingerprint = fingerprint
+        self.generation = generation
+
 class ModelService:
-    def __init__(self, model_path=None):
-        if model_path is None:
-            model_path = os.path.join(os.path.dirname(__file__), '..', 'models', 'stroke_model.joblib')
-        self.model = joblib.load(model_path)
+    """
+    Stroke risk predictions from the trained model
     
-    def predict_proba(self, data):
+    The model is loaded on first use, not at import, so the app starts (and
+    reports predictions as unavailable) without a model file. It comes from
+    a versioned model directory (see ModelStore); every
+    ``reload_interval`` seconds a prediction checks whether a new version
+    has been published and, if so, loads it while other requests keep using
+    the old one, then swaps it in. Arrays are memory-mapped (``mmap_mode``)
+    so worker processes share their pages.
+    """
+    
+    def __init__(self, model_path=None, engine=None, cache_size=None, cache_ttl=None, model_dir=None,
+                 reload_interval=None, mmap_mode='r', app=None):
+        self.model_path = model_path
+        self.mmap_mode = mmap_mode
+        self.configure(
+            engine or os.environ.get('MODEL_INFERENCE_ENGINE') or 'sklearn',
+            model_dir or os.environ.get('MODEL_DIR') or DEFAULT_MODEL_DIR,
+            reload_interval if reload_interval is not None else float(os.environ.get('MODEL_RELOAD_INTERVAL') or 5),
+            cache_size if cache_size is not None else int(os.environ.get('PREDICTION_CACHE_SIZE') or 1024),
+            cache_ttl if cache_ttl is not None else float(os.environ.get('PREDICTION_CACHE_TTL') or 3600)
+        )
+        self.loads = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        """Read model settings from the app configuration; the model still loads on first use"""
+        config = app.config
+        self.mmap_mode = config.get('MODEL_MMAP_MODE', 'r')
+        self.configure(
+            config.get('MODEL_INFERENCE_ENGINE', 'sklearn'), config.get('MODEL_DIR') or DEFAULT_MODEL_DIR,
+            config.get('MODEL_RELOAD_INTERVAL', 5), config.get('PREDICTION_CACHE_SIZE', 1024),
+            config.get('PREDICTION_CACHE_TTL', 3600)
+        )
+        app.extensions['model_service'] = self
+    
+    def configure(self, engine, model_dir, reload_interval, cache_size, cache_ttl):
+        """
+        Apply settings, dropping any loaded model so the next prediction loads with them
+        
+        Raises:
+            ValueError: if ``engine`` is not one of INFERENCE_ENGINES
+        """
+        if engine not in INFERENCE_ENGINES:
+            raise ValueError(f"Inference engine must be one of: {', '.join(INFERENCE_ENGINES)}")
+        self.engine = engine
+        self.store = ModelStore(model_dir)
+        self.reload_interval = reload_interval
+        
+        # Identical inputs are common, so single predictions are cached (size 0 turns this off)
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl or None) if cache_size > 0 else None
+        self._loaded = None
+        self._checked_at = 0.0
+    
+    def current(self):
+        """
+        The model to predict with, loading it first if needed
+        
+        Raises:
+            ModelUnavailableError: if no model has been loaded and none can be
+        """
+        loaded = self._loaded
+        if loaded is not None and (not self.reload_interval
+                                   or time.monotonic() - self._checked_at < self.reload_interval):
+            return loaded
+        
+        # Only one thread checks for (and loads) a new version; the rest carry on with the old one
+        if not self._lock.acquire(blocking=loaded is None):
+            return loaded
+        try:
+            loaded = self._loaded
+            if loaded is None or time.monotonic() - self._checked_at >= self.reload_interval:
+                self._checked_at = time.monotonic()
+                try:
+                    fingerprint = self._fingerprint()
+                    if loaded is None or fingerprint != loaded.fingerprint:
+                        loaded = self._load(fingerprint)
+                except Exception as e:
+                    if loaded is None:
+                        raise ModelUnavailableError(f"Prediction model is not available: {str(e)}")
+                    logger.error(f"Keeping model {loaded.version or loaded.fingerprint[1]}: {str(e)}")
+            return loaded
+        finally:
+            self._lock.release()
+    
+    def load(self, model_path=None):
+        """
+        Load (or reload) the model now, replacing the current one
+        
+        Raises:
+            ModelUnavailableError: if the model can't be loaded
+        """
+        if model_path is not None:
+            self.model_path = model_path
+        with self._lock:
+            self._checked_at = time.monotonic()
+            try:
+                return self._load(self._fingerprint())
+            except Exception as e:
+                raise ModelUnavailableError(f"Prediction model is not available: {str(e)}")
+    
+    def _fingerprint(self):
+        """Identity of the model file to use; it changes when a new one is written"""
+        if self.model_path is not None:
+            return None, self.model_path, os.stat(self.model_path).st_mtime_ns
+        return self.store.fingerprint()
+    
+    def _load(self, fingerprint):
+        """
+        Load a model version and swap it in, clearing the prediction cache
+        
+        Results still being computed by the previous model are cached under
+        its generation, so they are never returned for the new one.
+        """
+        version, path, _ = fingerprint
+        model = joblib.load(path, mmap_mode=self.mmap_mode)
+        
+        # Single predictions skip pandas when the preprocessing can be replayed on arrays
+        try:
+            encoder = FeatureEncoder.from_pipeline(model)
+        except (ValueError, AttributeError) as e:
+            logger.warning(f"Using the pipeline for single predictions: {str(e)}")
+            encoder = None
+        
+        forest = None
+        if self.engine == 'flat':
+            try:
+                if encoder is None:
+                    raise ValueError("the preprocessing can't be encoded without the pipeline")
+                forest_dir = self.store.forest_dir(version) if self.model_path is None else None
+                if forest_dir:
+                    forest = FlatForest.load(forest_dir, mmap_mode=self.mmap_mode)
+                else:
+                    forest = FlatForest.from_classifier(model.steps[-1][1])
+            except (ValueError, OSError) as e:
+                logger.warning(f"Using the sklearn engine: {str(e)}")
+        
+        self.loads += 1
+        loaded = LoadedModel(model, encoder, forest, version, fingerprint, self.loads)
+        self._loaded = loaded
+        if self.cache is not None:
+            self.cache.clear()
+        logger.info(f"Loaded prediction model {version or path}")
+        return loaded
+    
+    def cache_stats(self):
+        """Prediction cache counters for monitoring, or None when caching is off"""
+        if self.cache is None:
+            return None
+        loaded = self._loaded
+        return {
+            'model_version': loaded.version if loaded else None,
+            'model_loads': self.loads,
+            **self.cache.stats()
+        }
+    
+    def prepare_features(self, data):
+        """
+        Convert one patient's inputs to the model's feature values
+        
+        Returns:
+            Dict of FEATURE_COLUMNS to values
+        
+        Raises:
+            ValueError: if a numeric input can't be converted
+        """
         try:
             age = float(data.get('age', 0))
             hypertension = int(data.get('hypertension', 0))
             heart_disease = int(data.get('heart_disease', 0))
             bmi = float(data.get('bmi', 0))
+        except (TypeError, ValueError, AttributeError) as e:
+            raise ValueError(f"Error processing input for prediction: {e}")
+        
+        gender = str(data.get('gender', 'Male')).strip()
+        work_type = str(data.get('work_type', 'Private')).strip()
+        smoking_status = str(data.get('smoking_status', 'never')).strip()
+        
+        smoking_lower = smoking_status.lower()
+        if 'never' in smoking_lower:
+            smoking_status = 'never smoked'
+        elif 'former' in smoking_lower:
+            smoking_status = 'formerly smoked'
+        elif 'smoke' in smoking_lower and 'former' not in smoking_lower:
+            smoking_status = 'smokes'
+        else:
+            smoking_status = 'never smoked'
+        
+        return {
+            'gender': gender,
+            'age': age,
+            'hypertension': hypertension,
+            'heart_disease': heart_disease,
+            'work_type': work_type,
+            'bmi': bmi,
+            'smoking_status': smoking_status
+        }
+    
+    def predict_proba(self, data):
+        try:
+            features = self.prepare_features(data)
+            loaded = self.current()
+            key = None
+            if self.cache is not None:
+                # NaN never equals itself, so missing values are keyed as None
+                key = (loaded.generation,) + tuple(
+                    None if value != value else value for value in (features[column] for column in FEATURE_COLUMNS)
+                )
+                cached = self.cache.get(key)
+                if cached is not None:
+                    return dict(cached)
             
-            gender = str(data.get('gender', 'Male')).strip()
-            work_type = str(data.get('work_type', 'Private')).strip()
-            smoking_status = str(data.get('smoking_status', 'never')).strip()
-            
-            smoking_lower = smoking_status.lower()
-            if 'never' in smoking_lower:
-                smoking_status = 'never smoked'
-            elif 'former' in smoking_lower:
-                smoking_status = 'formerly smoked'
-            elif 'smoke' in smoking_lower and 'former' not in smoking_lower:
-                smoking_status = 'smokes'
+            if loaded.forest is not None:
+                pred_prob = loaded.forest.predict_proba(loaded.encoder.encode(features))[0][1]
+            elif loaded.encoder is not None:
+                pred_prob = loaded.classifier.predict_proba(loaded.encoder.encode(features))[0][1]
             else:
-                smoking_status = 'never smoked'   
-            
-            df = pd.DataFrame([{
-                'gender': gender,
-                'age': age,
-                'hypertension': hypertension,
-                'heart_disease': heart_disease,
-                'work_type': work_type,
-                'bmi': bmi,
-                'smoking_status': smoking_status
-            }])
-            
-            print(f"Input DataFrame:\n{df}")
-            print(f"Columns: {df.columns.tolist()}")
-
-            pred_prob = self.model.predict_proba(df)[0][1]
+                pred_prob = loaded.model.predict_proba(pd.DataFrame([features], columns=FEATURE_COLUMNS))[0][1]
             prediction = int(pred_prob >= 0.5)
             
-            return {'prediction': prediction, 'probability': pred_prob}
+            result = {'prediction': prediction, 'probability': float(pred_prob)}
+            if key is not None:
+                self.cache.set(key, dict(result))
+            return result
             
+        except (ValueError, ModelUnavailableError):
+            raise
         except Exception as e:
             raise ValueError(f"Error processing input for prediction: {e}")
+    
+    def predict_batch(self, items):
+        """
+        Score many patients with a single model call
+        
+        Items that can't be converted get an 'invalid' result with the
+        error; the rest are stacked into one frame (or, with the flat
+        engine, one encoded matrix) and scored together.
+        
+        Returns:
+            A result per item, in order, with its 'index', 'status'
+            ('predicted' or 'invalid') and 'prediction' and 'probability',
+            or 'error'
+        
+        Raises:
+            ModelUnavailableError: if no model can be loaded
+        """
+        loaded = self.current()
+        results = []
+        rows = []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                results.append({'index': index, 'status': 'invalid', 'error': 'Item must be an object'})
+                continue
+            try:
+                rows.append(self.prepare_features(item))
+            except ValueError as e:
+                results.append({'index': index, 'status': 'invalid', 'error': str(e)})
+                continue
+            results.append({'index': index, 'status': 'predicted'})
+        
+        if rows:
+            if loaded.forest is not None:
+                probabilities = loaded.forest.predict_proba(loaded.encoder.encode_many(rows))[:, 1]
+            else:
+                probabilities = loaded.model.predict_proba(pd.DataFrame(rows, columns=FEATURE_COLUMNS))[:, 1]
+            predicted = (result for result in results if result['status'] == 'predicted')
+            for result, probability in zip(predicted, probabilities):
+                result['prediction'] = int(probability >= 0.5)
+                result['probability'] = float(probability)
+        return results
 
+# Configured by the app factory; the model itself loads on the first prediction
 model_service = ModelService()
\ No newline at end of file
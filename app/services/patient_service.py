@@ -1,20 +1,289 @@
 """
 Patient service for business logic
 """
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Iterable, Iterator, Callable, Union
+from collections import deque
+from datetime import datetime
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 import logging
+import numbers
 
-from app.repositories.patient_repository import PatientRepository
-from app.security.validation import validate_patient_data, sanitize_input
-from app.security.encryption import encryption_service
+import pandas as pd
+
+from bson.objectid import ObjectId
+from pymongo import DeleteOne, InsertOne, UpdateOne
+
+from app.repositories.patient_repository import (
+    PatientRepository, build_projection, statistics_delta, merge_statistics_deltas
+)
+from app.security.validation import (
+    validate_patient_data, sanitize_input, validate_patient_frame, frame_error_messages, sanitize_frame
+)
+from app.security.encryption import EncryptionService, encryption_service
+from app.utils.import_readers import frame_records
+from app.utils.import_profile import ImportProfile, profile_stage, profiled_chunks
 
 logger = logging.getLogger(__name__)
 
+# How imported rows are written: plain inserts, or upserts keyed on the record id
+IMPORT_MODES = ('insert', 'upsert')
+
+# Per-item outcomes of bulk requests; the first four mean the item succeeded
+BULK_STATUSES = ('created', 'updated', 'unchanged', 'deleted', 'invalid', 'duplicate', 'not_found', 'error')
+BULK_SUCCESS_STATUSES = BULK_STATUSES[:4]
+
+# MongoDB duplicate key error code (unique index on the record id)
+DUPLICATE_KEY_ERROR = 11000
+
+def bulk_result(index: int, status: str, **fields: Any) -> Dict[str, Any]:
+    """One item's entry in a bulk response"""
+    return {'index': index, 'status': status, **fields}
+
+def write_error_result(index: int, error: Dict[str, Any]) -> Dict[str, Any]:
+    """A bulk response entry for an operation MongoDB rejected"""
+    if error.get('code') == DUPLICATE_KEY_ERROR:
+        return bulk_result(index, 'duplicate', error='Patient ID already exists.')
+    return bulk_result(index, 'error', error=error.get('errmsg', 'Write failed'))
+
+def integral_record_id(value: Any) -> int:
+    """
+    Convert a record ID to int without truncating it
+    
+    Raises:
+        ValueError: unless ``value`` is a whole number or an integer string
+            (so 12.7 and "12.7" are rejected rather than becoming 12)
+    """
+    if isinstance(value, numbers.Integral) and not isinstance(value, bool):
+        return int(value)
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        return int(value.strip())
+    raise ValueError(f"Not an integer: {value!r}")
+
+def valid_object_id(value: Any) -> bool:
+    """Whether ``value`` is a database ID string"""
+    return isinstance(value, str) and ObjectId.is_valid(value)
+
+def sanitize_patient_data(patient_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Return a copy of patient data with string values sanitized"""
+    sanitized = {}
+    for key, value in patient_data.items():
+        if isinstance(value, str):
+            sanitized[key] = sanitize_input(value)
+        else:
+            sanitized[key] = value
+    return sanitized
+
+def encrypt_patient(patient: Dict[str, Any]) -> Dict[str, Any]:
+    """Encrypt sensitive fields in place if encryption is configured"""
+    if encryption_service and patient.get('email'):
+        patient['email'] = encryption_service.encrypt(patient['email'])
+    return patient
+
+def keep_stored_encryption(patient: Dict[str, Any], stored: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Reuse the stored ciphertext of sensitive fields whose plaintext is unchanged
+    
+    Fernet encryption is randomized, so a re-encrypted value never equals the
+    stored one. Writing the stored ciphertext back instead leaves unchanged
+    fields unmodified in the database.
+    """
+    if not (encryption_service and stored and patient.get('email') and stored.get('email')):
+        return patient
+    if patient['email'] != stored['email']:
+        try:
+            if encryption_service.decrypt(patient['email']) == encryption_service.decrypt(stored['email']):
+                patient['email'] = stored['email']
+        except Exception:
+            pass
+    return patient
+
+def decrypt_patient(patient: Dict[str, Any]) -> Dict[str, Any]:
+    """Decrypt sensitive fields in place, leaving undecryptable values as-is"""
+    if encryption_service and patient.get('email'):
+        try:
+            patient['email'] = encryption_service.decrypt(patient['email'])
+        except:
+            pass
+    return patient
+
+def prepare_import_rows(records: List[Dict], username: str, start_row: int = 1,
+                        profile: Optional[ImportProfile] = None) -> tuple[List[Dict], List[str]]:
+    """
+    Sanitize and validate imported rows
+    
+    Returns:
+        (valid_patients, errors) where errors name the 1-based source row
+    """
+    valid_patients = []
+    errors = []
+    
+    with profile_stage(profile, 'sanitize', len(records)):
+        sanitized_rows = [sanitize_patient_data(patient) for patient in records]
+    
+    with profile_stage(profile, 'validate', len(records)):
+        for idx, sanitized in enumerate(sanitized_rows, start=start_row):
+            validation_errors = validate_patient_data(sanitized)
+            if validation_errors:
+                errors.append(f"Row {idx}: {', '.join(validation_errors)}")
+                continue
+            
+            sanitized['imported_by'] = username
+            valid_patients.append(sanitized)
+    
+    return valid_patients, errors
+
+def prepare_import_frame(frame: pd.DataFrame, username: str, start_row: int = 1,
+                         profile: Optional[ImportProfile] = None) -> tuple[List[Dict], List[str]]:
+    """
+    Sanitize and validate an imported DataFrame column by column
+    
+    Produces the same rows and messages as prepare_import_rows on the
+    frame's records, without calling the validators once per row.
+    
+    Returns:
+        (valid_patients, errors) where errors name the 1-based source row
+    """
+    with profile_stage(profile, 'sanitize', len(frame)):
+        sanitized = sanitize_frame(frame)
+    
+    with profile_stage(profile, 'validate', len(frame)):
+        error_mask = validate_patient_frame(sanitized)
+        errors = [
+            f"Row {start_row + position}: {', '.join(messages)}"
+            for position, messages in frame_error_messages(error_mask)
+        ]
+    
+    valid = sanitized[~error_mask.any(axis=1).to_numpy()].assign(imported_by=username)
+    with profile_stage(profile, 'to_records', len(valid)):
+        records = frame_records(valid)
+    return records, errors
+
+def prepare_import_chunk(chunk: Union[pd.DataFrame, List[Dict]], username: str, start_row: int = 1,
+                         profile: Optional[ImportProfile] = None) -> tuple[List[Dict], List[str]]:
+    """
+    Sanitize, validate and encrypt one import chunk
+    
+    A module-level function so parallel imports can run it in worker
+    processes. DataFrames are validated column-wise, record lists row by row.
+    
+    Returns:
+        (valid_patients, errors) with sensitive fields of valid_patients encrypted
+    """
+    if isinstance(chunk, pd.DataFrame):
+        valid_patients, errors = prepare_import_frame(chunk, username, start_row, profile)
+    else:
+        valid_patients, errors = prepare_import_rows(chunk, username, start_row, profile)
+    
+    with profile_stage(profile, 'encrypt', len(valid_patients)):
+        for patient in valid_patients:
+            encrypt_patient(patient)
+    return valid_patients, errors
+
+def prepare_import_chunk_profiled(chunk: Union[pd.DataFrame, List[Dict]], username: str, start_row: int,
+                                  track_memory: bool) -> tuple[List[Dict], List[str], Dict[str, Any]]:
+    """
+    prepare_import_chunk for a worker process, with its own profile
+    
+    Returns:
+        (valid_patients, errors, stages) where stages is for ImportProfile.merge
+    """
+    profile = ImportProfile(track_memory)
+    try:
+        valid_patients, errors = prepare_import_chunk(chunk, username, start_row, profile)
+    finally:
+        profile.stop()
+    return valid_patients, errors, profile.stages
+
+def report_written_batch(batch_written: Optional[Callable[[List[int]], None]],
+                         valid_patients: List[Dict], counts: Dict[str, int]):
+    """Pass a batch's record ids to ``batch_written`` if every row of it was written"""
+    if batch_written is None or not valid_patients:
+        return
+    if counts['inserted'] + counts['updated'] + counts['unchanged'] == len(valid_patients):
+        batch_written([patient['id'] for patient in valid_patients])
+
+def init_import_worker(encryption_key: Optional[bytes]):
+    """
+    Give a parallel import worker process the parent's encryption key
+    
+    Worker processes started with 'spawn' (or 'forkserver') import this
+    module afresh, so without it they would encrypt with no key or a
+    different one.
+    """
+    global encryption_service
+    encryption_service = EncryptionService(encryption_key) if encryption_key else None
+
+def _completed(result: Any) -> Future:
+    """A future that already holds ``result``"""
+    future = Future()
+    future.set_result(result)
+    return future
+
+class ImportTotals:
+    """Running totals for a chunked import"""
+    
+    # Only the first few row errors are kept so memory stays bounded
+    MAX_ERRORS = 100
+    
+    def __init__(self):
+        self.chunks = 0
+        self.rows = 0
+        self.imported = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.skipped = 0
+        self.errors: List[str] = []
+        self.last_batch: Optional[Dict[str, int]] = None
+    
+    def add_chunk(self, rows: int, errors: List[str]):
+        """Count a prepared chunk of ``rows`` rows and its row errors"""
+        self.chunks += 1
+        self.rows += rows
+        self.add_errors(errors)
+    
+    def add_batch(self, counts: Dict[str, int]):
+        """Count a written batch of 'inserted', 'updated' and 'unchanged' rows"""
+        self.last_batch = {key: counts[key] for key in ('inserted', 'updated', 'unchanged')}
+        self.inserted += counts['inserted']
+        self.updated += counts['updated']
+        self.unchanged += counts['unchanged']
+        self.imported += counts['inserted'] + counts['updated'] + counts['unchanged']
+    
+    def add_errors(self, errors: List[str]):
+        """Count skipped rows and keep the first MAX_ERRORS messages"""
+        self.skipped += len(errors)
+        self.errors.extend(errors[:self.MAX_ERRORS - len(self.errors)])
+    
+    def as_dict(self) -> Dict[str, Any]:
+        """Totals as a plain dictionary"""
+        return {
+            'chunks': self.chunks,
+            'rows': self.rows,
+            'imported': self.imported,
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'unchanged': self.unchanged,
+            'skipped': self.skipped,
+            'errors': list(self.errors),
+            'last_batch': self.last_batch
+        }
+
 class PatientService:
     """Service for patient operations"""
     
-    def __init__(self, patient_repo: PatientRepository):
+    def __init__(self, patient_repo: PatientRepository, executor: Optional[ThreadPoolExecutor] = None):
+        """
+        Args:
+            patient_repo: Repository the service reads and writes through
+            executor: Thread pool for independent queries (e.g. a page and its
+                total count) to run concurrently; they run one after the other
+                without it
+        """
         self.patient_repo = patient_repo
+        self.executor = executor
     
     def create_patient(self, patient_data: Dict[str, Any], username: str) -> tuple[bool, str, Optional[str]]:
         """
@@ -24,12 +293,7 @@ class PatientService:
             (success, message, patient_id)
         """
         # Sanitize input
-        sanitized_data = {}
-        for key, value in patient_data.items():
-            if isinstance(value, str):
-                sanitized_data[key] = sanitize_input(value)
-            else:
-                sanitized_data[key] = value
+        sanitized_data = sanitize_patient_data(patient_data)
         
         # Add metadata
         sanitized_data['created_by'] = username
@@ -44,14 +308,12 @@ class PatientService:
             return False, "Patient ID already exists.", None
         
         # Encrypt sensitive fields if encryption service is available
-        if encryption_service:
-            # Encrypt email if present (example)
-            if 'email' in sanitized_data and sanitized_data['email']:
-                sanitized_data['email'] = encryption_service.encrypt(sanitized_data['email'])
+        encrypt_patient(sanitized_data)
         
         # Insert patient
         try:
             patient_id = self.patient_repo.insert_patient(sanitized_data)
+            self.patient_repo.increment_statistics(statistics_delta(sanitized_data))
             logger.info(f"Patient created: {sanitized_data.get('id')} by {username}")
             return True, "Patient added successfully!", patient_id
         except Exception as e:
@@ -66,12 +328,7 @@ class PatientService:
             (success, message)
         """
         # Sanitize input
-        sanitized_data = {}
-        for key, value in update_data.items():
-            if isinstance(value, str):
-                sanitized_data[key] = sanitize_input(value)
-            else:
-                sanitized_data[key] = value
+        sanitized_data = sanitize_patient_data(update_data)
         
         sanitized_data['updated_by'] = username
         
@@ -81,13 +338,18 @@ class PatientService:
             return False, "; ".join(errors)
         
         # Encrypt sensitive fields if needed
-        if encryption_service and 'email' in sanitized_data:
-            sanitized_data['email'] = encryption_service.encrypt(sanitized_data['email'])
+        encrypt_patient(sanitized_data)
         
         # Update patient
         try:
+            existing = self.patient_repo.get_patient_by_id(patient_id)
             modified = self.patient_repo.update_patient(patient_id, sanitized_data)
             if modified > 0:
+                if existing:
+                    self.patient_repo.increment_statistics(merge_statistics_deltas(
+                        statistics_delta(existing, -1),
+                        statistics_delta({**existing, **sanitized_data})
+                    ))
                 logger.info(f"Patient updated: {patient_id} by {username}")
                 return True, "Patient updated successfully!"
             else:
@@ -104,8 +366,13 @@ class PatientService:
             (success, message)
         """
         try:
+            existing = self.patient_repo.get_patient_by_id(patient_id)
             deleted = self.patient_repo.delete_patient(patient_id)
             if deleted > 0:
+                if existing:
+                    self.patient_repo.increment_statistics(statistics_delta(existing, -1))
+                else:
+                    self.patient_repo.invalidate_statistics()
                 logger.info(f"Patient deleted: {patient_id} by {username}")
                 return True, "Patient deleted successfully!"
             else:
@@ -114,49 +381,304 @@ class PatientService:
             logger.error(f"Error deleting patient: {str(e)}")
             return False, f"Error deleting patient: {str(e)}"
     
-    def get_patient(self, patient_id: str) -> Optional[Dict]:
-        """Get patient by ID"""
-        patient = self.patient_repo.get_patient_by_id(patient_id)
-        if patient and encryption_service:
+    def bulk_create_patients(self, items: List[Any], username: str) -> List[Dict[str, Any]]:
+        """
+        Create many patients with one duplicate check and one bulk write
+        
+        Every item is sanitized and validated; ids already in the database
+        are found with a single ``$in`` query, and the remaining patients are
+        inserted in one unordered ``bulk_write``.
+        
+        Returns:
+            One result per item, in order, with its 'status' (see
+            BULK_STATUSES) and 'patient_id' or 'error'
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        candidates = []
+        seen_ids = set()
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                results[index] = bulk_result(index, 'invalid', error='Each patient must be an object')
+                continue
+            sanitized = sanitize_patient_data(item)
+            errors = validate_patient_data(sanitized)
+            try:
+                sanitized['id'] = integral_record_id(sanitized['id'])
+            except (KeyError, ValueError):
+                errors.append('Patient ID must be an integer')
+            if errors:
+                results[index] = bulk_result(index, 'invalid', error='; '.join(errors))
+            elif sanitized['id'] in seen_ids:
+                results[index] = bulk_result(index, 'duplicate', error='Patient ID appears more than once in the request.')
+            else:
+                seen_ids.add(sanitized['id'])
+                candidates.append((index, sanitized))
+        
+        existing_ids = self.patient_repo.find_record_ids(list(seen_ids)) if seen_ids else set()
+        now = datetime.now()
+        writes = []
+        for index, patient in candidates:
+            if patient['id'] in existing_ids:
+                results[index] = bulk_result(index, 'duplicate', error='Patient ID already exists.')
+                continue
+            patient.update(_id=ObjectId(), created_by=username, created_at=now)
+            encrypt_patient(patient)
+            writes.append((index, patient))
+        
+        created = []
+        for index, patient, error in self._bulk_write(writes, [InsertOne(patient) for _, patient in writes]):
+            if error:
+                results[index] = error
+            else:
+                results[index] = bulk_result(index, 'created', patient_id=str(patient['_id']))
+                created.append(patient)
+        
+        if created:
+            self.patient_repo.increment_statistics(merge_statistics_deltas(
+                *(statistics_delta(patient) for patient in created)
+            ))
+            logger.info(f"Bulk created {len(created)} patients by {username}")
+        return results
+    
+    def bulk_update_patients(self, items: List[Any], username: str) -> List[Dict[str, Any]]:
+        """
+        Apply partial updates to many patients with one lookup and one bulk write
+        
+        Each item holds a 'patient_id' and the fields to change. The current
+        documents are read with a single ``$in`` query and every item is
+        validated as it would look after the update; items that change
+        nothing are reported 'unchanged' without being written.
+        
+        Returns:
+            One result per item, in order, with its 'status' and 'patient_id' or 'error'
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        candidates = []
+        seen_ids = set()
+        for index, item in enumerate(items):
+            patient_id = item.get('patient_id') if isinstance(item, dict) else None
+            if not valid_object_id(patient_id):
+                results[index] = bulk_result(index, 'invalid', error='Each update needs a valid patient_id')
+                continue
+            changes = {key: value for key, value in item.items() if key != 'patient_id'}
+            if not changes:
+                results[index] = bulk_result(index, 'invalid', patient_id=patient_id, error='No fields to update')
+            elif 'id' in changes or '_id' in changes:
+                results[index] = bulk_result(index, 'invalid', patient_id=patient_id, error="Patient ID can't be changed")
+            elif patient_id in seen_ids:
+                results[index] = bulk_result(index, 'duplicate', patient_id=patient_id,
+                                             error='Patient appears more than once in the request.')
+            else:
+                seen_ids.add(patient_id)
+                candidates.append((index, patient_id, sanitize_patient_data(changes)))
+        
+        existing = self.patient_repo.get_patients_by_ids(list(seen_ids)) if seen_ids else {}
+        now = datetime.now()
+        writes = []
+        for index, patient_id, changes in candidates:
+            current = existing.get(patient_id)
+            if current is None:
+                results[index] = bulk_result(index, 'not_found', patient_id=patient_id, error='Patient not found.')
+                continue
+            errors = validate_patient_data({**current, **changes})
+            if errors:
+                results[index] = bulk_result(index, 'invalid', patient_id=patient_id, error='; '.join(errors))
+                continue
+            stored_values = decrypt_patient(dict(current))
+            if all(stored_values.get(key) == value for key, value in changes.items()):
+                results[index] = bulk_result(index, 'unchanged', patient_id=patient_id)
+                continue
+            keep_stored_encryption(encrypt_patient(changes), current)
+            changes.update(updated_by=username, updated_at=now)
+            writes.append((index, (current, changes)))
+        
+        operations = [UpdateOne({'_id': current['_id']}, {'$set': changes}) for _, (current, changes) in writes]
+        deltas = []
+        for index, (current, changes), error in self._bulk_write(writes, operations):
+            patient_id = str(current['_id'])
+            if error:
+                results[index] = {**error, 'patient_id': patient_id}
+            else:
+                results[index] = bulk_result(index, 'updated', patient_id=patient_id)
+                deltas.extend([statistics_delta(current, -1), statistics_delta({**current, **changes})])
+        
+        if deltas:
+            self.patient_repo.increment_statistics(merge_statistics_deltas(*deltas))
+            logger.info(f"Bulk updated {len(deltas) // 2} patients by {username}")
+        return results
+    
+    def bulk_delete_patients(self, patient_ids: List[Any], username: str) -> List[Dict[str, Any]]:
+        """
+        Delete many patients with one lookup and one bulk write
+        
+        Returns:
+            One result per ID, in order, with its 'status' and 'patient_id' or 'error'
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(patient_ids)
+        seen_ids = set()
+        for index, patient_id in enumerate(patient_ids):
+            if not valid_object_id(patient_id):
+                results[index] = bulk_result(index, 'invalid', error='Not a valid patient_id')
+            elif patient_id in seen_ids:
+                results[index] = bulk_result(index, 'duplicate', patient_id=patient_id,
+                                             error='Patient appears more than once in the request.')
+            else:
+                seen_ids.add(patient_id)
+        
+        existing = self.patient_repo.get_patients_by_ids(list(seen_ids)) if seen_ids else {}
+        writes = []
+        for index, patient_id in enumerate(patient_ids):
+            if results[index] is not None:
+                continue
+            if patient_id not in existing:
+                results[index] = bulk_result(index, 'not_found', patient_id=patient_id, error='Patient not found.')
+            else:
+                writes.append((index, existing[patient_id]))
+        
+        operations = [DeleteOne({'_id': patient['_id']}) for _, patient in writes]
+        deleted = []
+        for index, patient, error in self._bulk_write(writes, operations):
+            if error:
+                results[index] = {**error, 'patient_id': str(patient['_id'])}
+            else:
+                results[index] = bulk_result(index, 'deleted', patient_id=str(patient['_id']))
+                deleted.append(patient)
+        
+        if deleted:
+            self.patient_repo.increment_statistics(merge_statistics_deltas(
+                *(statistics_delta(patient, -1) for patient in deleted)
+            ))
+            logger.info(f"Bulk deleted {len(deleted)} patients by {username}")
+        return results
+    
+    def _bulk_write(self, writes: List[tuple], operations: List[Any]) -> List[tuple]:
+        """
+        Run one unordered bulk write for ``writes`` (pairs of item index and payload)
+        
+        If the database reports fewer matches than expected (a patient changed
+        between the lookup and the write) the statistics are rebuilt on next
+        read instead of being incremented.
+        
+        Returns:
+            (index, payload, error result or None) for each write
+        """
+        if not operations:
+            return []
+        try:
+            counts, errors = self.patient_repo.bulk_write(operations)
+        except Exception as e:
+            logger.error(f"Error in bulk write: {str(e)}")
+            # Some operations may have been applied, so the counters can't be trusted
+            self.patient_repo.invalidate_statistics()
+            return [(index, payload, bulk_result(index, 'error', error=f"Error writing patient: {str(e)}"))
+                    for index, payload in writes]
+        
+        applied = len(operations) - len(errors)
+        if isinstance(operations[0], (UpdateOne, DeleteOne)) and \
+                counts['matched'] + counts['deleted'] != applied:
+            self.patient_repo.invalidate_statistics()
+        return [(index, payload, write_error_result(index, errors[position]) if position in errors else None)
+                for position, (index, payload) in enumerate(writes)]
+    
+    def get_patient(self, patient_id: str, fields: Optional[List[str]] = None) -> Optional[Dict]:
+        """
+        Get patient by ID
+        
+        Raises:
+            ValueError: if ``fields`` names an unknown field
+        """
+        patient = self.patient_repo.get_patient_by_id(patient_id, build_projection(fields))
+        if patient:
             # Decrypt sensitive fields
-            if 'email' in patient and patient['email']:
-                try:
-                    patient['email'] = encryption_service.decrypt(patient['email'])
-                except:
-                    pass
+            decrypt_patient(patient)
         return patient
     
-    def get_patients(self, page: int = 1, per_page: int = 20) -> tuple[List[Dict], int]:
-        """Get paginated patients"""
-        skip = (page - 1) * per_page
-        patients = self.patient_repo.get_all_patients(skip, per_page)
-        total = self.patient_repo.count_patients()
+    def get_patients(self, page: int = 1, per_page: int = 20, after: Optional[str] = None,
+                     before: Optional[str] = None, fields: Optional[List[str]] = None,
+                     count: str = 'exact') -> tuple[List[Dict], Optional[int], Dict[str, Any]]:
+        """
+        Get paginated patients
+        
+        Cursor tokens (``after``/``before``) select keyset pagination, which
+        costs the same for every page. A ``page`` number greater than 1 without
+        a cursor falls back to offset pagination for older API clients.
+        ``fields`` limits the returned documents to the named fields and
+        ``count`` picks how the total is computed (see ``COUNT_STRATEGIES``).
+        
+        Returns:
+            (patients, total, page_info) where page_info has 'next' and 'prev'
+            cursor tokens and a 'has_next' flag; total is None for count='none'
+        
+        Raises:
+            ValueError: if a cursor token, field or count strategy is invalid
+        """
+        projection = build_projection(fields)
+        if self.executor is not None:
+            # The count round trip overlaps with fetching the page
+            pending_total = self.executor.submit(self.patient_repo.count_patients, strategy=count)
+        else:
+            pending_total = _completed(self.patient_repo.count_patients(strategy=count))
+        if after or before or page <= 1:
+            patients, next_cursor, prev_cursor = self.patient_repo.get_patients_page(
+                per_page, after=after, before=before, projection=projection
+            )
+            has_next = next_cursor is not None
+        else:
+            skip = (page - 1) * per_page
+            # Fetch one extra row so the next page can be detected without a count
+            patients = self.patient_repo.get_all_patients(skip, per_page + 1, projection)
+            has_next = len(patients) > per_page
+            patients = patients[:per_page]
+            next_cursor, prev_cursor = None, None
+        total = pending_total.result()
         
         # Decrypt sensitive fields
-        if encryption_service:
-            for patient in patients:
-                if 'email' in patient and patient['email']:
-                    try:
-                        patient['email'] = encryption_service.decrypt(patient['email'])
-                    except:
-                        pass
+        for patient in patients:
+            decrypt_patient(patient)
         
-        return patients, total
+        return patients, total, {'next': next_cursor, 'prev': prev_cursor, 'has_next': has_next}
     
-    def search_patients(self, query: str) -> List[Dict]:
-        """Search patients"""
-        results = self.patient_repo.search_patients(query)
+    def search_patients(self, query: str, page: int = 1, per_page: int = 20,
+                        fields: Optional[List[str]] = None) -> tuple[List[Dict], int]:
+        """
+        Search patients
+        
+        Returns:
+            (results, total)
+        
+        Raises:
+            ValueError: if ``fields`` names an unknown field
+        """
+        results, total = self.patient_repo.search_patients(
+            query, page, per_page, build_projection(fields), executor=self.executor
+        )
         
         # Decrypt sensitive fields
-        if encryption_service:
-            for patient in results:
-                if 'email' in patient and patient['email']:
-                    try:
-                        patient['email'] = encryption_service.decrypt(patient['email'])
-                    except:
-                        pass
+        for patient in results:
+            decrypt_patient(patient)
         
-        return results
+        return results, total
+    
+    def export_patients(self, query: Optional[str] = None, fields: Optional[List[str]] = None,
+                        batch_size: int = 1000) -> Iterator[Dict]:
+        """
+        Stream patients for export, optionally filtered by a search query
+        
+        The query selects the same patients as ``search_patients``, without
+        its result cap. Arguments are validated and the filter resolved
+        immediately, so a failing query is raised here rather than partway
+        through a response; documents are then read lazily as the returned
+        iterator is consumed.
+        
+        Raises:
+            ValueError: if ``fields`` names an unknown field
+            PyMongoError: if the search filter can't be resolved
+        """
+        projection = build_projection(fields)
+        patients = self.patient_repo.iter_patients(
+            self.patient_repo.resolve_search_filter(query) if query else None, projection, batch_size
+        )
+        return (decrypt_patient(patient) for patient in patients)
     
     def get_statistics(self) -> Dict[str, Any]:
         """Get patient statistics"""
@@ -169,44 +691,207 @@ class PatientService:
         Returns:
             (success, message, count)
         """
-        # Validate and sanitize each patient
-        valid_patients = []
-        errors = []
+        return self.import_patient_chunks([patients_list], username)
+    
+    def import_patient_chunks(self, chunks: Iterable[Union[pd.DataFrame, List[Dict]]], username: str,
+                              progress: Optional[Callable[[ImportTotals], None]] = None,
+                              workers: int = 1, writers: int = 1, mode: str = 'insert',
+                              profile: Optional[ImportProfile] = None, dry_run: bool = False,
+                              batch_written: Optional[Callable[[List[int]], None]] = None) -> tuple[bool, str, int]:
+        """
+        Import patients chunk by chunk
         
-        for idx, patient in enumerate(patients_list):
-            # Sanitize
-            sanitized = {}
-            for key, value in patient.items():
-                if isinstance(value, str):
-                    sanitized[key] = sanitize_input(value)
-                else:
-                    sanitized[key] = value
-            
-            # Validate
-            validation_errors = validate_patient_data(sanitized)
-            if validation_errors:
-                errors.append(f"Row {idx + 1}: {', '.join(validation_errors)}")
-                continue
-            
-            sanitized['imported_by'] = username
-            valid_patients.append(sanitized)
+        Each chunk (a DataFrame or a list of records) is sanitized, validated,
+        encrypted and inserted before the next one is read, so memory stays
+        bounded by the chunk size and rows reach the database straight away.
+        ``progress`` is called with the running totals after every chunk.
+        
+        With ``workers`` > 1 chunks are prepared in that many worker
+        processes, and with ``writers`` > 1 batches are inserted from that
+        many threads at once. A few chunks per worker are kept in flight,
+        so memory stays bounded in parallel mode too.
+        
+        ``mode`` 'upsert' writes rows with upserts keyed on the record id,
+        so re-importing a file updates changed patients instead of failing
+        on duplicates; totals then split rows into inserted, updated and
+        unchanged.
+        
+        ``profile`` collects the time, rows and memory of each stage (see
+        ImportProfile). With ``dry_run`` every stage runs except the database
+        writes, and valid rows are counted as inserted.
+        
+        ``batch_written`` is called with the record ids of each batch once
+        all of its rows have been written (never in a dry run); rows that
+        were skipped as invalid or failed to write are never passed to it.
         
-        if not valid_patients:
-            return False, "No valid patients to import. " + "; ".join(errors[:5]), 0
+        Returns:
+            (success, message, count)
         
-        # Encrypt sensitive fields
-        if encryption_service:
-            for patient in valid_patients:
-                if 'email' in patient and patient.get('email'):
-                    patient['email'] = encryption_service.encrypt(patient['email'])
+        Raises:
+            ValueError: if ``mode`` is not one of IMPORT_MODES
+        """
+        if mode not in IMPORT_MODES:
+            raise ValueError(f"Import mode must be one of: {', '.join(IMPORT_MODES)}")
+        totals = ImportTotals()
+        if profile:
+            chunks = profiled_chunks(chunks, profile)
         
-        # Import
         try:
-            count = self.patient_repo.bulk_insert_patients(valid_patients)
-            logger.info(f"Imported {count} patients by {username}")
-            error_msg = f" ({len(errors)} errors)" if errors else ""
-            return True, f"Successfully imported {count} patient records!{error_msg}", count
+            if workers > 1 or writers > 1:
+                self._import_chunks_parallel(chunks, username, totals, progress, workers, writers, mode,
+                                             profile, dry_run, batch_written)
+            else:
+                for chunk in chunks:
+                    valid_patients, errors = prepare_import_chunk(chunk, username, totals.rows + 1, profile)
+                    totals.add_chunk(len(chunk), errors)
+                    if valid_patients:
+                        counts = self._write_import_batch(valid_patients, mode, profile, dry_run)
+                        totals.add_batch(counts)
+                        if not dry_run:
+                            report_written_batch(batch_written, valid_patients, counts)
+                    
+                    if progress:
+                        progress(totals)
         except Exception as e:
+            # Some rows may have landed, so the counters can no longer be trusted
+            if not dry_run:
+                self.patient_repo.invalidate_statistics()
             logger.error(f"Error importing patients: {str(e)}")
-            return False, f"Error importing patients: {str(e)}", 0
-
+            imported_msg = f" ({totals.imported} records imported before the error)" if totals.imported else ""
+            return False, f"Error importing patients: {str(e)}{imported_msg}", totals.imported
+        
+        if not totals.imported:
+            return False, "No valid patients to import. " + "; ".join(totals.errors[:5]), 0
+        
+        error_msg = f" ({totals.skipped} errors)" if totals.skipped else ""
+        if dry_run:
+            return True, f"Dry run: {totals.imported} patient records would be imported{error_msg}", totals.imported
+        
+        logger.info(f"Imported {totals.imported} patients in {totals.chunks} chunks by {username}")
+        if mode == 'upsert':
+            error_msg = (f" ({totals.inserted} inserted, {totals.updated} updated, "
+                         f"{totals.unchanged} unchanged){error_msg}")
+        return True, f"Successfully imported {totals.imported} patient records!{error_msg}", totals.imported
+    
+    def _import_chunks_parallel(self, chunks: Iterable[Union[pd.DataFrame, List[Dict]]], username: str,
+                                totals: ImportTotals, progress: Optional[Callable[[ImportTotals], None]],
+                                workers: int, writers: int, mode: str,
+                                profile: Optional[ImportProfile] = None, dry_run: bool = False,
+                                batch_written: Optional[Callable[[List[int]], None]] = None):
+        """Prepare chunks in worker processes and insert them from writer threads"""
+        prepare_pool = ProcessPoolExecutor(
+            max_workers=workers, initializer=init_import_worker,
+            initargs=(encryption_service.key if encryption_service else None,)
+        ) if workers > 1 else None
+        writer_pool = ThreadPoolExecutor(max_workers=writers, thread_name_prefix='import-writer')
+        preparing = deque()
+        inserting = deque()
+        
+        def finish_insert():
+            valid_patients, future = inserting.popleft()
+            counts = future.result()
+            totals.add_batch(counts)
+            if not dry_run:
+                report_written_batch(batch_written, valid_patients, counts)
+            if progress:
+                progress(totals)
+        
+        def finish_prepare():
+            rows, future = preparing.popleft()
+            valid_patients, errors, *stages = future.result()
+            if stages and profile:
+                profile.merge(stages[0])
+            totals.add_chunk(rows, errors)
+            while len(inserting) >= writers * 2:
+                finish_insert()
+            if valid_patients:
+                inserting.append((valid_patients, writer_pool.submit(
+                    self._write_import_batch, valid_patients, mode, profile, dry_run
+                )))
+            else:
+                inserting.append((valid_patients, _completed({'inserted': 0, 'updated': 0, 'unchanged': 0})))
+        
+        try:
+            next_row = 1
+            for chunk in chunks:
+                if prepare_pool and profile:
+                    future = prepare_pool.submit(
+                        prepare_import_chunk_profiled, chunk, username, next_row, profile.track_memory
+                    )
+                elif prepare_pool:
+                    future = prepare_pool.submit(prepare_import_chunk, chunk, username, next_row)
+                else:
+                    future = _completed(prepare_import_chunk(chunk, username, next_row, profile))
+                preparing.append((len(chunk), future))
+                next_row += len(chunk)
+                while len(preparing) >= max(workers, 1) * 2:
+                    finish_prepare()
+            
+            while preparing:
+                finish_prepare()
+            while inserting:
+                finish_insert()
+        finally:
+            if prepare_pool:
+                prepare_pool.shutdown(cancel_futures=True)
+            writer_pool.shutdown(cancel_futures=True)
+            # Count batches that landed before an error stopped the import
+            for _, future in inserting:
+                if not future.cancelled() and future.exception() is None:
+                    totals.add_batch(future.result())
+    
+    def _write_import_batch(self, valid_patients: List[Dict], mode: str = 'insert',
+                            profile: Optional[ImportProfile] = None, dry_run: bool = False) -> Dict[str, int]:
+        """
+        Write one batch of prepared patients and keep the statistics current
+        
+        Returns:
+            Counts of 'inserted', 'updated' and 'unchanged' rows
+        """
+        if dry_run:
+            return {'inserted': len(valid_patients), 'updated': 0, 'unchanged': 0}
+        
+        with profile_stage(profile, 'insert', len(valid_patients)):
+            if mode == 'upsert':
+                return self._upsert_import_batch(valid_patients)
+            
+            counts = {'inserted': self.patient_repo.bulk_insert_patients(valid_patients), 'updated': 0, 'unchanged': 0}
+            if valid_patients:
+                self.patient_repo.increment_statistics(merge_statistics_deltas(
+                    *(statistics_delta(patient) for patient in valid_patients)
+                ))
+        return counts
+    
+    def _upsert_import_batch(self, valid_patients: List[Dict]) -> Dict[str, int]:
+        """
+        Upsert one batch, moving the statistics from each row's stored version to its new one
+        
+        The stored versions are read first with one ``$in`` query. They give
+        the statistics delta of updated rows, and let sensitive fields keep
+        their stored ciphertext when unchanged so identical rows stay
+        'unchanged'. If the writes don't line up with what was read (a row
+        changed in between, or an id repeats within the batch) the statistics
+        are rebuilt on next read instead.
+        
+        Returns:
+            Counts of 'inserted', 'updated' and 'unchanged' rows
+        """
+        record_ids = [patient['id'] for patient in valid_patients]
+        stored = self.patient_repo.get_patients_by_record_ids(record_ids)
+        for patient in valid_patients:
+            keep_stored_encryption(patient, stored.get(patient['id']))
+        
+        counts = self.patient_repo.upsert_patients(valid_patients)
+        
+        if len(set(record_ids)) != len(record_ids) or counts['inserted'] != len(record_ids) - len(stored):
+            self.patient_repo.invalidate_statistics()
+            return counts
+        deltas = []
+        for patient in valid_patients:
+            previous = stored.get(patient['id'])
+            if previous is None:
+                deltas.append(statistics_delta(patient))
+            else:
+                deltas.extend([statistics_delta(previous, -1), statistics_delta({**previous, **patient})])
+        self.patient_repo.increment_statistics(merge_statistics_deltas(*deltas))
+        return counts
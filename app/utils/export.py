@@ -0,0 +1,38 @@
+"""
+Streaming serializers for patient exports
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List
+
+
+def _json_default(value: Any) -> Any:
+    """Serialize values the json module doesn't handle natively"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def ndjson_lines(documents: Iterable[Dict]) -> Iterator[str]:
+    """Yield one JSON document per line"""
+    for document in documents:
+        yield json.dumps(document, default=_json_default) + '\n'
+
+
+def csv_lines(documents: Iterable[Dict], columns: List[str]) -> Iterator[str]:
+    """Yield a CSV header row followed by one row per document"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore')
+    
+    writer.writeheader()
+    for document in documents:
+        writer.writerow(document)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    
+    # Header is still buffered if there were no documents
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,131 @@
+"""
+Encoding single prediction inputs without pandas
+"""
+import threading
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from sklearn.compose import ColumnTransformer
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+
+def is_nan(value) -> bool:
+    """Whether ``value`` is a float NaN (the imputers' default missing marker)"""
+    return isinstance(value, float) and value != value
+
+
+class FeatureEncoder:
+    """
+    The fitted preprocessing of a model pipeline as plain arrays
+
+    ``from_pipeline`` reads the median imputer, scaler and one-hot encoder
+    parameters out of the pipeline's ColumnTransformer once, and ``encode``
+    then writes a patient's features straight into a preallocated row laid
+    out exactly like the transformer's output, skipping the DataFrame and
+    the transformer's per-call checks. Each thread gets its own row.
+    """
+
+    def __init__(self, numeric: List[Tuple[str, int, float, float, float]],
+                 categorical: List[Tuple[str, Dict[str, int]]], width: int):
+        self.numeric = numeric
+        self.categorical = categorical
+        self.width = width
+        self._local = threading.local()
+
+    @classmethod
+    def from_pipeline(cls, pipeline) -> 'FeatureEncoder':
+        """
+        Extract the preprocessing parameters of a fitted pipeline
+
+        Raises:
+            ValueError: if the preprocessing isn't an imputer/scaler and
+                one-hot ColumnTransformer this encoder can reproduce
+        """
+        preprocessor = pipeline.steps[0][1] if hasattr(pipeline, 'steps') else None
+        if not isinstance(preprocessor, ColumnTransformer):
+            raise ValueError("Model pipeline doesn't start with a ColumnTransformer")
+        # Steps between it and the classifier must do nothing at predict time, like SMOTE
+        for name, step in pipeline.steps[1:-1]:
+            if step not in (None, 'passthrough') and not hasattr(step, 'fit_resample'):
+                raise ValueError(f"Unsupported pipeline step: {name}")
+
+        numeric, categorical = [], []
+        position = 0
+        for name, transformer, columns in preprocessor.transformers_:
+            if transformer == 'drop' or len(columns) == 0:
+                continue
+            if name == 'remainder' or isinstance(transformer, str):
+                raise ValueError(f"Unsupported transformer: {name}")
+            steps = [step for _, step in transformer.steps] if isinstance(transformer, Pipeline) else [transformer]
+            columns = list(columns)
+
+            if len(steps) == 1 and isinstance(steps[0], OneHotEncoder):
+                encoder = steps[0]
+                if encoder.drop_idx_ is not None or getattr(encoder, '_infrequent_enabled', False):
+                    raise ValueError("One-hot encoders that drop or group categories are not supported")
+                for column, categories in zip(columns, encoder.categories_):
+                    categorical.append((column, {str(category): position + offset
+                                                 for offset, category in enumerate(categories)}))
+                    position += len(categories)
+                continue
+
+            # Missing values pass through unless an imputer comes before any scaling
+            fill = np.full(len(columns), np.nan)
+            mean = np.zeros(len(columns))
+            scale = np.ones(len(columns))
+            scaled = False
+            for step in steps:
+                if isinstance(step, SimpleImputer) and not scaled and is_nan(step.missing_values) \
+                        and not step.add_indicator:
+                    if len(step.statistics_) != len(columns) or np.isnan(step.statistics_).any():
+                        raise ValueError("Imputers that drop columns are not supported")
+                    fill = step.statistics_.astype(float)
+                elif isinstance(step, StandardScaler) and not scaled:
+                    if step.mean_ is not None:
+                        mean = step.mean_
+                    if step.scale_ is not None:
+                        scale = step.scale_
+                    scaled = True
+                else:
+                    raise ValueError(f"Unsupported preprocessing step: {type(step).__name__}")
+            for offset, column in enumerate(columns):
+                numeric.append((column, position + offset, fill[offset], mean[offset], scale[offset]))
+            position += len(columns)
+
+        return cls(numeric, categorical, position)
+
+    def encode(self, features: Dict[str, Any]) -> np.ndarray:
+        """
+        Encode one patient's features as a 1 x ``width`` row
+
+        The row is reused by the next call from the same thread, so use it
+        (or copy it) first.
+        """
+        row = getattr(self._local, 'row', None)
+        if row is None:
+            row = self._local.row = np.zeros((1, self.width))
+        else:
+            row.fill(0.0)
+        self._fill(row[0], features)
+        return row
+
+    def encode_many(self, rows: List[Dict[str, Any]]) -> np.ndarray:
+        """Encode many patients' features as a new len(rows) x ``width`` matrix"""
+        matrix = np.zeros((len(rows), self.width))
+        for values, features in zip(matrix, rows):
+            self._fill(values, features)
+        return matrix
+
+    def _fill(self, values: np.ndarray, features: Dict[str, Any]):
+        """Write encoded features into a zeroed row"""
+        for column, position, fill, mean, scale in self.numeric:
+            value = float(features[column])
+            if value != value:
+                value = fill
+            values[position] = (value - mean) / scale
+        for column, positions in self.categorical:
+            position = positions.get(features[column])
+            if position is not None:
+                values[position] = 1.0
@@ -0,0 +1,145 @@
+"""
+Array-based evaluation of fitted random forests
+"""
+import os
+from typing import Optional
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+# Arrays written by FlatForest.save, one .npy file each
+FOREST_ARRAYS = ('feature', 'threshold', 'left', 'right', 'missing_left', 'values', 'roots', 'classes_')
+
+
+class FlatForest:
+    """
+    The trees of a fitted RandomForestClassifier in contiguous arrays
+
+    Every tree's nodes are laid end to end in one set of arrays (split
+    feature, threshold, left and right child, which way missing values go
+    and the class probabilities of leaves), with child indices pointing into
+    the shared arrays and leaves pointing at themselves. ``predict_proba``
+    then walks all trees for all rows at once, one level per step, instead
+    of calling into each tree separately. Inputs are rounded to float32 and
+    leaf probabilities are summed in tree order as sklearn does, so the
+    results are identical to the classifier's when it scores trees
+    sequentially.
+    """
+
+    def __init__(self, feature: np.ndarray, threshold: np.ndarray, left: np.ndarray, right: np.ndarray,
+                 missing_left: np.ndarray, values: np.ndarray, roots: np.ndarray, depth: int,
+                 n_features: int, classes: np.ndarray):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.missing_left = missing_left
+        self.values = values
+        self.roots = roots
+        self.depth = depth
+        self.n_features = n_features
+        self.classes_ = classes
+
+    @classmethod
+    def from_classifier(cls, classifier: RandomForestClassifier) -> 'FlatForest':
+        """
+        Export the trees of a fitted forest
+
+        Raises:
+            ValueError: if ``classifier`` isn't a fitted single-output
+                RandomForestClassifier
+        """
+        if not isinstance(classifier, RandomForestClassifier) or not hasattr(classifier, 'estimators_'):
+            raise ValueError("Only fitted RandomForestClassifier models can be flattened")
+        if classifier.n_outputs_ != 1:
+            raise ValueError("Multi-output forests are not supported")
+
+        features, thresholds, lefts, rights, missing, values, roots = [], [], [], [], [], [], []
+        offset = 0
+        for estimator in classifier.estimators_:
+            tree = estimator.tree_
+            nodes = np.arange(tree.node_count)
+            leaf = tree.children_left == -1
+
+            roots.append(offset)
+            features.append(np.where(leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            lefts.append(np.where(leaf, nodes, tree.children_left) + offset)
+            rights.append(np.where(leaf, nodes, tree.children_right) + offset)
+            missing.append(getattr(tree, 'missing_go_to_left', np.zeros(tree.node_count, dtype=np.uint8)) == 1)
+
+            # Each tree's class probabilities, normalized as DecisionTreeClassifier.predict_proba does
+            proba = tree.value[:, 0, :classifier.n_classes_].copy()
+            normalizer = proba.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            proba /= normalizer
+            values.append(proba)
+            offset += tree.node_count
+
+        return cls(
+            np.ascontiguousarray(np.concatenate(features), dtype=np.intp),
+            np.ascontiguousarray(np.concatenate(thresholds), dtype=np.float64),
+            np.ascontiguousarray(np.concatenate(lefts), dtype=np.intp),
+            np.ascontiguousarray(np.concatenate(rights), dtype=np.intp),
+            np.ascontiguousarray(np.concatenate(missing)),
+            np.ascontiguousarray(np.concatenate(values), dtype=np.float64),
+            np.asarray(roots, dtype=np.intp),
+            max(estimator.tree_.max_depth for estimator in classifier.estimators_),
+            classifier.n_features_in_,
+            classifier.classes_
+        )
+
+    def save(self, directory: str):
+        """Write the arrays as .npy files that ``load`` can memory-map"""
+        os.makedirs(directory, exist_ok=True)
+        for name in FOREST_ARRAYS:
+            np.save(os.path.join(directory, f'{name}.npy'), getattr(self, name))
+        np.save(os.path.join(directory, 'shape.npy'), np.array([self.depth, self.n_features]))
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: Optional[str] = 'r') -> 'FlatForest':
+        """
+        Read a saved forest
+
+        With ``mmap_mode`` the arrays stay in the page cache, shared by
+        every process that maps them, instead of being copied into each.
+        """
+        arrays = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mmap_mode)
+                  for name in FOREST_ARRAYS}
+        depth, n_features = np.load(os.path.join(directory, 'shape.npy'))
+        return cls(arrays['feature'], arrays['threshold'], arrays['left'], arrays['right'],
+                   arrays['missing_left'], arrays['values'], arrays['roots'], int(depth), int(n_features),
+                   np.asarray(arrays['classes_']))
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        """Index of the leaf each row reaches in each tree, as a trees x rows array"""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected rows of {self.n_features} features, got shape {X.shape}")
+
+        # Walk every (tree, row) path a level at a time, dropping paths once they reach a leaf
+        nodes = np.repeat(self.roots, len(X))
+        rows = np.tile(np.arange(len(X)), self.n_trees)
+        active = np.arange(len(nodes))
+        for _ in range(self.depth):
+            current = nodes[active]
+            split = self.left[current] != current
+            active, current = active[split], current[split]
+            if not len(active):
+                break
+            values = X[rows[active], self.feature[current]]
+            go_left = np.where(np.isnan(values), self.missing_left[current], values <= self.threshold[current])
+            nodes[active] = np.where(go_left, self.left[current], self.right[current])
+        return nodes.reshape(self.n_trees, len(X))
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Class probabilities averaged over the trees, one row per input row"""
+        proba = np.zeros((len(X), self.values.shape[1]))
+        for leaves in self.values[self.apply(X)]:
+            proba += leaves
+        proba /= self.n_trees
+        return proba
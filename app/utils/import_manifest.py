@@ -0,0 +1,113 @@
+"""
+Content-hash manifests for incremental patient imports
+"""
+import os
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from app.repositories.patient_repository import DATASET_FIELDS
+
+
+class ImportManifest:
+    """
+    Content hashes of the rows of the last import, keyed by patient id
+
+    ``changed`` compares each chunk of a new feed against the manifest so
+    only new and changed rows need validating and writing, and
+    ``mark_written`` records which of them reached the database;
+    ``updated`` then gives the manifest to save for the next run. Rows are
+    hashed as read, before cleaning fills in missing values, on the
+    patient fields only, with pandas' vectorized row hashing.
+    """
+
+    def __init__(self, ids: Optional[Sequence[int]] = None, hashes: Optional[Sequence[int]] = None):
+        self.ids = np.asarray(ids if ids is not None else [], dtype=np.int64)
+        self.hashes = np.asarray(hashes if hashes is not None else [], dtype=np.uint64)
+        self._index = pd.Index(self.ids)
+        self._seen_ids = []
+        self._changed_ids = []
+        self._changed_hashes = []
+        self._written_ids = []
+        self.changed_rows = 0
+        self.unchanged_rows = 0
+
+    @classmethod
+    def load(cls, path: str) -> 'ImportManifest':
+        """Read a saved manifest, or start an empty one if ``path`` doesn't exist"""
+        if not os.path.exists(path):
+            return cls()
+        with np.load(path) as data:
+            return cls(data['ids'], data['hashes'])
+
+    def save(self, path: str):
+        """Write the manifest, replacing any previous file in one step"""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as f:
+            np.savez(f, ids=self.ids, hashes=self.hashes)
+        os.replace(temp_path, path)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @staticmethod
+    def row_hashes(frame: pd.DataFrame) -> np.ndarray:
+        """64-bit content hash of each row's patient fields"""
+        fields = [field for field in DATASET_FIELDS if field in frame.columns]
+        return pd.util.hash_pandas_object(frame[fields], index=False).to_numpy()
+
+    def changed(self, frame: pd.DataFrame) -> np.ndarray:
+        """
+        Find the rows of a chunk that are new or differ from the manifest
+
+        Returns:
+            Boolean mask over the chunk's rows
+        """
+        ids = frame['id'].to_numpy(dtype=np.int64)
+        hashes = self.row_hashes(frame)
+        self._seen_ids.append(ids)
+
+        positions = self._index.get_indexer(ids)
+        known = positions >= 0
+        mask = ~known
+        mask[known] = self.hashes[positions[known]] != hashes[known]
+        self._changed_ids.append(ids[mask])
+        self._changed_hashes.append(hashes[mask])
+
+        changed = int(mask.sum())
+        self.changed_rows += changed
+        self.unchanged_rows += len(mask) - changed
+        return mask
+
+    def mark_written(self, ids: Sequence[int]):
+        """Record that the changed rows with these ids were written to the database"""
+        self._written_ids.append(np.asarray(ids, dtype=np.int64))
+
+    def removed_rows(self) -> int:
+        """Ids in the manifest that weren't seen in this run's feed"""
+        if not self._seen_ids:
+            return len(self.ids)
+        return int((~self._index.isin(np.concatenate(self._seen_ids))).sum())
+
+    def updated(self) -> 'ImportManifest':
+        """
+        The manifest of the rows seen in this run
+
+        Changed rows that were written take their new hash (the last row
+        wins for a repeated id). Rows that were skipped or failed keep their
+        previous hash, or stay out if they are new, so the next run retries
+        them.
+        """
+        if not self._seen_ids:
+            return ImportManifest()
+        seen = self._index.isin(np.concatenate(self._seen_ids))
+        changed_ids = np.concatenate(self._changed_ids)
+        changed_hashes = np.concatenate(self._changed_hashes)
+        written = np.concatenate(self._written_ids) if self._written_ids else np.array([], dtype=np.int64)
+        landed = np.isin(changed_ids, written)
+        ids = np.concatenate([self.ids[seen], changed_ids[landed]])
+        hashes = np.concatenate([self.hashes[seen], changed_hashes[landed]])
+
+        last = ~pd.Index(ids).duplicated(keep='last')
+        return ImportManifest(ids[last], hashes[last])
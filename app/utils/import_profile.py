@@ -0,0 +1,144 @@
+"""
+Per-stage profiling for patient imports
+"""
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+# Import stages in pipeline order, as they appear in reports
+IMPORT_STAGES = ('read', 'clean_data', 'manifest', 'check_data', 'sanitize', 'validate', 'to_records', 'encrypt', 'insert')
+
+
+class ImportProfile:
+    """
+    Wall time, rows and peak memory for each stage of an import
+
+    Stages can nest, as when reading a chunk runs a generator that also
+    cleans it; each stage is charged only its own time. With
+    ``track_memory`` the peak memory traced by tracemalloc (Python and NumPy
+    allocations) during each stage is recorded as well, at some cost in
+    speed. Stages run concurrently by writer threads add up their time.
+    """
+
+    def __init__(self, track_memory: bool = False):
+        self.track_memory = track_memory
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._started_tracing = False
+        if track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    @contextmanager
+    def stage(self, name: str, rows: int = 0) -> Iterator[Dict[str, Any]]:
+        """
+        Time a stage processing ``rows`` rows
+
+        Yields a dict whose 'rows' can be set inside the block when the row
+        count is only known afterwards.
+        """
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        timing = {'rows': rows, 'nested_seconds': 0.0, 'peak': 0}
+        if self.track_memory:
+            if stack:
+                stack[-1]['peak'] = max(stack[-1]['peak'], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+
+        stack.append(timing)
+        start = time.perf_counter()
+        try:
+            yield timing
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            peak = max(timing['peak'], tracemalloc.get_traced_memory()[1]) if self.track_memory else 0
+            if stack:
+                stack[-1]['nested_seconds'] += elapsed
+                stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+            self.add(name, elapsed - timing['nested_seconds'], timing['rows'], peak)
+
+    def add(self, name: str, seconds: float, rows: int = 0, peak_memory: int = 0, calls: int = 1):
+        """Add timings for a stage (used for stages measured elsewhere)"""
+        with self._lock:
+            stage = self.stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'rows': 0, 'peak_memory': 0})
+            stage['calls'] += calls
+            stage['seconds'] += seconds
+            stage['rows'] += rows
+            stage['peak_memory'] = max(stage['peak_memory'], peak_memory)
+
+    def merge(self, stages: Dict[str, Dict[str, Any]]):
+        """Add the ``stages`` of another profile, such as one from a worker process"""
+        for name, stage in stages.items():
+            self.add(name, stage['seconds'], stage['rows'], stage['peak_memory'], stage['calls'])
+
+    def stop(self):
+        """Stop the overall clock, and tracemalloc if this profile started it"""
+        self.finished = time.perf_counter()
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def report(self) -> Dict[str, Any]:
+        """
+        The profile as a plain dictionary
+
+        Returns:
+            Dict with 'total_seconds' and 'stages', a list in pipeline order
+            of each stage's 'stage', 'calls', 'seconds', 'rows',
+            'rows_per_second' and 'peak_memory' (bytes, or None if untracked)
+        """
+        order = {name: position for position, name in enumerate(IMPORT_STAGES)}
+        names = sorted(self.stages, key=lambda name: (order.get(name, len(order)), name))
+        stages = []
+        for name in names:
+            stage = self.stages[name]
+            stages.append({
+                'stage': name,
+                'calls': stage['calls'],
+                'seconds': round(stage['seconds'], 6),
+                'rows': stage['rows'],
+                'rows_per_second': round(stage['rows'] / stage['seconds']) if stage['seconds'] else None,
+                'peak_memory': stage['peak_memory'] if self.track_memory else None
+            })
+        total = (self.finished or time.perf_counter()) - self.started
+        return {'total_seconds': round(total, 6), 'stages': stages}
+
+    def format_report(self) -> str:
+        """The profile as a text table"""
+        report = self.report()
+        lines = [f"{'Stage':<12}{'Calls':>8}{'Seconds':>10}{'Share':>8}{'Rows':>10}{'Rows/s':>12}{'Peak MB':>10}"]
+        for stage in report['stages']:
+            share = stage['seconds'] / report['total_seconds'] * 100 if report['total_seconds'] else 0
+            rate = f"{stage['rows_per_second']:,}" if stage['rows_per_second'] is not None else '-'
+            peak = f"{stage['peak_memory'] / 1024 / 1024:.1f}" if stage['peak_memory'] is not None else '-'
+            lines.append(f"{stage['stage']:<12}{stage['calls']:>8}{stage['seconds']:>10.3f}{share:>7.1f}%"
+                         f"{stage['rows']:>10}{rate:>12}{peak:>10}")
+        lines.append(f"{'total':<12}{'':>8}{report['total_seconds']:>10.3f}")
+        return '\n'.join(lines)
+
+
+def profile_stage(profile: Optional[ImportProfile], name: str, rows: int = 0):
+    """``profile.stage(name, rows)``, or a no-op block when not profiling"""
+    if profile is None:
+        return nullcontext({'rows': rows})
+    return profile.stage(name, rows)
+
+
+def profiled_chunks(chunks: Iterable, profile: ImportProfile) -> Iterator:
+    """Yield from ``chunks``, timing each read as the 'read' stage"""
+    iterator = iter(chunks)
+    while True:
+        with profile.stage('read') as timing:
+            chunk = next(iterator, None)
+            if chunk is not None:
+                timing['rows'] = len(chunk)
+        if chunk is None:
+            return
+        yield chunk
@@ -0,0 +1,160 @@
+"""
+Chunked readers for patient imports
+"""
+import os
+from typing import IO, Any, Dict, Iterator, List, Optional, Sequence, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app.repositories.patient_repository import DATASET_FIELDS
+
+# Arrow types the patient fields are read as from columnar files
+PATIENT_ARROW_TYPES = {
+    'id': pa.int64(),
+    'gender': pa.string(),
+    'age': pa.float64(),
+    'hypertension': pa.int64(),
+    'heart_disease': pa.int64(),
+    'ever_married': pa.string(),
+    'work_type': pa.string(),
+    'Residence_type': pa.string(),
+    'avg_glucose_level': pa.float64(),
+    'bmi': pa.float64(),
+    'smoking_status': pa.string(),
+    'stroke': pa.int64()
+}
+
+# File extensions the import accepts, and the reader for each
+IMPORT_FORMATS = {
+    '.csv': 'csv',
+    '.parquet': 'parquet',
+    '.arrow': 'ipc',
+    '.feather': 'ipc',
+    '.ipc': 'ipc'
+}
+
+
+def csv_chunks(source: Union[str, IO], chunksize: int = 1000,
+               fields: Optional[Sequence[str]] = None) -> Iterator[pd.DataFrame]:
+    """
+    Read a CSV file as a stream of DataFrames of at most ``chunksize`` rows
+
+    Only one chunk is held in memory at a time, so files of any size can
+    be imported with bounded memory. ``fields`` limits the columns read.
+    """
+    with pd.read_csv(source, chunksize=chunksize, usecols=fields) as reader:
+        yield from reader
+
+
+def patient_column_mapping(names: Sequence[str], fields: Optional[Sequence[str]] = None) -> Dict[str, str]:
+    """
+    Match a columnar file's column names to patient fields
+
+    Names are matched ignoring case and surrounding whitespace, so
+    ``residence_type`` maps to ``Residence_type``.
+
+    Returns:
+        Dict of source column name to patient field
+
+    Raises:
+        ValueError: if any of ``fields`` (default: all patient fields) is missing
+    """
+    fields = list(fields or DATASET_FIELDS)
+    by_key = {name.strip().lower(): name for name in names}
+    mapping = {by_key[field.lower()]: field for field in fields if field.lower() in by_key}
+
+    missing = [field for field in fields if field not in mapping.values()]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+    return mapping
+
+
+def conform_batch(batch: pa.RecordBatch, mapping: Dict[str, str]) -> pd.DataFrame:
+    """
+    Convert a record batch to a DataFrame of patient fields
+
+    Mapped columns are renamed and cast to PATIENT_ARROW_TYPES; others are
+    dropped. Numeric columns stay numeric, so nothing is parsed from text.
+
+    Raises:
+        ValueError: if a column can't be cast to its field's type
+    """
+    arrays = []
+    for source, field in mapping.items():
+        try:
+            arrays.append(batch.column(source).cast(PATIENT_ARROW_TYPES[field]))
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+            raise ValueError(f"Column '{source}' can't be read as {PATIENT_ARROW_TYPES[field]}: {str(e)}")
+    return pa.RecordBatch.from_arrays(arrays, names=list(mapping.values())).to_pandas()
+
+
+def parquet_chunks(source: Union[str, IO], chunksize: int = 1000,
+                   fields: Optional[Sequence[str]] = None) -> Iterator[pd.DataFrame]:
+    """
+    Read a Parquet file as a stream of DataFrames of at most ``chunksize`` rows
+
+    Only the patient columns are decoded, one batch at a time.
+    """
+    parquet = pq.ParquetFile(source)
+    mapping = patient_column_mapping(parquet.schema_arrow.names, fields)
+    for batch in parquet.iter_batches(batch_size=chunksize, columns=list(mapping)):
+        yield conform_batch(batch, mapping)
+
+
+def ipc_chunks(source: str, chunksize: int = 1000,
+               fields: Optional[Sequence[str]] = None) -> Iterator[pd.DataFrame]:
+    """
+    Read an Arrow IPC (Feather v2) file or stream as DataFrames of at most ``chunksize`` rows
+
+    The file is memory-mapped, so record batches are sliced without
+    copying and unused columns are never read.
+    """
+    with pa.memory_map(source) as stream:
+        try:
+            reader = pa.ipc.open_file(stream)
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        except pa.ArrowInvalid:
+            stream.seek(0)
+            reader = pa.ipc.open_stream(stream)
+            batches = iter(reader)
+
+        mapping = patient_column_mapping(reader.schema.names, fields)
+        for batch in batches:
+            for offset in range(0, batch.num_rows, chunksize):
+                yield conform_batch(batch.slice(offset, chunksize), mapping)
+
+
+def import_format(path: str) -> Optional[str]:
+    """The reader for a file name ('csv', 'parquet' or 'ipc'), or None if unsupported"""
+    return IMPORT_FORMATS.get(os.path.splitext(path)[1].lower())
+
+
+def file_chunks(path: str, chunksize: int = 1000,
+                fields: Optional[Sequence[str]] = None) -> Iterator[pd.DataFrame]:
+    """
+    Read a CSV, Parquet or Arrow IPC file as a stream of DataFrames
+
+    The format is chosen from the file extension (see IMPORT_FORMATS).
+
+    Raises:
+        ValueError: if the extension isn't supported
+    """
+    readers = {'csv': csv_chunks, 'parquet': parquet_chunks, 'ipc': ipc_chunks}
+    file_format = import_format(path)
+    if file_format is None:
+        raise ValueError(f"Unsupported file type: {path}")
+    return readers[file_format](path, chunksize=chunksize, fields=fields)
+
+
+def frame_records(frame: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Convert a DataFrame to a list of row dictionaries
+
+    Equivalent to ``frame.to_dict('records')`` but builds rows from whole
+    columns converted to Python values, which is several times faster.
+    """
+    columns = list(frame.columns)
+    values = [frame[column].tolist() for column in columns]
+    return [dict(zip(columns, row)) for row in zip(*values)]
@@ -0,0 +1,130 @@
+"""
+Versioned model artifacts on disk
+"""
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import joblib
+
+from app.utils.forest import FlatForest
+
+MODEL_FILENAME = 'stroke_model.joblib'
+FOREST_DIRNAME = 'forest'
+CURRENT_FILENAME = 'CURRENT'
+VERSIONS_DIRNAME = 'versions'
+
+
+class ModelStore:
+    """
+    A model directory holding one subdirectory per trained version
+
+    ``publish`` writes a new version into a staging directory, renames it
+    into ``versions/`` and only then points the ``CURRENT`` file at it (by
+    replacing that file), so a reader sees either the old version or the
+    complete new one. Each version holds the pipeline and, for random
+    forests, its flattened arrays for memory-mapping. A directory with no
+    ``CURRENT`` file falls back to a single ``stroke_model.joblib``.
+
+    After each publish only the newest ``keep`` versions are kept (all of
+    them if ``keep`` is None); the current version is never removed.
+    Workers that still have an older version memory-mapped keep reading it
+    until they reload, since removing its files doesn't unmap them.
+    """
+
+    def __init__(self, root: str, keep: Optional[int] = 5):
+        if keep is not None and keep < 1:
+            raise ValueError("keep must be at least 1")
+        self.root = root
+        self.keep = keep
+
+    def current_version(self) -> Optional[str]:
+        """Name of the published version, or None for an unversioned directory"""
+        try:
+            with open(os.path.join(self.root, CURRENT_FILENAME)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def versions(self) -> List[str]:
+        """Names of the published versions, oldest first"""
+        try:
+            names = os.listdir(os.path.join(self.root, VERSIONS_DIRNAME))
+        except FileNotFoundError:
+            return []
+        # Version names are timestamps, so they sort by age; staging directories are hidden
+        return sorted(name for name in names if not name.startswith('.'))
+
+    def version_dir(self, version: str) -> str:
+        return os.path.join(self.root, VERSIONS_DIRNAME, version)
+
+    def model_path(self, version: Optional[str]) -> str:
+        """Pipeline file of ``version`` (or of the unversioned directory)"""
+        if version is None:
+            return os.path.join(self.root, MODEL_FILENAME)
+        return os.path.join(self.version_dir(version), MODEL_FILENAME)
+
+    def forest_dir(self, version: Optional[str]) -> Optional[str]:
+        """Flattened forest arrays of ``version``, if it has them"""
+        if version is None:
+            return None
+        directory = os.path.join(self.version_dir(version), FOREST_DIRNAME)
+        return directory if os.path.isdir(directory) else None
+
+    def fingerprint(self) -> Tuple[Optional[str], str, int]:
+        """
+        What is current: (version, model path, modification time)
+
+        A change means there is a new model to load.
+
+        Raises:
+            FileNotFoundError: if there is no model file
+        """
+        version = self.current_version()
+        path = self.model_path(version)
+        return version, path, os.stat(path).st_mtime_ns
+
+    def publish(self, pipeline) -> str:
+        """
+        Save a trained pipeline as a new version and make it current
+
+        Returns:
+            The new version's name
+        """
+        versions = os.path.join(self.root, VERSIONS_DIRNAME)
+        os.makedirs(versions, exist_ok=True)
+        version = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+
+        staging = tempfile.mkdtemp(prefix='.staging-', dir=versions)
+        # Uncompressed, so the arrays in it can be memory-mapped
+        joblib.dump(pipeline, os.path.join(staging, MODEL_FILENAME))
+        try:
+            FlatForest.from_classifier(pipeline.steps[-1][1]).save(os.path.join(staging, FOREST_DIRNAME))
+        except (ValueError, AttributeError):
+            pass
+        os.replace(staging, os.path.join(versions, version))
+
+        temp_path = os.path.join(self.root, f'{CURRENT_FILENAME}.tmp')
+        with open(temp_path, 'w') as f:
+            f.write(version)
+        os.replace(temp_path, os.path.join(self.root, CURRENT_FILENAME))
+        self.prune()
+        return version
+
+    def prune(self) -> List[str]:
+        """
+        Remove versions older than the newest ``keep``, except the current one
+
+        Returns:
+            Names of the versions removed
+        """
+        if self.keep is None:
+            return []
+        current = self.current_version()
+        versions = self.versions()
+        removed = [version for version in versions[:-self.keep] if version != current]
+        for version in removed:
+            shutil.rmtree(self.version_dir(version), ignore_errors=True)
+        return removed
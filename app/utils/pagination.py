@@ -0,0 +1,83 @@
+"""
+Keyset (cursor) pagination helpers
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from bson.objectid import ObjectId
+
+
+def encode_cursor(document: Dict[str, Any]) -> str:
+    """
+    Build an opaque cursor token from a patient document
+
+    The token captures the document's position in the listing sort
+    order (``created_at`` descending, ``_id`` descending).
+    """
+    created_at = document.get('created_at')
+    payload = {
+        'c': created_at.isoformat() if isinstance(created_at, datetime) else None,
+        'i': str(document['_id'])
+    }
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token: str) -> Tuple[Optional[datetime], ObjectId]:
+    """
+    Decode a cursor token produced by ``encode_cursor``
+
+    Returns:
+        (created_at, object_id)
+
+    Raises:
+        ValueError: if the token is malformed
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        created_at = payload.get('c')
+        return (
+            datetime.fromisoformat(created_at) if created_at else None,
+            ObjectId(payload['i'])
+        )
+    except Exception:
+        raise ValueError("Invalid pagination cursor")
+
+
+def keyset_query(token: str, direction: str) -> Dict[str, Any]:
+    """
+    Build the MongoDB filter selecting documents after/before a cursor
+
+    Documents without ``created_at`` (legacy imports) sort after every
+    dated document in descending order, so they are handled explicitly.
+
+    Args:
+        token: Cursor token
+        direction: 'after' (older documents) or 'before' (newer documents)
+    """
+    created_at, object_id = decode_cursor(token)
+
+    if direction == 'after':
+        if created_at is None:
+            return {'created_at': None, '_id': {'$lt': object_id}}
+        return {'$or': [
+            {'created_at': {'$lt': created_at}},
+            {'created_at': created_at, '_id': {'$lt': object_id}},
+            {'created_at': None}
+        ]}
+
+    if direction == 'before':
+        if created_at is None:
+            return {'$or': [
+                {'created_at': {'$ne': None}},
+                {'created_at': None, '_id': {'$gt': object_id}}
+            ]}
+        return {'$or': [
+            {'created_at': {'$gt': created_at}},
+            {'created_at': created_at, '_id': {'$gt': object_id}}
+        ]}
+
+    raise ValueError(f"Unknown cursor direction: {direction}")
@@ -23,6 +23,20 @@ class Config:
     MONGO_URI = os.environ.get('MONGO_URI') or 'mongodb://localhost:27017/'
     MONGO_DB_NAME = os.environ.get('MONGO_DB_NAME') or 'stroke_prediction_db'
     
+    # MongoDB Connection Pool Configuration
+    MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE') or 100)
+    MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE') or 0)
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS') or 5000)
+    MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS') or 10000)
+    MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS') or 30000)
+    MONGO_COMPRESSORS = os.environ.get('MONGO_COMPRESSORS') or 'zlib'  # e.g. 'zstd,snappy,zlib'
+    # Threads running a request's independent queries (e.g. a list or search page and its count) concurrently
+    MONGO_QUERY_WORKERS = int(os.environ.get('MONGO_QUERY_WORKERS') or 8)
+    
+    # Build indexes when the app first connects (deployments use scripts/manage_indexes.py).
+    # Otherwise the app only warns if the text search index is missing.
+    MONGO_ENSURE_INDEXES = False
+    
     # Security Headers
     SECURITY_HEADERS = {
         'Strict-Transport-Security': 'max-age=31536000; includeSubDomains',
@@ -36,6 +50,37 @@ class Config:
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     ALLOWED_EXTENSIONS = {'csv'}
     
+    # Pagination Count Configuration (exact, estimated, cached or none)
+    PATIENT_LIST_COUNT_STRATEGY = os.environ.get('PATIENT_LIST_COUNT_STRATEGY') or 'estimated'
+    API_COUNT_STRATEGY = os.environ.get('API_COUNT_STRATEGY') or 'cached'
+    COUNT_CACHE_TTL = float(os.environ.get('COUNT_CACHE_TTL') or 10)  # Seconds
+    
+    # Bulk API Configuration
+    API_BULK_MAX_ITEMS = int(os.environ.get('API_BULK_MAX_ITEMS') or 1000)  # Patients per bulk create/update/delete or batch prediction request
+    
+    # Model Configuration
+    MODEL_DIR = os.environ.get('MODEL_DIR')  # Versioned model directory written by scripts/train_model.py (default: app/models)
+    MODEL_RELOAD_INTERVAL = float(os.environ.get('MODEL_RELOAD_INTERVAL') or 5)  # Seconds between checks for a new model version (0 disables)
+    MODEL_MMAP_MODE = os.environ.get('MODEL_MMAP_MODE', 'r') or None  # Memory-map model arrays so workers share them ('' to copy)
+    MODEL_INFERENCE_ENGINE = os.environ.get('MODEL_INFERENCE_ENGINE') or 'sklearn'  # sklearn or flat
+    PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE') or 1024)  # Cached single predictions (0 disables)
+    PREDICTION_CACHE_TTL = float(os.environ.get('PREDICTION_CACHE_TTL') or 3600)  # Seconds
+    
+    # Export Configuration
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE') or 1000)  # Documents per cursor batch
+    
+    # Import Configuration
+    IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE') or 1000)  # CSV rows read and inserted per chunk
+    IMPORT_JOB_WORKERS = int(os.environ.get('IMPORT_JOB_WORKERS') or 2)  # Imports run concurrently in the background
+    IMPORT_UPLOAD_FOLDER = os.environ.get('IMPORT_UPLOAD_FOLDER')  # Where uploads wait for their job (default: system temp dir)
+    # Unfinished jobs idle this long when a worker starts are marked failed (interrupted by a restart)
+    IMPORT_JOB_IDLE_TIMEOUT = int(os.environ.get('IMPORT_JOB_IDLE_TIMEOUT') or 600)
+    # Seconds between refreshes of a running process's unfinished jobs (must be well under the idle timeout)
+    IMPORT_JOB_HEARTBEAT = int(os.environ.get('IMPORT_JOB_HEARTBEAT') or 60)
+    UPLOAD_PART_SIZE = int(os.environ.get('UPLOAD_PART_SIZE') or 8 * 1024 * 1024)  # Suggested chunked upload part size (must fit MAX_CONTENT_LENGTH)
+    UPLOAD_SESSION_TTL = int(os.environ.get('UPLOAD_SESSION_TTL') or 86400)  # Seconds an idle chunked upload is kept for resuming
+    UPLOAD_MAX_SIZE = int(os.environ.get('UPLOAD_MAX_SIZE') or 2 * 1024 * 1024 * 1024)  # Largest chunked upload; caps part numbers at UPLOAD_MAX_SIZE / UPLOAD_PART_SIZE
+    
     # Logging Configuration
     LOG_LEVEL = os.environ.get('LOG_LEVEL') or 'INFO'
     LOG_FILE = os.environ.get('LOG_FILE') or 'app.log'
@@ -69,6 +114,7 @@ class DevelopmentConfig(Config):
     DEBUG = True
     TESTING = False
     SESSION_COOKIE_SECURE = False  # Allow HTTP in development
+    MONGO_ENSURE_INDEXES = True
 
 class TestingConfig(Config):
     """Testing configuration"""
@@ -76,6 +122,7 @@ class TestingConfig(Config):
     TESTING = True
     WTF_CSRF_ENABLED = False
     SESSION_COOKIE_SECURE = False
+    MONGO_ENSURE_INDEXES = True
 
 class ProductionConfig(Config):
     """Production configuration"""
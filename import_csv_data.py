@@ -7,16 +7,28 @@ Updated to work with new modular architecture
 import pandas as pd
 from app.repositories.patient_repository import PatientRepository
 from app.services.patient_service import PatientService
+from app.utils.import_manifest import ImportManifest
+from app.utils.import_profile import ImportProfile, profile_stage
+from app.utils.import_readers import IMPORT_FORMATS, file_chunks
+import argparse
+import glob
 import sys
 import os
-from datetime import datetime
 
-def clean_data(df):
-    """Clean and prepare data for import"""
-    print("Cleaning data...")
+# Rows read, cleaned, validated and inserted at a time
+DEFAULT_CHUNK_SIZE = 1000
+
+def clean_data(df, bmi_fill=None):
+    """
+    Clean and prepare a chunk of data for import
     
+    Missing BMI values are filled with ``bmi_fill`` (the whole file's median
+    when importing in chunks), or with this chunk's median if not given.
+    """
     # Handle missing BMI values
-    df['bmi'].fillna(df['bmi'].median(), inplace=True)
+    if bmi_fill is None:
+        bmi_fill = df['bmi'].median()
+    df['bmi'] = df['bmi'].fillna(bmi_fill)
     
     # Ensure correct data types
     df['id'] = df['id'].astype(int)
@@ -34,19 +46,23 @@ def clean_data(df):
     df['Residence_type'] = df['Residence_type'].str.strip()
     df['smoking_status'] = df['smoking_status'].str.strip()
     
-    print(f"Data cleaned. Total records: {len(df)}")
     return df
 
-def validate_data(df):
-    """Validate data before import"""
-    print("Validating data...")
+def validate_data(df, seen_ids):
+    """
+    Report data problems in a chunk
     
+    Invalid rows are skipped (and counted) by the import itself; this gives
+    an early per-chunk summary. ``seen_ids`` collects IDs across chunks so
+    duplicates in different chunks are found too.
+    """
     errors = []
     
-    # Check for duplicate IDs
-    duplicates = df['id'].duplicated().sum()
+    # Check for duplicate IDs, within this chunk and against earlier chunks
+    duplicates = df['id'].duplicated().sum() + df['id'].isin(seen_ids).sum()
     if duplicates > 0:
         errors.append(f"Found {duplicates} duplicate patient IDs")
+    seen_ids.update(df['id'].tolist())
     
     # Check age range
     invalid_ages = df[(df['age'] < 0) | (df['age'] > 120)]
@@ -69,55 +85,131 @@ def validate_data(df):
     if len(invalid_genders) > 0:
         errors.append(f"Found {len(invalid_genders)} records with invalid gender")
     
-    if errors:
-        print("Validation errors:")
-        for error in errors:
-            print(f"  - {error}")
-        return False
+    for error in errors:
+        print(f"  Warning: {error}")
+    return not errors
+
+def prepared_chunks(import_files, chunk_size, bmi_fill, profile=None, manifest=None):
+    """
+    Yield cleaned and checked chunks of each file in turn
     
-    print("Data validation passed!")
-    return True
+    With a ``manifest`` only the rows that are new or changed since the
+    last import are kept, and chunks left empty are skipped. Rows are
+    compared as read, so the BMI fill (which follows the feed's median)
+    doesn't make unchanged rows look changed.
+    """
+    seen_ids = set()
+    for import_file in import_files:
+        print(f"  Reading {import_file}")
+        for df in file_chunks(import_file, chunksize=chunk_size):
+            if manifest is not None:
+                with profile_stage(profile, 'manifest', len(df)):
+                    df = df[manifest.changed(df)].copy()
+                if df.empty:
+                    continue
+            with profile_stage(profile, 'clean_data', len(df)):
+                df = clean_data(df, bmi_fill)
+            with profile_stage(profile, 'check_data', len(df)):
+                validate_data(df, seen_ids)
+            yield df
+
+def bmi_median(import_files):
+    """Median BMI across all files, reading only the bmi column"""
+    return pd.concat(
+        [chunk['bmi'] for import_file in import_files
+         for chunk in file_chunks(import_file, chunksize=100000, fields=['bmi'])],
+        ignore_index=True
+    ).median()
+
+def find_import_files(path):
+    """
+    The file at ``path``, or every CSV, Parquet and Arrow file in a
+    directory (sorted by name)
+    """
+    if os.path.isdir(path):
+        return sorted(
+            file for file in glob.glob(os.path.join(path, '*'))
+            if os.path.splitext(file)[1].lower() in IMPORT_FORMATS
+        )
+    return [path]
+
+def default_manifest_path(path, db_name):
+    """Manifest kept next to the imported file, or inside the imported directory"""
+    directory = path if os.path.isdir(path) else os.path.dirname(os.path.abspath(path))
+    return os.path.join(directory, f'.{db_name}.manifest.npz')
+
+def print_progress(totals):
+    """Print running totals after each chunk"""
+    print(f"  Chunk {totals.chunks}: {totals.rows} rows read, "
+          f"{totals.imported} imported, {totals.skipped} skipped")
+    if totals.updated or totals.unchanged:
+        batch = totals.last_batch
+        print(f"    batch: {batch['inserted']} inserted, {batch['updated']} updated, "
+              f"{batch['unchanged']} unchanged")
 
 def import_csv_to_mongodb(csv_file, mongo_uri='mongodb://localhost:27017/', 
-                          db_name='stroke_prediction_db'):
-    """Import CSV file to MongoDB"""
+                          db_name='stroke_prediction_db', chunk_size=DEFAULT_CHUNK_SIZE,
+                          workers=1, writers=1, upsert=False, profile=False, dry_run=False,
+                          incremental=False, manifest_path=None):
+    """
+    Import a CSV, Parquet or Arrow IPC file, or a directory of them, to MongoDB
+    
+    Columnar files are read in record batches with their columns mapped to
+    the patient fields, so values keep their types instead of being parsed
+    from text.
+    
+    Rows are imported in chunks of ``chunk_size``. ``workers`` processes
+    sanitize, validate and encrypt chunks and ``writers`` threads insert them.
+    With ``upsert`` rows are matched on their id, so the same feed can be
+    re-imported safely.
+    
+    ``profile`` prints the time, rows per second and peak memory of each
+    stage at the end. ``dry_run`` does everything except connect to
+    MongoDB and insert.
+    
+    ``incremental`` compares each row's content hash with a manifest saved
+    by the previous incremental run (``manifest_path``, by default next to
+    the feed) and only validates and upserts new or changed rows. The
+    manifest is replaced after each successful import, taking new hashes
+    only for the rows that were written.
+    """
     
     # Check if file exists
     if not os.path.exists(csv_file):
         print(f"Error: File '{csv_file}' not found!")
         return False
     
+    import_files = find_import_files(csv_file)
+    if not import_files:
+        print(f"Error: No CSV, Parquet or Arrow files found in '{csv_file}'!")
+        return False
+    
     try:
-        # Read CSV
-        print(f"Reading CSV file: {csv_file}")
-        df = pd.read_csv(csv_file)
-        print(f"Loaded {len(df)} records from CSV")
-        print(f"Columns: {list(df.columns)}")
-        
-        # Display basic statistics
-        print("\nDataset Statistics:")
-        print(df.describe())
+        # Only the BMI column is read up front; rows are streamed later
+        print(f"Reading {len(import_files)} file(s) from: {csv_file}")
+        bmi_fill = bmi_median(import_files)
+        print(f"Missing BMI values will be filled with the median ({bmi_fill:.2f})")
         
-        # Clean data
-        df = clean_data(df)
-        
-        # Validate data
-        if not validate_data(df):
-            response = input("\nData validation failed. Continue anyway? (yes/no): ")
-            if response.lower() != 'yes':
-                print("Import cancelled.")
-                return False
-        
-        # Connect to MongoDB using new repository
-        print(f"\nConnecting to MongoDB: {mongo_uri}")
-        patient_repo = PatientRepository(uri=mongo_uri, db_name=db_name)
+        if dry_run:
+            print("\nDry run: nothing will be written to MongoDB")
+            patient_repo = None
+        else:
+            # Connect to MongoDB using new repository
+            print(f"\nConnecting to MongoDB: {mongo_uri}")
+            patient_repo = PatientRepository(uri=mongo_uri, db_name=db_name)
+            patient_repo.create_indexes()
         patient_service = PatientService(patient_repo)
         
-        # Store reference to patients collection for bulk operations
-        patients_collection = patient_repo.patients
+        manifest = None
+        if incremental:
+            # Rows are matched to what is already stored by id
+            upsert = True
+            manifest_path = manifest_path or default_manifest_path(csv_file, db_name)
+            manifest = ImportManifest.load(manifest_path)
+            print(f"\nIncremental import: {len(manifest)} rows in manifest {manifest_path}")
         
-        # Check if collection already has data
-        existing_count = patient_repo.count_patients()
+        # Check if collection already has data (an incremental import updates it in place)
+        existing_count = patient_repo.count_patients() if patient_repo and not incremental else 0
         if existing_count > 0:
             print(f"\nWarning: Collection already contains {existing_count} records!")
             response = input("Do you want to clear existing data? (yes/no): ")
@@ -125,14 +217,34 @@ def import_csv_to_mongodb(csv_file, mongo_uri='mongodb://localhost:27017/',
                 print("Clearing existing data...")
                 # Clear all patients using MongoDB directly
                 patient_repo.patients.delete_many({})
+                patient_repo.invalidate_statistics()
                 print("Existing data cleared.")
         
-        # Convert to list of dictionaries
-        records = df.to_dict('records')
+        # Clean, validate and insert one chunk at a time
+        print(f"\nImporting records to MongoDB in chunks of {chunk_size} "
+              f"({workers} worker(s), {writers} writer(s))...")
+        import_profile = ImportProfile(track_memory=True) if profile else None
+        success, message, count = patient_service.import_patient_chunks(
+            prepared_chunks(import_files, chunk_size, bmi_fill, import_profile, manifest), 'system_import',
+            progress=print_progress, workers=workers, writers=writers,
+            mode='upsert' if upsert else 'insert', profile=import_profile, dry_run=dry_run,
+            batch_written=manifest.mark_written if manifest is not None else None
+        )
+        
+        if import_profile:
+            import_profile.stop()
+            print("\nImport profile:")
+            print(import_profile.format_report())
         
-        # Import data using service
-        print(f"\nImporting {len(records)} records to MongoDB...")
-        success, message, count = patient_service.import_patients(records, 'system_import')
+        if manifest is not None:
+            print(f"\nRows changed: {manifest.changed_rows}, unchanged: {manifest.unchanged_rows}, "
+                  f"no longer in feed: {manifest.removed_rows()}")
+            if not manifest.changed_rows:
+                success, message = True, "No new or changed patient records"
+        
+        if success and dry_run:
+            print(f"\n{message}")
+            return True
         
         if success:
             print(f"\nImport completed successfully!")
@@ -148,11 +260,16 @@ def import_csv_to_mongodb(csv_file, mongo_uri='mongodb://localhost:27017/',
             print(f"  Female patients: {stats.get('female_count', 0)}")
             print(f"  Average age: {stats.get('average_age', 0)}")
             
+            if manifest is not None:
+                manifest.updated().save(manifest_path)
+                print(f"\nManifest saved: {manifest_path}")
+            
             patient_repo.close()
             return True
         else:
             print(f"\nImport failed: {message}")
-            patient_repo.close()
+            if patient_repo:
+                patient_repo.close()
             return False
         
     except Exception as e:
@@ -163,30 +280,40 @@ def import_csv_to_mongodb(csv_file, mongo_uri='mongodb://localhost:27017/',
 
 def main():
     """Main function"""
+    parser = argparse.ArgumentParser(description='Import the stroke prediction dataset into MongoDB')
+    parser.add_argument('csv_file', nargs='?', help='CSV, Parquet or Arrow IPC file, or a directory of them')
+    parser.add_argument('mongo_uri', nargs='?', default='mongodb://localhost:27017/')
+    parser.add_argument('db_name', nargs='?', default='stroke_prediction_db')
+    parser.add_argument('chunk_size', nargs='?', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='Rows read and inserted per chunk')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Processes that sanitize, validate and encrypt chunks')
+    parser.add_argument('--writers', type=int, default=1,
+                        help='Threads that insert chunks concurrently')
+    parser.add_argument('--upsert', action='store_true',
+                        help='Insert new patients and update existing ones by id')
+    parser.add_argument('--profile', action='store_true',
+                        help='Print time, rows/sec and peak memory for each import stage')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Read, clean, validate and encrypt without writing to MongoDB')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only import rows that are new or changed since the last incremental import')
+    parser.add_argument('--manifest', metavar='PATH',
+                        help='Row hash manifest for --incremental (default: next to the imported file)')
+    args = parser.parse_args()
+    
     print("=" * 60)
     print("Stroke Prediction Dataset Import Tool")
     print("=" * 60)
     
     # Get CSV file path
-    if len(sys.argv) > 1:
-        csv_file = sys.argv[1]
-    else:
-        csv_file = input("Enter CSV file path: ").strip()
-    
-    # Get MongoDB URI (optional)
-    if len(sys.argv) > 2:
-        mongo_uri = sys.argv[2]
-    else:
-        mongo_uri = 'mongodb://localhost:27017/'
-    
-    # Get database name (optional)
-    if len(sys.argv) > 3:
-        db_name = sys.argv[3]
-    else:
-        db_name = 'stroke_prediction_db'
+    csv_file = args.csv_file or input("Enter CSV file path: ").strip()
     
     # Import data
-    success = import_csv_to_mongodb(csv_file, mongo_uri, db_name)
+    success = import_csv_to_mongodb(
+        csv_file, args.mongo_uri, args.db_name, args.chunk_size, args.workers, args.writers, args.upsert,
+        args.profile, args.dry_run, args.incremental, args.manifest
+    )
     
     if success:
         print("\n✓ Data import completed successfully!")
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Script to benchmark stroke prediction latency for each inference engine
+
+Times single predictions and a batch through the sklearn pipeline, the
+sklearn engine (pandas-free encoding, then the fitted classifier) and the
+flat engine (the array-based forest evaluator), and checks the engines
+agree with the pipeline.
+
+Usage: python scripts/benchmark_model.py [model_path] [repeats] [batch_size]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from app.services.model_service import FEATURE_COLUMNS, INFERENCE_ENGINES, ModelService
+
+
+def sample_patients(count, seed=0):
+    """Random patients covering every category"""
+    rng = np.random.default_rng(seed)
+    return [{
+        'gender': str(rng.choice(['Male', 'Female', 'Other'])),
+        'age': float(rng.uniform(1, 90)),
+        'hypertension': int(rng.integers(0, 2)),
+        'heart_disease': int(rng.integers(0, 2)),
+        'work_type': str(rng.choice(['Private', 'Self-employed', 'Govt_job', 'children', 'Never_worked'])),
+        'bmi': float(rng.uniform(15, 50)),
+        'smoking_status': str(rng.choice(['never smoked', 'formerly smoked', 'smokes', 'Unknown']))
+    } for _ in range(count)]
+
+
+def timed(function, repeats):
+    """Median seconds per call of ``function``"""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def main():
+    """Main function"""
+    model_path = (sys.argv[1] or None) if len(sys.argv) > 1 else None
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    batch_size = int(sys.argv[3]) if len(sys.argv) > 3 else 500
+
+    patients = sample_patients(batch_size)
+    # Without the cache, so every call is scored
+    services = {engine: ModelService(model_path, engine=engine, cache_size=0) for engine in INFERENCE_ENGINES}
+    pipeline = services['sklearn'].current().model
+    frame = pd.DataFrame([services['sklearn'].prepare_features(p) for p in patients], columns=FEATURE_COLUMNS)
+    expected = pipeline.predict_proba(frame)[:, 1]
+
+    print(f"{'Engine':<10}{'Single (ms)':>14}{'Batch of ' + str(batch_size) + ' (ms)':>22}{'Max difference':>18}")
+    single = timed(lambda: pipeline.predict_proba(frame.iloc[:1]), repeats)
+    batch = timed(lambda: pipeline.predict_proba(frame), max(repeats // 10, 1))
+    print(f"{'pipeline':<10}{single * 1000:>14.3f}{batch * 1000:>22.3f}{'-':>18}")
+
+    for engine, service in services.items():
+        if engine == 'flat' and service.current().forest is None:
+            print(f"{engine:<10} not available for this model")
+            continue
+        probabilities = np.array([service.predict_proba(p)['probability'] for p in patients])
+        difference = np.abs(probabilities - expected).max()
+        single = timed(lambda: service.predict_proba(patients[0]), repeats)
+        batch = timed(lambda: service.predict_batch(patients), max(repeats // 10, 1))
+        print(f"{engine:<10}{single * 1000:>14.3f}{batch * 1000:>22.3f}{difference:>18.2e}")
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
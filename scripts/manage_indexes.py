@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Script to manage patient collection indexes
+
+Usage:
+    python scripts/manage_indexes.py build [--prune] [--uri URI] [--db NAME]
+    python scripts/manage_indexes.py explain [--uri URI] [--db NAME]
+
+'build' creates the indexes declared in PATIENT_INDEXES (and the import job
+indexes) and is meant to run once per deployment. 'explain' runs explain() on every repository query
+shape and exits non-zero if any of them falls back to a collection scan.
+"""
+import argparse
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from app.repositories.patient_repository import PatientRepository
+from app.repositories.import_job_repository import ImportJobRepository
+
+
+def build(patient_repo, prune):
+    """Create declared indexes, optionally dropping undeclared ones"""
+    dropped = patient_repo.create_indexes(drop_unmanaged=prune)
+    ImportJobRepository(db_name=patient_repo.db.name, client=patient_repo.client).create_indexes()
+    print("Indexes:")
+    for name in sorted(patient_repo.patients.index_information()):
+        print(f"  - {name}")
+    for name in dropped:
+        print(f"Dropped: {name}")
+    return True
+
+
+def explain(patient_repo):
+    """Explain every query shape and flag collection scans"""
+    ok = True
+    for entry in patient_repo.explain_query_shapes():
+        status = "COLLSCAN" if entry['collscan'] else "ok"
+        print(f"[{status:>8}] {entry['name']}: {' <- '.join(entry['stages'])}")
+        ok = ok and not entry['collscan']
+    return ok
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Manage patient collection indexes")
+    parser.add_argument('command', choices=['build', 'explain'])
+    parser.add_argument('--prune', action='store_true', help="drop indexes not declared in PATIENT_INDEXES")
+    parser.add_argument('--uri', default=os.environ.get('MONGO_URI', 'mongodb://localhost:27017/'))
+    parser.add_argument('--db', default=os.environ.get('MONGO_DB_NAME', 'stroke_prediction_db'))
+    args = parser.parse_args()
+    
+    try:
+        patient_repo = PatientRepository(uri=args.uri, db_name=args.db)
+        if args.command == 'build':
+            ok = build(patient_repo, args.prune)
+        else:
+            ok = explain(patient_repo)
+        patient_repo.close()
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        sys.exit(1)
+    
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Script to rebuild the materialized patient statistics document
+
+The dashboard statistics are maintained incrementally as patients are
+created, updated, deleted and imported. Run this to recompute them from
+the patients collection if they ever drift.
+"""
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from app.repositories.patient_repository import PatientRepository
+
+
+def main():
+    """Main function"""
+    mongo_uri = sys.argv[1] if len(sys.argv) > 1 else 'mongodb://localhost:27017/'
+    db_name = sys.argv[2] if len(sys.argv) > 2 else 'stroke_prediction_db'
+    
+    try:
+        patient_repo = PatientRepository(uri=mongo_uri, db_name=db_name)
+        counters = patient_repo.rebuild_statistics()
+        patient_repo.close()
+    except Exception as e:
+        print(f"Error rebuilding statistics: {str(e)}")
+        sys.exit(1)
+    
+    print("Statistics rebuilt:")
+    print(f"  Total patients: {counters.get('total', 0)}")
+    print(f"  Stroke patients: {counters.get('stroke', 0)}")
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,5 @@
 import os
-import joblib
+import sys
 import pandas as pd
 import numpy as np
 
@@ -15,9 +15,14 @@ from imblearn.pipeline import Pipeline as ImbPipeline
 
 
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-MODEL_DIR = os.path.join(PROJECT_ROOT, 'app', 'models')
+sys.path.insert(0, PROJECT_ROOT)
+
+from app.utils.model_store import ModelStore
+
+MODEL_DIR = os.environ.get('MODEL_DIR') or os.path.join(PROJECT_ROOT, 'app', 'models')
+# Older versions beyond this many are removed after publishing (the current one is always kept)
+MODEL_KEEP_VERSIONS = int(os.environ.get('MODEL_KEEP_VERSIONS') or 5)
 os.makedirs(MODEL_DIR, exist_ok=True)
-MODEL_PATH = os.path.join(MODEL_DIR, 'stroke_model.joblib')
 
 data_path = os.path.join(PROJECT_ROOT, 'data', 'healthcare-dataset-stroke-data.csv')
 df = pd.read_csv(data_path)
@@ -75,5 +80,7 @@ print("\nClassification Report:")
 print(classification_report(y_test, y_pred))
 print("Confusion matrix:\n", confusion_matrix(y_test, y_pred))
 
-joblib.dump(pipeline, MODEL_PATH)
-print(f"\nSaved model to {MODEL_PATH}")
\ No newline at end of file
+# Running apps pick the new version up without a restart
+store = ModelStore(MODEL_DIR, keep=MODEL_KEEP_VERSIONS)
+version = store.publish(pipeline)
+print(f"\nSaved model version {version} to {store.version_dir(version)}")
\ No newline at end of file
@@ -2,7 +2,7 @@
 Integration tests for patient operations
 """
 import pytest
-from app.repositories.patient_repository import PatientRepository
+from app.repositories.patient_repository import PatientRepository, TEXT_SEARCH_INDEX
 from app.services.patient_service import PatientService
 
 class TestPatientService:
@@ -12,6 +12,7 @@ class TestPatientService:
     def setup(self):
         """Setup test fixtures"""
         self.patient_repo = PatientRepository()
+        self.patient_repo.patients.create_indexes([TEXT_SEARCH_INDEX])
         self.patient_service = PatientService(self.patient_repo)
         
     def test_create_patient(self, sample_patient):
@@ -75,10 +76,89 @@ class TestPatientService:
         self.patient_service.create_patient(sample_patient, 'testuser')
         
         # Search by ID
-        results = self.patient_service.search_patients(str(sample_patient['id']))
+        results, total = self.patient_service.search_patients(str(sample_patient['id']))
         assert len(results) > 0
+        assert total == len(results)
         
         # Search by text
-        results = self.patient_service.search_patients('Male')
+        results, total = self.patient_service.search_patients('Male')
         assert len(results) > 0
+        assert total >= len(results)
+        
+        # Pages are bounded
+        results, _ = self.patient_service.search_patients('Male', page=1, per_page=1)
+        assert len(results) == 1
+        
+        # Partial words match by substring
+        results, _ = self.patient_service.search_patients('mal')
+        assert any(patient['id'] == sample_patient['id'] for patient in results)
+    
+    def test_search_without_text_index(self, sample_patient):
+        """Test search falls back to substring matching when the text index is missing"""
+        self.patient_service.create_patient(sample_patient, 'testuser')
+        self.patient_repo.patients.drop_index('patient_text_search')
+        try:
+            results, total = self.patient_service.search_patients('Male')
+            assert any(patient['id'] == sample_patient['id'] for patient in results)
+            assert total >= len(results)
+        finally:
+            self.patient_repo.patients.create_indexes([TEXT_SEARCH_INDEX])
 
+    
+    def test_cursor_pagination(self, sample_patient):
+        """Test keyset pagination walks pages without overlap"""
+        for offset in range(3):
+            patient = dict(sample_patient, id=sample_patient['id'] + 1000 + offset)
+            self.patient_service.create_patient(patient, 'testuser')
+        
+        first_page, _, cursors = self.patient_service.get_patients(per_page=2)
+        assert len(first_page) == 2
+        assert cursors['prev'] is None
+        assert cursors['next'] is not None
+        
+        second_page, _, cursors = self.patient_service.get_patients(per_page=2, after=cursors['next'])
+        assert {p['_id'] for p in first_page}.isdisjoint(p['_id'] for p in second_page)
+        assert cursors['prev'] is not None
+        
+        previous_page, _, _ = self.patient_service.get_patients(per_page=2, before=cursors['prev'])
+        assert [p['_id'] for p in previous_page] == [p['_id'] for p in first_page]
+    
+    def test_statistics(self, sample_patient):
+        """Test statistics include totals and categorical breakdowns"""
+        self.patient_service.create_patient(sample_patient, 'testuser')
+        
+        stats = self.patient_service.get_statistics()
+        
+        assert stats['total_patients'] >= 1
+        assert stats['male_count'] == stats['by_gender'].get('Male', 0)
+        assert stats['by_work_type'].get('Private', 0) >= 1
+        assert stats['by_residence_type'].get('Urban', 0) >= 1
+    
+    def test_statistics_counters_match_rebuild(self, sample_patient):
+        """Test incrementally maintained counters agree with a full rebuild"""
+        _, _, patient_id = self.patient_service.create_patient(
+            dict(sample_patient, id=sample_patient['id'] + 2000), 'testuser'
+        )
+        self.patient_service.update_patient(patient_id, dict(sample_patient, gender='Female'), 'testuser')
+        self.patient_service.delete_patient(patient_id, 'testuser')
+        
+        incremental = self.patient_service.get_statistics()
+        self.patient_repo.rebuild_statistics()
+        
+        assert self.patient_service.get_statistics() == incremental
+    
+    def test_upsert_import_is_idempotent(self, sample_patient):
+        """Test re-importing the same rows in upsert mode updates nothing"""
+        rows = [dict(sample_patient, id=sample_patient['id'] + 3000 + offset) for offset in range(3)]
+        
+        success, _, count = self.patient_service.import_patient_chunks([rows], 'testuser', mode='upsert')
+        assert success and count == 3
+        
+        counts = self.patient_repo.upsert_patients([dict(row, imported_by='testuser') for row in rows])
+        assert counts['inserted'] == 0
+        assert counts['updated'] == 0
+        assert counts['unchanged'] == 3
+        
+        counts = self.patient_repo.upsert_patients([dict(rows[0], bmi=35.0, imported_by='testuser')])
+        assert counts['updated'] == 1
+        assert self.patient_repo.get_patient_by_record_id(rows[0]['id'])['bmi'] == 35.0
@@ -0,0 +1,55 @@
+"""
+Unit tests for caching utilities
+"""
+from app.utils.cache import TTLCache
+
+class FakeTimer:
+    """Manually advanced clock"""
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+class TestTTLCache:
+    """Test TTL cache"""
+    
+    def test_get_and_set(self):
+        """Test cached values are returned until they expire"""
+        timer = FakeTimer()
+        cache = TTLCache(maxsize=4, ttl=10, timer=timer)
+        cache.set('total', 42)
+        
+        assert cache.get('total') == 42
+        timer.now = 10
+        assert cache.get('total') is None
+        assert len(cache) == 0
+    
+    def test_lru_eviction(self):
+        """Test the least recently used entry is evicted when full"""
+        cache = TTLCache(maxsize=2, ttl=None)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        
+        assert cache.get('a') == 1
+        assert cache.get('b') is None
+        assert cache.get('c') == 3
+    
+    def test_stats_count_hits_misses_and_evictions(self):
+        """Test lookups and removals are counted"""
+        timer = FakeTimer()
+        cache = TTLCache(maxsize=1, ttl=10, timer=timer)
+        cache.set('a', 1)
+        cache.get('a')
+        cache.get('b')
+        cache.set('b', 2)
+        timer.now = 10
+        cache.get('b')
+        
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses'], stats['evictions'], stats['expirations']) == (1, 2, 1, 1)
+        assert stats['hit_rate'] == round(1 / 3, 4)
+        assert stats['size'] == 0
@@ -0,0 +1,29 @@
+"""
+Unit tests for export serializers
+"""
+import json
+from datetime import datetime
+from app.utils.export import ndjson_lines, csv_lines
+
+class TestExportSerializers:
+    """Test streaming export serializers"""
+    
+    def test_ndjson_lines(self):
+        """Test one JSON document per line"""
+        documents = [{'id': 1, 'created_at': datetime(2025, 1, 1)}, {'id': 2}]
+        lines = list(ndjson_lines(iter(documents)))
+        
+        assert len(lines) == 2
+        assert all(line.endswith('\n') for line in lines)
+        assert json.loads(lines[0]) == {'id': 1, 'created_at': '2025-01-01T00:00:00'}
+    
+    def test_csv_lines(self):
+        """Test CSV header and rows, ignoring unrequested fields"""
+        documents = [{'id': 1, 'gender': 'Male', '_id': 'abc'}, {'id': 2, 'gender': 'Female'}]
+        output = ''.join(csv_lines(iter(documents), ['id', 'gender']))
+        
+        assert output.splitlines() == ['id,gender', '1,Male', '2,Female']
+    
+    def test_csv_lines_empty(self):
+        """Test an empty export still has a header"""
+        assert ''.join(csv_lines(iter([]), ['id'])).splitlines() == ['id']
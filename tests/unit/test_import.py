@@ -0,0 +1,669 @@
+"""
+Unit tests for chunked patient imports
+"""
+import functools
+import hashlib
+import io
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import jwt
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from bson.objectid import ObjectId
+
+from app.blueprints.api.v1 import routes
+from app.repositories.patient_repository import statistics_delta
+from app.security.encryption import EncryptionService
+from app.services import patient_service
+from app.services.patient_service import PatientService, prepare_import_frame, prepare_import_rows
+from app.services.chunked_uploads import ChunkedUploadStore
+from app.services.import_jobs import ImportJobRunner
+from app.utils.import_manifest import ImportManifest
+from app.utils.import_profile import ImportProfile
+from app.utils.import_readers import csv_chunks, file_chunks
+from import_csv_data import prepared_chunks
+
+CSV_HEADER = 'id,gender,age,hypertension,heart_disease,ever_married,work_type,Residence_type,avg_glucose_level,bmi,smoking_status,stroke\n'
+
+def make_csv(rows):
+    """Build an in-memory CSV file from row strings"""
+    return io.StringIO(CSV_HEADER + ''.join(row + '\n' for row in rows))
+
+class RecordingRepository:
+    """Patient repository stand-in that records inserted batches"""
+
+    def __init__(self):
+        self.batches = []
+        self.invalidated = False
+
+    def bulk_insert_patients(self, patients_list):
+        self.batches.append(patients_list)
+        return len(patients_list)
+
+    def increment_statistics(self, delta):
+        return True
+
+    def invalidate_statistics(self):
+        self.invalidated = True
+
+class TestChunkedImport:
+    """Test chunked CSV import pipeline"""
+
+    def test_csv_chunks(self):
+        """Test a CSV is read in chunks of at most chunksize rows"""
+        source = make_csv([f'{i},Male,40,0,0,Yes,Private,Urban,100,25,smokes,0' for i in range(5)])
+        sizes = [len(chunk) for chunk in csv_chunks(source, chunksize=2)]
+
+        assert sizes == [2, 2, 1]
+
+    def test_import_patient_chunks(self):
+        """Test each chunk is inserted separately with running totals"""
+        rows = [f'{i},Male,40,0,0,Yes,Private,Urban,100,25,smokes,0' for i in range(5)]
+        rows[3] = '3,Unknown,40,0,0,Yes,Private,Urban,100,25,smokes,0'
+        repo = RecordingRepository()
+        progress = []
+
+        success, message, count = PatientService(repo).import_patient_chunks(
+            csv_chunks(make_csv(rows), chunksize=2), 'tester',
+            progress=lambda totals: progress.append(totals.as_dict())
+        )
+
+        assert success
+        assert count == 4
+        assert [len(batch) for batch in repo.batches] == [2, 1, 1]
+        assert [p['imported'] for p in progress] == [2, 3, 4]
+        assert progress[-1]['skipped'] == 1
+        assert progress[-1]['errors'][0].startswith('Row 4:')
+        assert '(1 errors)' in message
+
+    def test_parallel_import_matches_sequential(self):
+        """Test worker processes and writer threads import the same rows"""
+        rows = [f'{i},Male,40,0,0,Yes,Private,Urban,100,25,smokes,0' for i in range(50)]
+        rows[7] = '7,Unknown,40,0,0,Yes,Private,Urban,100,25,smokes,0'
+        results = []
+        for workers, writers in ((1, 1), (2, 3)):
+            repo = RecordingRepository()
+            progress = []
+            written = []
+            success, message, count = PatientService(repo).import_patient_chunks(
+                csv_chunks(make_csv(rows), chunksize=4), 'tester',
+                progress=lambda totals: progress.append(totals.as_dict()),
+                workers=workers, writers=writers, batch_written=written.extend
+            )
+            ids = sorted(patient['id'] for batch in repo.batches for patient in batch)
+            results.append((success, message, count, ids, progress[-1], sorted(written)))
+
+        assert results[0] == results[1]
+        assert results[1][2] == 49
+        assert results[1][5] == [i for i in range(50) if i != 7]
+
+    def test_spawned_workers_use_the_encryption_key(self, monkeypatch):
+        """Test worker processes started with spawn encrypt with the parent's key"""
+        encryption = EncryptionService(EncryptionService.generate_key())
+        monkeypatch.setattr(patient_service, 'encryption_service', encryption)
+        monkeypatch.setattr(patient_service, 'ProcessPoolExecutor', functools.partial(
+            ProcessPoolExecutor, mp_context=multiprocessing.get_context('spawn')
+        ))
+        rows = pd.read_csv(make_csv([f'{i},Male,40,0,0,Yes,Private,Urban,100,25,smokes,0' for i in range(4)]))
+        records = [dict(row, email=f'patient{row["id"]}@example.com') for row in rows.to_dict('records')]
+        repo = RecordingRepository()
+
+        success, _, count = PatientService(repo).import_patient_chunks(
+            [records[:2], records[2:]], 'tester', workers=2
+        )
+
+        assert (success, count) == (True, 4)
+        emails = sorted(encryption.decrypt(patient['email']) for batch in repo.batches for patient in batch)
+        assert emails == [f'patient{i}@example.com' for i in range(4)]
+
+    def test_import_error_invalidates_statistics(self):
+        """Test a failed chunk reports the rows already imported"""
+        class FailingRepository(RecordingRepository):
+            def bulk_insert_patients(self, patients_list):
+                if self.batches:
+                    raise RuntimeError('insert failed')
+                return super().bulk_insert_patients(patients_list)
+
+        rows = [f'{i},Male,40,0,0,Yes,Private,Urban,100,25,smokes,0' for i in range(4)]
+        repo = FailingRepository()
+        written = []
+
+        success, message, count = PatientService(repo).import_patient_chunks(
+            csv_chunks(make_csv(rows), chunksize=2), 'tester', batch_written=written.extend
+        )
+
+        assert not success
+        assert count == 2
+        assert written == [0, 1]
+        assert repo.invalidated
+        assert '2 records imported before the error' in message
+
+class UpsertingRepository(RecordingRepository):
+    """Repository stand-in that upserts into an in-memory collection keyed on record id"""
+
+    def __init__(self):
+        super().__init__()
+        self.stored = {}
+        self.increments = []
+
+    def get_patients_by_record_ids(self, record_ids):
+        return {record_id: dict(self.stored[record_id]) for record_id in record_ids if record_id in self.stored}
+
+    def upsert_patients(self, patients_list):
+        counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'inserted_positions': []}
+        for position, patient in enumerate(patients_list):
+            current = self.stored.get(patient['id'])
+            if current is None:
+                counts['inserted'] += 1
+                counts['inserted_positions'].append(position)
+            elif any(current.get(key) != value for key, value in patient.items()):
+                counts['updated'] += 1
+            else:
+                counts['unchanged'] += 1
+            self.stored[patient['id']] = {**(current or {}), **patient}
+        return counts
+
+    def increment_statistics(self, delta):
+        self.increments.append(delta)
+        return True
+
+class TestUpsertImport:
+    """Test upsert import mode"""
+
+    def import_rows(self, repo, rows):
+        """Upsert CSV rows two per batch, returning the import result and per-batch counts"""
+        batches = []
+        result = PatientService(repo).import_patient_chunks(
+            csv_chunks(make_csv(rows), chunksize=2), 'tester', mode='upsert',
+            progress=lambda totals: batches.append(totals.last_batch)
+        )
+        return result, batches
+
+    def test_upsert_counts_and_statistics(self):
+        """Test per-batch counts, and that updated rows move the counters from their stored values"""
+        rows = [f'{i},Male,40,0,0,Yes,Private,Urban,100,25,smokes,0' for i in range(4)]
+        repo = UpsertingRepository()
+        self.import_rows(repo, rows[:3])
+        repo.increments.clear()
+
+        rows[0] = '0,Female,40,0,0,Yes,Private,Urban,100,25,smokes,1'
+        (success, message, count), batches = self.import_rows(repo, rows)
+
+        assert success
+        assert count == 4
+        assert batches == [{'inserted': 0, 'updated': 1, 'unchanged': 1},
+                           {'inserted': 1, 'updated': 0, 'unchanged': 1}]
+        assert '1 inserted, 1 updated, 2 unchanged' in message
+        assert not repo.invalidated
+        assert repo.increments == [{'stroke': 1, 'by_gender.Male': -1, 'by_gender.Female': 1},
+                                   statistics_delta(repo.stored[3])]
+
+    def test_repeated_id_rebuilds_statistics(self):
+        """Test a batch that upserts one id twice falls back to rebuilding the statistics"""
+        repo = UpsertingRepository()
+
+        self.import_rows(repo, ['5,Male,40,0,0,Yes,Private,Urban,100,25,smokes,0'] * 2)
+
+        assert repo.invalidated
+        assert repo.increments == []
+
+    def test_unchanged_encrypted_field_is_not_an_update(self, monkeypatch):
+        """Test re-importing a row with an encrypted email keeps its stored ciphertext and reports it unchanged"""
+        monkeypatch.setattr(patient_service, 'encryption_service', EncryptionService(EncryptionService.generate_key()))
+        patient = {'id': 7, 'gender': 'Male', 'age': 40.0, 'email': 'ann@example.com'}
+        repo = UpsertingRepository()
+        service = PatientService(repo)
+        service._upsert_import_batch([patient_service.encrypt_patient(dict(patient))])
+        stored_email = repo.stored[7]['email']
+
+        counts = service._upsert_import_batch([patient_service.encrypt_patient(dict(patient))])
+
+        assert (counts['updated'], counts['unchanged']) == (0, 1)
+        assert repo.stored[7]['email'] == stored_email
+
+    def test_unknown_mode(self):
+        """Test an unknown import mode is rejected"""
+        with pytest.raises(ValueError):
+            PatientService(RecordingRepository()).import_patient_chunks([], 'tester', mode='replace')
+
+class TestPrepareImportFrame:
+    """Test column-wise import preparation"""
+
+    def test_matches_row_preparation(self):
+        """Test the frame path yields the same patients and errors as the row path"""
+        rows = [
+            '1,Male,40,0,0,Yes,Private,Urban,100,25,smokes,0',
+            '2,Robot,40,0,0,Yes,Private,Urban,100,25,smokes,0',
+            '3,Female,200,0,0,Yes,Private,Urban,100,,never smoked,1',
+            '4,Other,30,1,0,No,Children,Rural,90,<b>,Unknown,0'
+        ]
+        frame = next(csv_chunks(make_csv(rows), chunksize=10))
+
+        assert prepare_import_frame(frame, 'tester', start_row=5) == \
+            prepare_import_rows(frame.to_dict('records'), 'tester', start_row=5)
+
+class TestColumnarImport:
+    """Test Parquet and Arrow IPC import readers"""
+
+    ROWS = [
+        '1,Male,40,0,0,Yes,Private,Urban,100,25,smokes,0',
+        '2,Robot,40,0,0,Yes,Private,Urban,100,25,smokes,0',
+        '3,Female,70,1,0,Yes,Private,Urban,100,28,never smoked,1',
+        '4,Other,30,1,0,No,Children,Rural,90,31.5,Unknown,0',
+        '5,Female,12,0,0,No,children,Rural,80,18,Unknown,0'
+    ]
+
+    def columnar_table(self):
+        """The test rows as an Arrow table with renamed, reordered and extra columns"""
+        frame = pd.read_csv(make_csv(self.ROWS)).rename(columns={'Residence_type': 'residence_type'})
+        frame['notes'] = 'x'
+        return pa.Table.from_pandas(frame[list(reversed(frame.columns))], preserve_index=False)
+
+    def write_ipc(self, path, table, stream=False):
+        """Write an Arrow IPC file (or stream) in batches of two rows"""
+        with pa.OSFile(str(path), 'wb') as sink:
+            writer = pa.ipc.new_stream if stream else pa.ipc.new_file
+            with writer(sink, table.schema) as ipc:
+                ipc.write_table(table, max_chunksize=2)
+
+    def assert_matches_csv(self, chunks):
+        """Check columnar chunks prepare to the same patients and errors as the CSV"""
+        csv_frame = next(csv_chunks(make_csv(self.ROWS), chunksize=10))
+        frame = pd.concat(chunks, ignore_index=True)
+
+        assert list(frame.columns) == list(csv_frame.columns)
+        assert prepare_import_frame(frame, 'tester') == prepare_import_frame(csv_frame, 'tester')
+
+    def test_parquet_chunks(self, tmp_path):
+        """Test a Parquet file is read in batches mapped to the patient fields"""
+        path = tmp_path / 'patients.parquet'
+        pq.write_table(self.columnar_table(), str(path))
+
+        chunks = list(file_chunks(str(path), chunksize=2))
+
+        assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+        self.assert_matches_csv(chunks)
+
+    @pytest.mark.parametrize('stream', [False, True])
+    def test_ipc_chunks(self, tmp_path, stream):
+        """Test Arrow IPC files and streams are sliced into chunks"""
+        path = tmp_path / 'patients.arrow'
+        self.write_ipc(path, self.columnar_table(), stream=stream)
+
+        chunks = list(file_chunks(str(path), chunksize=10))
+
+        assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+        self.assert_matches_csv(chunks)
+
+    def test_missing_columns_are_reported(self, tmp_path):
+        """Test a file without every patient field is rejected"""
+        path = tmp_path / 'patients.parquet'
+        pq.write_table(self.columnar_table().drop(['bmi', 'stroke']), str(path))
+
+        with pytest.raises(ValueError, match='Missing columns: bmi, stroke'):
+            next(file_chunks(str(path)))
+
+    def test_unsupported_extension(self):
+        """Test files of other types are rejected"""
+        with pytest.raises(ValueError):
+            file_chunks('patients.xlsx')
+
+class RecordingJobRepository:
+    """Import job repository stand-in that records job updates"""
+
+    def __init__(self):
+        self.events = []
+
+    def mark_running(self, job_id):
+        self.events.append(('running', job_id))
+
+    def update_progress(self, job_id, totals):
+        self.events.append(('progress', totals['imported']))
+
+    def finish_job(self, job_id, success, message, profile=None):
+        self.events.append(('finished', success, message))
+        self.profile = profile
+
+    def touch_jobs(self, job_ids):
+        self.events.append(('heartbeat', job_ids))
+
+class TestImportJobRunner:
+    """Test background import job execution"""
+
+    def test_run_records_progress_and_removes_upload(self, tmp_path):
+        """Test a job reports each chunk, its outcome, and cleans up its file"""
+        path = tmp_path / 'upload.csv'
+        path.write_text(make_csv([f'{i},Male,40,0,0,Yes,Private,Urban,100,25,smokes,0' for i in range(3)]).getvalue())
+        runner = ImportJobRunner()
+        runner.chunk_size = 2
+        job_repo = RecordingJobRepository()
+
+        runner._run('job1', str(path), 'tester', 'insert', RecordingRepository(), job_repo)
+
+        assert job_repo.events[0] == ('running', 'job1')
+        assert job_repo.events[1:3] == [('progress', 2), ('progress', 3)]
+        assert job_repo.events[3][:2] == ('finished', True)
+        assert [stage['stage'] for stage in job_repo.profile['stages']][-1] == 'insert'
+        assert not path.exists()
+
+    def test_heartbeat_covers_unfinished_jobs(self, tmp_path):
+        """Test the heartbeat refreshes a job until it finishes, then leaves it alone"""
+        path = tmp_path / 'upload.csv'
+        path.write_text(make_csv(['1,Male,40,0,0,Yes,Private,Urban,100,25,smokes,0']).getvalue())
+        runner = ImportJobRunner()
+        runner.heartbeat_interval = 0.01
+        job_repo = RecordingJobRepository()
+        runner._active_jobs['job1'] = job_repo
+
+        runner._start_heartbeat()
+        deadline = time.monotonic() + 5
+        while ('heartbeat', ['job1']) not in job_repo.events and time.monotonic() < deadline:
+            time.sleep(0.01)
+        runner.shutdown()
+        runner._heartbeat.join(5)
+        assert ('heartbeat', ['job1']) in job_repo.events
+
+        runner._run('job1', str(path), 'tester', 'insert', RecordingRepository(), job_repo)
+        job_repo.events.clear()
+        runner.touch_active_jobs()
+        assert job_repo.events == []
+
+    def test_interrupted_jobs_are_recovered_once(self, app):
+        """Test the first request of a process marks idle unfinished jobs failed, and later ones don't"""
+        runner = app.extensions['import_jobs']
+        runner.idle_timeout = 30
+        sweeps = []
+        runner._fail_interrupted_jobs = lambda mongo: sweeps.append(mongo)
+
+        with app.test_request_context():
+            runner.recover_interrupted_jobs()
+            runner.recover_interrupted_jobs()
+
+        assert sweeps == [app.extensions['mongo']]
+
+class JobLookupRepository:
+    """Import job repository stand-in holding one job"""
+
+    def __init__(self, job):
+        self.job = job
+
+    def get_job(self, job_id, username=None):
+        if job_id != str(self.job['_id']) or username not in (None, self.job['created_by']):
+            return None
+        return dict(self.job)
+
+class TestImportJobOwnership:
+    """Test import jobs are only visible to whoever started them"""
+
+    def request_job(self, app, monkeypatch, username, role='viewer'):
+        """GET alice's job through the API as ``username``"""
+        # No database here, so skip the first-request sweep of interrupted jobs
+        monkeypatch.setattr(app.extensions['import_jobs'], '_recovered', True)
+        job = {'_id': ObjectId(), 'created_by': 'alice', 'status': 'running'}
+        monkeypatch.setattr(routes, 'import_job_repo', JobLookupRepository(job))
+        token = jwt.encode({'user_id': 1, 'username': username, 'role': role},
+                           app.config['JWT_SECRET_KEY'], algorithm='HS256')
+        return app.test_client().get(f"/api/v1/imports/{job['_id']}",
+                                     headers={'Authorization': f'Bearer {token}'})
+
+    def test_owner_sees_job(self, app, monkeypatch):
+        """Test the user who started a job can read it"""
+        assert self.request_job(app, monkeypatch, 'alice').status_code == 200
+
+    def test_other_user_gets_not_found(self, app, monkeypatch):
+        """Test another user's job is reported as missing"""
+        assert self.request_job(app, monkeypatch, 'mallory').status_code == 404
+
+    def test_admin_sees_every_job(self, app, monkeypatch):
+        """Test admins can read any user's job"""
+        assert self.request_job(app, monkeypatch, 'root', role='admin').status_code == 200
+
+class TestImportProfile:
+    """Test per-stage import profiling and dry runs"""
+
+    ROWS = [f'{i},Male,40,0,0,Yes,Private,Urban,100,25,smokes,0' for i in range(5)]
+
+    def test_nested_stages_are_not_double_counted(self):
+        """Test an outer stage is charged only the time outside nested stages"""
+        profile = ImportProfile(track_memory=True)
+        with profile.stage('read', rows=10):
+            with profile.stage('clean_data', rows=10):
+                data = [0] * 100000
+        profile.stop()
+        assert len(data) == 100000
+
+        report = profile.report()
+        assert [stage['stage'] for stage in report['stages']] == ['read', 'clean_data']
+        read, clean = report['stages']
+        assert read['seconds'] + clean['seconds'] <= report['total_seconds']
+        assert clean['peak_memory'] >= 800000
+        assert read['peak_memory'] >= clean['peak_memory']
+
+    @pytest.mark.parametrize('writers', [1, 2])
+    def test_import_records_each_stage(self, writers):
+        """Test an import profiles every stage with its row counts"""
+        profile = ImportProfile()
+
+        PatientService(RecordingRepository()).import_patient_chunks(
+            csv_chunks(make_csv(self.ROWS), chunksize=2), 'tester', writers=writers, profile=profile
+        )
+
+        stages = {stage['stage']: stage for stage in profile.report()['stages']}
+        assert list(stages) == ['read', 'sanitize', 'validate', 'to_records', 'encrypt', 'insert']
+        assert stages['read']['calls'] == 4
+        assert stages['sanitize']['rows'] == stages['insert']['rows'] == 5
+        assert stages['insert']['calls'] == 3
+
+    def test_dry_run_writes_nothing(self):
+        """Test a dry run prepares every chunk without touching the repository"""
+        repo = RecordingRepository()
+
+        success, message, count = PatientService(repo).import_patient_chunks(
+            csv_chunks(make_csv(self.ROWS), chunksize=2), 'tester', dry_run=True
+        )
+
+        assert success
+        assert count == 5
+        assert message.startswith('Dry run')
+        assert repo.batches == []
+
+class TestImportManifest:
+    """Test the row hash manifest behind incremental imports"""
+
+    def frame(self, rows):
+        return pd.read_csv(make_csv(rows))
+
+    def test_only_new_and_changed_rows_are_kept(self):
+        """Test rows matching the previous run's hashes are filtered out"""
+        first = ImportManifest()
+        previous = self.frame([f'{i},Male,40,0,0,Yes,Private,Urban,100,25,smokes,0' for i in range(3)])
+        assert first.changed(previous).all()
+        first.mark_written([0, 1, 2])
+
+        manifest = first.updated()
+        feed = self.frame([
+            '0,Male,40,0,0,Yes,Private,Urban,100,25,smokes,0',
+            '1,Male,41,0,0,Yes,Private,Urban,100,25,smokes,0',
+            '3,Female,30,0,0,No,Private,Rural,90,22,never smoked,0'
+        ])
+
+        assert manifest.changed(feed).tolist() == [False, True, True]
+        assert (manifest.changed_rows, manifest.unchanged_rows) == (2, 1)
+        assert manifest.removed_rows() == 1
+
+    def test_updated_keeps_last_row_per_id(self, tmp_path):
+        """Test the saved manifest has one hash per id, from the last row seen"""
+        manifest = ImportManifest()
+        manifest.changed(self.frame(['1,Male,40,0,0,Yes,Private,Urban,100,25,smokes,0']))
+        last = self.frame(['1,Male,50,0,0,Yes,Private,Urban,100,25,smokes,0'])
+        manifest.changed(last)
+        manifest.mark_written([1])
+
+        path = str(tmp_path / 'manifest.npz')
+        manifest.updated().save(path)
+        saved = ImportManifest.load(path)
+
+        assert saved.ids.tolist() == [1]
+        assert saved.hashes.tolist() == ImportManifest.row_hashes(last).tolist()
+        assert not saved.changed(last).any()
+
+    def test_only_written_rows_take_new_hashes(self):
+        """Test rows that weren't written keep their old hash, or stay out if new, so they are retried"""
+        original = self.frame(['1,Male,40,0,0,Yes,Private,Urban,100,25,smokes,0'])
+        manifest = ImportManifest(original['id'], ImportManifest.row_hashes(original))
+        feed = self.frame([
+            '1,Male,41,0,0,Yes,Private,Urban,100,25,smokes,0',
+            '2,Unknown,30,0,0,No,Private,Rural,90,22,never smoked,0',
+            '3,Female,30,0,0,No,Private,Rural,90,22,never smoked,0'
+        ])
+        manifest.changed(feed)
+        manifest.mark_written([3])
+
+        updated = manifest.updated()
+
+        assert updated.ids.tolist() == [1, 3]
+        assert updated.changed(feed).tolist() == [True, True, False]
+
+    def test_missing_bmi_fill_does_not_change_hashes(self, tmp_path):
+        """Test rows are hashed as read, so a new BMI median doesn't mark them changed"""
+        path = tmp_path / 'feed.csv'
+        path.write_text(make_csv([
+            '1,Male,40,0,0,Yes,Private,Urban,100,,smokes,0',
+            '2,Female,30,0,0,No,Private,Rural,90,22,never smoked,0'
+        ]).getvalue())
+        manifest = ImportManifest()
+        for chunk in prepared_chunks([str(path)], 1000, bmi_fill=25.0, manifest=manifest):
+            manifest.mark_written(chunk['id'].tolist())
+
+        rerun = manifest.updated()
+        assert list(prepared_chunks([str(path)], 1000, bmi_fill=30.0, manifest=rerun)) == []
+        assert rerun.unchanged_rows == 2
+
+    def test_missing_manifest_is_empty(self, tmp_path):
+        """Test a first incremental run treats every row as new"""
+        assert len(ImportManifest.load(str(tmp_path / 'missing.npz'))) == 0
+
+def sha256(data):
+    """Hex SHA-256 digest of bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+class TestChunkedUploadStore:
+    """Test resumable chunked uploads"""
+
+    def test_parts_assemble_in_order(self, tmp_path):
+        """Test parts sent out of order are assembled by number and the session removed"""
+        store = ChunkedUploadStore(str(tmp_path / 'parts'))
+        data = make_csv([f'{i},Male,40,0,0,Yes,Private,Urban,100,25,smokes,0' for i in range(50)]).getvalue().encode()
+        parts = [data[:300], data[300:600], data[600:]]
+        session = store.create('big.csv', 'tester', sha256=sha256(data))
+
+        for number in (3, 1, 2):
+            part = parts[number - 1]
+            store.write_part(session['upload_id'], number, io.BytesIO(part), sha256(part))
+
+        assert [part['number'] for part in store.get(session['upload_id'])['parts']] == [1, 2, 3]
+        path = store.assemble(session['upload_id'], str(tmp_path))
+        with open(path, 'rb') as f:
+            assert f.read() == data
+        assert store.get(session['upload_id']) is None
+
+    def test_part_checksum_mismatch_is_rejected(self, tmp_path):
+        """Test a corrupted part is discarded and can be retried"""
+        store = ChunkedUploadStore(str(tmp_path))
+        upload_id = store.create('big.csv', 'tester')['upload_id']
+
+        with pytest.raises(ValueError):
+            store.write_part(upload_id, 1, io.BytesIO(b'corrupted'), sha256(b'original'))
+        assert store.get(upload_id)['parts'] == []
+
+        store.write_part(upload_id, 1, io.BytesIO(b'original'), sha256(b'original'))
+        assert store.get(upload_id)['parts'] == [{'number': 1, 'size': 8, 'sha256': sha256(b'original')}]
+
+    def test_assemble_requires_every_part(self, tmp_path):
+        """Test assembling with a gap in the part numbers fails and keeps the parts"""
+        store = ChunkedUploadStore(str(tmp_path / 'parts'))
+        upload_id = store.create('big.csv', 'tester')['upload_id']
+        store.write_part(upload_id, 2, io.BytesIO(b'b'), sha256(b'b'))
+
+        with pytest.raises(ValueError, match=r'Missing parts \(1\): 1$'):
+            store.assemble(upload_id, str(tmp_path))
+        assert len(store.get(upload_id)['parts']) == 1
+
+    def test_missing_parts_error_lists_first_gaps(self, tmp_path):
+        """Test a sparse upload reports how many parts are missing and only the first few"""
+        store = ChunkedUploadStore(str(tmp_path / 'parts'))
+        upload_id = store.create('big.csv', 'tester')['upload_id']
+        store.write_part(upload_id, 10000, io.BytesIO(b'z'), sha256(b'z'))
+
+        with pytest.raises(ValueError, match=r'^Missing parts \(9999\): 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, \.\.\.$'):
+            store.assemble(upload_id, str(tmp_path))
+
+    def test_part_numbers_are_capped(self, tmp_path):
+        """Test part numbers above max_parts are refused"""
+        store = ChunkedUploadStore(str(tmp_path), max_parts=4)
+        upload_id = store.create('big.csv', 'tester')['upload_id']
+
+        store.write_part(upload_id, 4, io.BytesIO(b'd'), sha256(b'd'))
+        with pytest.raises(ValueError, match='up to 4'):
+            store.write_part(upload_id, 5, io.BytesIO(b'e'), sha256(b'e'))
+        assert [part['number'] for part in store.get(upload_id)['parts']] == [4]
+
+    def test_parts_are_listed_numerically(self, tmp_path):
+        """Test part numbers wider than the zero padding still list in order"""
+        store = ChunkedUploadStore(str(tmp_path), max_parts=2000000)
+        upload_id = store.create('big.csv', 'tester')['upload_id']
+        for number in (1000000, 999999, 2):
+            store.write_part(upload_id, number, io.BytesIO(b'x'), sha256(b'x'))
+
+        assert [part['number'] for part in store.get(upload_id)['parts']] == [2, 999999, 1000000]
+
+    def test_assemble_verifies_file_checksum(self, tmp_path):
+        """Test the assembled file is checked against the whole-file digest"""
+        store = ChunkedUploadStore(str(tmp_path / 'parts'))
+        upload_id = store.create('big.csv', 'tester', sha256=sha256(b'expected'))['upload_id']
+        store.write_part(upload_id, 1, io.BytesIO(b'different'), sha256(b'different'))
+
+        with pytest.raises(ValueError, match='assembled file'):
+            store.assemble(upload_id, str(tmp_path))
+        assert [p.name for p in tmp_path.iterdir()] == ['parts']
+
+    def test_unknown_or_malformed_ids_are_not_found(self, tmp_path):
+        """Test ids that aren't session directories resolve to None"""
+        store = ChunkedUploadStore(str(tmp_path))
+        assert store.get('0' * 32) is None
+        assert store.get('../etc') is None
+
+class TestCreateUploadRoute:
+    """Test the chunked upload endpoint validates its JSON"""
+
+    def create_upload(self, app, body):
+        """POST ``body`` to /uploads as a logged-in user"""
+        token = jwt.encode({'user_id': 1, 'username': 'alice', 'role': 'viewer'},
+                           app.config['JWT_SECRET_KEY'], algorithm='HS256')
+        return app.test_client().post('/api/v1/uploads', json=body,
+                                      headers={'Authorization': f'Bearer {token}'})
+
+    @pytest.mark.parametrize('body', [
+        ['data.csv'],
+        {'filename': ['data.csv']},
+        {'filename': 'data.csv', 'mode': ['insert']},
+        {'filename': 'data.csv', 'sha256': 123},
+    ])
+    def test_malformed_fields_are_bad_requests(self, app, monkeypatch, body):
+        """Test non-string fields are rejected with 400 rather than failing"""
+        monkeypatch.setattr(app.extensions['import_jobs'], '_recovered', True)
+        assert self.create_upload(app, body).status_code == 400
+
+    def test_upload_reports_part_limit(self, app, monkeypatch, tmp_path):
+        """Test a new upload tells the client the highest part number"""
+        runner = app.extensions['import_jobs']
+        monkeypatch.setattr(runner, '_recovered', True)
+        monkeypatch.setattr(runner.uploads, 'root', str(tmp_path))
+
+        response = self.create_upload(app, {'filename': 'data.csv'})
+        assert response.status_code == 201
+        assert response.json['max_parts'] == runner.uploads.max_parts == 256
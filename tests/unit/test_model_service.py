@@ -0,0 +1,288 @@
+"""
+Unit tests for stroke risk predictions
+"""
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+from app.services.model_service import FEATURE_COLUMNS, ModelService, ModelUnavailableError
+from app.utils.forest import FlatForest
+from app.utils.model_store import ModelStore
+
+GENDERS = ['Male', 'Female', 'Other']
+WORK_TYPES = ['Private', 'Self-employed', 'Govt_job', 'children', 'Never_worked']
+SMOKING_STATUSES = ['never smoked', 'formerly smoked', 'smokes', 'Unknown']
+
+def training_frame(rows=400, seed=0):
+    """Random patients shaped like the stroke dataset, with some missing BMIs"""
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({
+        'gender': rng.choice(GENDERS, rows),
+        'age': rng.uniform(0, 90, rows).round(1),
+        'hypertension': rng.integers(0, 2, rows),
+        'heart_disease': rng.integers(0, 2, rows),
+        'work_type': rng.choice(WORK_TYPES, rows),
+        'bmi': rng.uniform(15, 50, rows).round(1),
+        'smoking_status': rng.choice(SMOKING_STATUSES, rows)
+    }, columns=FEATURE_COLUMNS)
+    frame.loc[rng.random(rows) < 0.1, 'bmi'] = np.nan
+    target = ((frame['age'] > 60) & (rng.random(rows) < 0.7)) | (rng.random(rows) < 0.05)
+    return frame, target.astype(int)
+
+@pytest.fixture(scope='module')
+def model_path(tmp_path_factory):
+    """A small pipeline laid out like the one scripts/train_model.py saves"""
+    preprocessor = ColumnTransformer(transformers=[
+        ('num', Pipeline([('imputer', SimpleImputer(strategy='median')), ('scaler', StandardScaler())]),
+         ['age', 'bmi', 'hypertension', 'heart_disease']),
+        ('cat', Pipeline([('onehot', OneHotEncoder(handle_unknown='ignore'))]),
+         ['gender', 'work_type', 'smoking_status'])
+    ])
+    pipeline = Pipeline([
+        ('preprocessor', preprocessor),
+        ('clf', RandomForestClassifier(n_estimators=20, random_state=42))
+    ])
+    pipeline.fit(*training_frame())
+
+    path = tmp_path_factory.mktemp('models') / 'stroke_model.joblib'
+    joblib.dump(pipeline, path)
+    return str(path)
+
+class CountingModel:
+    """Wraps a model, counting predict_proba calls"""
+
+    def __init__(self, model):
+        self.model = model
+        self.calls = 0
+
+    def predict_proba(self, frame):
+        self.calls += 1
+        return self.model.predict_proba(frame)
+
+class TestPredictBatch:
+    """Test batch predictions"""
+
+    def test_batch_matches_single_predictions(self, model_path):
+        """Test one model call scores every valid item as the single path would"""
+        service = ModelService(model_path)
+        items = [
+            {'gender': 'Male', 'age': 67, 'hypertension': 0, 'heart_disease': 1,
+             'work_type': 'Private', 'bmi': 36.6, 'smoking_status': 'formerly smoked'},
+            {'gender': 'Female', 'age': 'old'},
+            'not a patient',
+            {'gender': 'Female', 'age': 30, 'hypertension': 0, 'heart_disease': 0,
+             'work_type': 'Govt_job', 'bmi': 22, 'smoking_status': 'never'}
+        ]
+        expected = [service.predict_proba(items[0]), service.predict_proba(items[3])]
+        service.current().model = CountingModel(service.current().model)
+
+        results = service.predict_batch(items)
+
+        assert service.current().model.calls == 1
+        assert [result['status'] for result in results] == ['predicted', 'invalid', 'invalid', 'predicted']
+        assert [result['index'] for result in results] == [0, 1, 2, 3]
+        for result, single in zip([results[0], results[3]], expected):
+            assert result['probability'] == single['probability']
+            assert result['prediction'] == single['prediction']
+        assert 'error' in results[1]
+
+    def test_all_invalid_skips_the_model(self, model_path):
+        """Test a batch with nothing to score doesn't call the model"""
+        service = ModelService(model_path)
+        service.current().model = CountingModel(service.current().model)
+
+        results = service.predict_batch([None, {'bmi': 'x'}])
+
+        assert service.current().model.calls == 0
+        assert [result['status'] for result in results] == ['invalid', 'invalid']
+
+class TestFeatureEncoder:
+    """Test the pandas-free single prediction path"""
+
+    def test_rows_match_the_pipeline_transform(self, model_path):
+        """Test encoded rows equal the ColumnTransformer's output, unknowns and missing BMIs included"""
+        service = ModelService(model_path)
+        preprocessor = service.current().model.steps[0][1]
+        frame, _ = training_frame(rows=50, seed=1)
+        frame.loc[0, 'gender'] = 'Unknown'
+        frame.loc[1, 'work_type'] = 'Astronaut'
+
+        expected = preprocessor.transform(frame)
+        expected = expected.toarray() if hasattr(expected, 'toarray') else expected
+        for position, features in enumerate(frame.to_dict('records')):
+            assert np.array_equal(service.current().encoder.encode(features)[0], expected[position])
+
+    def test_predictions_match_the_pipeline(self, model_path):
+        """Test the fast path gives exactly the pipeline's probabilities"""
+        service = ModelService(model_path)
+        assert service.current().encoder is not None
+        frame, _ = training_frame(rows=50, seed=2)
+
+        for features in frame.to_dict('records'):
+            expected = service.current().model.predict_proba(pd.DataFrame([service.prepare_features(features)]))[0][1]
+            assert service.predict_proba(features)['probability'] == expected
+
+    def test_unsupported_pipeline_falls_back(self, model_path):
+        """Test a model without a ColumnTransformer is scored through the pipeline"""
+        service = ModelService(model_path)
+        service.current().encoder = None
+        features = training_frame(rows=1, seed=3)[0].iloc[0].to_dict()
+        expected = service.current().model.predict_proba(pd.DataFrame([service.prepare_features(features)]))[0][1]
+
+        assert service.predict_proba(features)['probability'] == expected
+
+class TestFlatForest:
+    """Test the array-based forest evaluator"""
+
+    def test_probabilities_match_the_classifier(self, model_path):
+        """Test every probability is exactly the forest's, for encoded and raw rows"""
+        service = ModelService(model_path)
+        forest = FlatForest.from_classifier(service.current().classifier)
+        frame, _ = training_frame(rows=300, seed=4)
+        X = service.current().model.steps[0][1].transform(frame)
+        X = X.toarray() if hasattr(X, 'toarray') else X
+        X[::7, 1] = np.nan
+        X[1::5] += np.random.default_rng(5).normal(0, 1, X[1::5].shape)
+
+        assert np.array_equal(forest.predict_proba(X), service.current().classifier.predict_proba(X))
+        assert forest.predict_proba(X[:0]).shape == (0, 2)
+
+    def test_flat_engine_matches_sklearn_engine(self, model_path):
+        """Test single and batch predictions agree between the engines"""
+        sklearn_service = ModelService(model_path, engine='sklearn')
+        flat_service = ModelService(model_path, engine='flat')
+        assert flat_service.current().forest is not None
+        items = training_frame(rows=40, seed=6)[0].to_dict('records')
+
+        for features in items:
+            assert flat_service.predict_proba(features) == sklearn_service.predict_proba(features)
+        assert flat_service.predict_batch(items) == sklearn_service.predict_batch(items)
+
+    def test_rejects_other_models(self):
+        """Test only fitted random forests are flattened"""
+        with pytest.raises(ValueError):
+            FlatForest.from_classifier(RandomForestClassifier())
+        with pytest.raises(ValueError):
+            ModelService(engine='onnx')
+
+class TestPredictionCache:
+    """Test the prediction result cache"""
+
+    def test_normalized_inputs_share_an_entry(self, model_path):
+        """Test inputs that normalize to the same features are scored once"""
+        service = ModelService(model_path, cache_size=8, cache_ttl=60)
+        service.current().encoder = None
+        service.current().model = CountingModel(service.current().model)
+        patient = {'gender': 'Male', 'age': 67, 'hypertension': 0, 'heart_disease': 1,
+                   'work_type': 'Private', 'bmi': float('nan'), 'smoking_status': 'never'}
+
+        first = service.predict_proba(patient)
+        first['probability'] = -1
+        again = service.predict_proba({**patient, 'gender': ' Male ', 'smoking_status': 'never smoked'})
+
+        assert service.current().model.calls == 1
+        assert again['probability'] != -1
+        stats = service.cache_stats()
+        assert (stats['hits'], stats['misses'], stats['size']) == (1, 1, 1)
+
+    def test_reload_invalidates(self, model_path):
+        """Test reloading the model clears the cache and moves to a new version"""
+        service = ModelService(model_path, cache_size=8)
+        patient = training_frame(rows=1, seed=7)[0].iloc[0].to_dict()
+        service.predict_proba(patient)
+
+        service.load(model_path)
+        service.predict_proba(patient)
+
+        stats = service.cache_stats()
+        assert stats['model_loads'] == 2
+        assert (stats['hits'], stats['misses'], stats['size']) == (0, 2, 1)
+
+    def test_disabled_cache(self, model_path):
+        """Test a cache size of 0 turns caching off"""
+        service = ModelService(model_path, cache_size=0)
+        assert service.cache_stats() is None
+
+class TestModelLoading:
+    """Test lazy, versioned model loading"""
+
+    def test_missing_model_fails_on_first_prediction(self, tmp_path):
+        """Test a service without a model can be created, and predicting reports it unavailable"""
+        service = ModelService(model_dir=str(tmp_path))
+
+        with pytest.raises(ModelUnavailableError):
+            service.predict_proba({'age': 50})
+        with pytest.raises(ModelUnavailableError):
+            service.predict_batch([{'age': 50}])
+
+    def test_published_versions_are_swapped_in(self, model_path, tmp_path):
+        """Test a newly published version replaces the loaded one without a restart"""
+        store = ModelStore(str(tmp_path))
+        first = store.publish(joblib.load(model_path))
+        service = ModelService(model_dir=str(tmp_path), engine='flat', reload_interval=0.01)
+        patient = training_frame(rows=1, seed=8)[0].iloc[0].to_dict()
+        expected = service.predict_proba(patient)
+        loaded = service.current()
+        assert loaded.version == first
+        assert isinstance(loaded.forest.values, np.memmap)
+
+        second = store.publish(joblib.load(model_path))
+        time.sleep(0.02)
+
+        assert service.current().version == second
+        assert service.current() is not loaded
+        assert service.predict_proba(patient) == expected
+        assert service.cache_stats()['model_version'] == second
+
+    def test_broken_version_keeps_the_loaded_model(self, model_path, tmp_path):
+        """Test a version that fails to load leaves the current model in place"""
+        store = ModelStore(str(tmp_path))
+        first = store.publish(joblib.load(model_path))
+        service = ModelService(model_dir=str(tmp_path), reload_interval=0.01)
+        service.current()
+
+        with open(tmp_path / 'CURRENT', 'w') as f:
+            f.write('missing')
+        time.sleep(0.02)
+
+        assert service.current().version == first
+
+class TestModelStore:
+    """Test version retention in the model store"""
+
+    def test_publish_keeps_newest_versions(self, model_path, tmp_path):
+        """Test publishing removes versions beyond ``keep``, oldest first"""
+        store = ModelStore(str(tmp_path), keep=2)
+        pipeline = joblib.load(model_path)
+        published = [store.publish(pipeline) for _ in range(3)]
+
+        assert store.versions() == published[1:]
+        assert store.current_version() == published[-1]
+        assert not (tmp_path / 'versions' / published[0]).exists()
+
+    def test_prune_never_removes_current_version(self, tmp_path):
+        """Test a current version older than the kept ones survives pruning"""
+        for version in ('20240101-000000-000000', '20240102-000000-000000', '20240103-000000-000000'):
+            (tmp_path / 'versions' / version).mkdir(parents=True)
+        (tmp_path / 'versions' / '.staging-abc').mkdir()
+        (tmp_path / 'CURRENT').write_text('20240101-000000-000000')
+
+        removed = ModelStore(str(tmp_path), keep=1).prune()
+
+        assert removed == ['20240102-000000-000000']
+        assert sorted(p.name for p in (tmp_path / 'versions').iterdir()) == [
+            '.staging-abc', '20240101-000000-000000', '20240103-000000-000000'
+        ]
+
+    def test_keep_must_be_positive(self, tmp_path):
+        """Test a store can't be told to keep no versions"""
+        with pytest.raises(ValueError):
+            ModelStore(str(tmp_path), keep=0)
@@ -0,0 +1,43 @@
+"""
+Unit tests for the MongoDB connection manager
+"""
+import logging
+
+from app.repositories.mongo import MongoConnectionManager
+
+class IndexCheckRepository:
+    """Patient repository stand-in whose text index may be missing"""
+
+    def __init__(self, has_index):
+        self.has_index = has_index
+
+    def has_search_index(self):
+        return self.has_index
+
+    def create_indexes(self, drop_unmanaged=False):
+        raise AssertionError('indexes are built by scripts/manage_indexes.py')
+
+class TestMongoConnectionManager:
+    """Test connection manager query pool and index check"""
+
+    def test_query_executor_is_shared(self):
+        """Test the query pool is created once, on first use, and shut down on close"""
+        manager = MongoConnectionManager()
+        manager.query_workers = 2
+
+        executor = manager.query_executor
+        try:
+            assert manager.query_executor is executor
+            assert executor.submit(lambda: 'done').result() == 'done'
+        finally:
+            manager.close()
+        assert executor._shutdown
+
+    def test_missing_search_index_is_only_reported(self, caplog):
+        """Test a missing text index logs a warning instead of being built"""
+        with caplog.at_level(logging.WARNING, logger='app.repositories.mongo'):
+            MongoConnectionManager._check_search_index(IndexCheckRepository(True))
+            assert not caplog.records
+            MongoConnectionManager._check_search_index(IndexCheckRepository(False))
+
+        assert 'manage_indexes.py' in caplog.records[0].getMessage()
@@ -0,0 +1,38 @@
+"""
+Unit tests for keyset pagination helpers
+"""
+import pytest
+from datetime import datetime
+from bson.objectid import ObjectId
+from app.utils.pagination import encode_cursor, decode_cursor, keyset_query
+
+class TestCursorEncoding:
+    """Test cursor token encoding"""
+    
+    def test_round_trip(self):
+        """Test cursor encodes and decodes to the same position"""
+        object_id = ObjectId()
+        created_at = datetime(2025, 1, 2, 3, 4, 5, 6000)
+        token = encode_cursor({'_id': str(object_id), 'created_at': created_at})
+        
+        assert decode_cursor(token) == (created_at, object_id)
+    
+    def test_missing_created_at(self):
+        """Test documents without created_at produce a usable cursor"""
+        object_id = ObjectId()
+        token = encode_cursor({'_id': object_id})
+        
+        assert decode_cursor(token) == (None, object_id)
+        assert keyset_query(token, 'after') == {'created_at': None, '_id': {'$lt': object_id}}
+    
+    def test_invalid_token(self):
+        """Test malformed tokens are rejected"""
+        for token in ['not-a-cursor', '', 'eyJjIjpudWxsfQ']:
+            with pytest.raises(ValueError):
+                decode_cursor(token)
+    
+    def test_unknown_direction(self):
+        """Test unknown cursor directions are rejected"""
+        token = encode_cursor({'_id': ObjectId(), 'created_at': datetime.now()})
+        with pytest.raises(ValueError):
+            keyset_query(token, 'sideways')
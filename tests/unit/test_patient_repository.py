@@ -0,0 +1,220 @@
+"""
+Unit tests for patient repository helpers
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import OperationFailure
+from app.repositories.patient_repository import (
+    PatientRepository, SEARCH_FIELDS, SEARCH_RESULT_LIMIT, build_projection, search_filter,
+    statistics_delta, merge_statistics_deltas, substring_search_filter, _plan_stages
+)
+from app.services.patient_service import PatientService
+
+class FakeCursor:
+    """Cursor over canned documents supporting the chained calls search uses"""
+    
+    def __init__(self, documents):
+        self.documents = documents
+    
+    def sort(self, sort):
+        return self
+    
+    def skip(self, skip):
+        self.documents = self.documents[skip:]
+        return self
+    
+    def limit(self, limit):
+        self.documents = self.documents[:limit]
+        return self
+    
+    def __iter__(self):
+        return iter(self.documents)
+
+class FakePatients:
+    """Patients collection returning canned matches per kind of search filter"""
+    
+    def __init__(self, matches, text_index=True):
+        self.matches = matches
+        self.text_index = text_index
+        self.searched = []
+    
+    def _matches(self, query):
+        kind = 'id' if 'id' in query else 'text' if '$text' in query else 'substring'
+        if kind == 'text' and not self.text_index:
+            raise OperationFailure('text index required for $text query', code=27)
+        self.searched.append(kind)
+        return [dict(document) for document in self.matches.get(kind, [])]
+    
+    def count_documents(self, query, limit=0):
+        return len(self._matches(query))
+    
+    def find(self, query, projection=None):
+        return FakeCursor(self._matches(query))
+
+def search_repository(matches, text_index=True):
+    """A repository whose patients collection is a FakePatients"""
+    repo = PatientRepository(client=MongoClient(connect=False))
+    repo.patients = FakePatients(matches, text_index)
+    return repo
+
+class TestProjection:
+    """Test projection building"""
+    
+    def test_no_fields(self):
+        """Test whole documents are returned when no fields are given"""
+        assert build_projection(None) is None
+        assert build_projection([]) is None
+    
+    def test_known_fields(self):
+        """Test projection includes only requested fields"""
+        assert build_projection(['id', 'age']) == {'id': 1, 'age': 1}
+    
+    def test_unknown_field(self):
+        """Test unknown fields are rejected"""
+        with pytest.raises(ValueError):
+            build_projection(['id', '$where'])
+
+class TestStatisticsDelta:
+    """Test statistics counter increments"""
+    
+    def test_delta_for_patient(self, sample_patient):
+        """Test a patient contributes to every counter"""
+        delta = statistics_delta(sample_patient)
+        
+        assert delta['total'] == 1
+        assert 'stroke' not in delta
+        assert delta['age_sum'] == 45.0
+        assert delta['by_gender.Male'] == 1
+        assert delta['by_smoking_status.never smoked'] == 1
+    
+    def test_update_delta(self, sample_patient):
+        """Test an update only moves the changed counters"""
+        updated = dict(sample_patient, gender='Female', stroke=1)
+        delta = merge_statistics_deltas(
+            statistics_delta(sample_patient, -1), statistics_delta(updated)
+        )
+        
+        assert delta == {'stroke': 1, 'by_gender.Male': -1, 'by_gender.Female': 1}
+
+class TestSearch:
+    """Test search filters and their fallbacks"""
+    
+    def test_substring_filter(self):
+        """Test substring matching covers every search field, ignoring case, with the query escaped"""
+        query = substring_search_filter('smok.')
+        
+        assert len(query['$or']) == len(SEARCH_FIELDS)
+        assert query['$or'][0] == {SEARCH_FIELDS[0]: {'$regex': 'smok\\.', '$options': 'i'}}
+    
+    def test_search_filter(self):
+        """Test numeric queries match the record ID and words the text index"""
+        assert search_filter('42') == {'id': 42}
+        assert search_filter('Private') == {'$text': {'$search': 'Private'}}
+    
+    def test_partial_word_falls_back_to_substring(self):
+        """Test a query the text index doesn't match is retried as a substring"""
+        repo = search_repository({'substring': [{'_id': 1, 'smoking_status': 'smokes'}]})
+        
+        results, total = repo.search_patients('smok')
+        
+        assert repo.patients.searched == ['text', 'substring', 'substring']
+        assert (results, total) == ([{'_id': '1', 'smoking_status': 'smokes'}], 1)
+    
+    def test_text_matches_are_ranked(self):
+        """Test text matches are returned without trying substrings or keeping the score"""
+        repo = search_repository({'text': [{'_id': 1, 'score': 1.5}], 'substring': [{'_id': 2}]})
+        
+        results, total = repo.search_patients('Private')
+        
+        assert repo.patients.searched == ['text', 'text', 'text']
+        assert (results, total) == ([{'_id': '1'}], 1)
+    
+    def test_unknown_id_falls_back_to_text(self):
+        """Test a number no record has is searched for in the text fields"""
+        repo = search_repository({'text': [{'_id': 1}]})
+        
+        results, total = repo.search_patients('12')
+        
+        assert repo.patients.searched[0] == 'id'
+        assert total == 1
+    
+    def test_count_overlaps_the_page(self):
+        """Test with an executor the total is counted on it while the page is fetched"""
+        repo = search_repository({'text': [{'_id': 1}, {'_id': 2}]})
+        count_documents = repo.patients.count_documents
+        counts = []
+        
+        def recording_count(query, limit=0):
+            counts.append((limit, threading.current_thread().name))
+            return count_documents(query, limit)
+        
+        repo.patients.count_documents = recording_count
+        with ThreadPoolExecutor(thread_name_prefix='mongo-query') as executor:
+            results, total = repo.search_patients('Private', per_page=1, executor=executor)
+        
+        assert (len(results), total) == (1, 2)
+        assert counts[0] == (1, threading.current_thread().name)
+        assert counts[1][0] == SEARCH_RESULT_LIMIT
+        assert counts[1][1].startswith('mongo-query')
+    
+    def test_missing_text_index(self):
+        """Test search still works, by substring, when the text index is missing"""
+        repo = search_repository({'substring': [{'_id': 1}]}, text_index=False)
+        
+        results, total = repo.search_patients('Private')
+        
+        assert (results, total) == ([{'_id': '1'}], 1)
+    
+    def test_other_errors_are_raised(self):
+        """Test failures other than a missing index are not reported as no results"""
+        def count_documents(query, limit=0):
+            raise OperationFailure('operation exceeded time limit', code=50)
+        
+        repo = search_repository({})
+        repo.patients.count_documents = count_documents
+        
+        with pytest.raises(OperationFailure):
+            repo.search_patients('Private')
+    
+    def test_export_uses_the_search_fallback(self):
+        """Test export selects patients with the same filter search would use"""
+        repo = search_repository({'substring': [{'_id': 1}]}, text_index=False)
+        exported = []
+        repo.iter_patients = lambda query, projection, batch_size: exported.append(query) or iter([])
+        
+        PatientService(repo).export_patients('Priv')
+        
+        assert exported == [substring_search_filter('Priv')]
+    
+    def test_export_query_fails_before_streaming(self):
+        """Test a failing export filter is raised when the export is requested, not mid-stream"""
+        def count_documents(query, limit=0):
+            raise OperationFailure('operation exceeded time limit', code=50)
+        
+        repo = search_repository({})
+        repo.patients.count_documents = count_documents
+        
+        with pytest.raises(OperationFailure):
+            PatientService(repo).export_patients('Private')
+
+class TestExplainPlan:
+    """Test explain plan inspection"""
+    
+    def test_plan_stages(self):
+        """Test stages are collected from nested plans"""
+        plan = {
+            'stage': 'LIMIT',
+            'inputStage': {
+                'stage': 'FETCH',
+                'inputStage': {'stage': 'IXSCAN', 'indexName': 'created_at_-1__id_-1'}
+            }
+        }
+        assert _plan_stages(plan) == ['LIMIT', 'FETCH', 'IXSCAN']
+    
+    def test_collscan_in_or_branch(self):
+        """Test collection scans inside $or branches are found"""
+        plan = {'stage': 'SUBPLAN', 'inputStages': [{'stage': 'IXSCAN'}, {'stage': 'COLLSCAN'}]}
+        assert 'COLLSCAN' in _plan_stages(plan)
@@ -0,0 +1,169 @@
+"""
+Unit tests for the patient service
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from bson.objectid import ObjectId
+from pymongo import DeleteOne, InsertOne, UpdateOne
+
+from app.security.encryption import EncryptionService
+from app.services import patient_service
+from app.services.patient_service import PatientService
+
+def make_patient(record_id, **fields):
+    """A valid patient record"""
+    return {
+        'id': record_id, 'gender': 'Male', 'age': 40, 'hypertension': 0, 'heart_disease': 0,
+        'ever_married': 'Yes', 'work_type': 'Private', 'Residence_type': 'Urban',
+        'avg_glucose_level': 100, 'bmi': 25, 'smoking_status': 'never smoked', 'stroke': 0,
+        **fields
+    }
+
+class FakeRepository:
+    """In-memory patient repository that records its queries"""
+
+    def __init__(self, patients=()):
+        self.patients = {patient['_id']: patient for patient in patients}
+        self.queries = []
+        self.deltas = []
+        self.invalidated = False
+
+    def find_record_ids(self, record_ids):
+        self.queries.append(('find_record_ids', sorted(record_ids)))
+        return {patient['id'] for patient in self.patients.values()} & set(record_ids)
+
+    def get_patients_by_ids(self, patient_ids):
+        self.queries.append(('get_patients_by_ids', len(patient_ids)))
+        return {str(_id): dict(patient) for _id, patient in self.patients.items() if str(_id) in patient_ids}
+
+    def bulk_write(self, operations):
+        self.queries.append(('bulk_write', len(operations)))
+        counts = {'inserted': 0, 'matched': 0, 'modified': 0, 'deleted': 0}
+        errors = {}
+        for position, operation in enumerate(operations):
+            document = getattr(operation, '_doc', None)
+            if isinstance(operation, InsertOne):
+                if any(patient['id'] == document['id'] for patient in self.patients.values()):
+                    errors[position] = {'index': position, 'code': 11000, 'errmsg': 'E11000 duplicate key'}
+                    continue
+                self.patients[document['_id']] = document
+                counts['inserted'] += 1
+            elif isinstance(operation, UpdateOne):
+                self.patients[operation._filter['_id']].update(document['$set'])
+                counts['matched'] += 1
+                counts['modified'] += 1
+            elif isinstance(operation, DeleteOne):
+                del self.patients[operation._filter['_id']]
+                counts['deleted'] += 1
+        return counts, errors
+
+    def increment_statistics(self, delta):
+        self.deltas.append(delta)
+        return True
+
+    def invalidate_statistics(self):
+        self.invalidated = True
+
+    def count_patients(self, query=None, strategy='exact'):
+        self.queries.append(('count_patients', threading.current_thread().name))
+        return len(self.patients)
+
+    def get_patients_page(self, limit=20, after=None, before=None, projection=None):
+        self.queries.append(('get_patients_page', threading.current_thread().name))
+        return [dict(patient) for patient in self.patients.values()][:limit], None, None
+
+class TestBulkPatients:
+    """Test bulk create, update and delete"""
+
+    def test_bulk_create_reports_each_item(self):
+        """Test one lookup and one write create the valid, unique patients"""
+        existing = make_patient(1, _id=ObjectId())
+        repo = FakeRepository([existing])
+        items = [make_patient(2), make_patient(1), make_patient(3, gender='Robot'), make_patient(2), 'x']
+
+        results = PatientService(repo).bulk_create_patients(items, 'tester')
+
+        assert [result['status'] for result in results] == ['created', 'duplicate', 'invalid', 'duplicate', 'invalid']
+        assert [result['index'] for result in results] == [0, 1, 2, 3, 4]
+        assert repo.queries == [('find_record_ids', [1, 2]), ('bulk_write', 1)]
+        assert repo.patients[ObjectId(results[0]['patient_id'])]['created_by'] == 'tester'
+        assert repo.deltas[0]['total'] == 1
+
+    def test_bulk_create_rejects_fractional_ids(self):
+        """Test ids that aren't whole numbers are invalid instead of being truncated"""
+        repo = FakeRepository()
+        items = [make_patient(12.7), make_patient('12.7'), make_patient(True), make_patient(13.0), make_patient(' 14 ')]
+
+        results = PatientService(repo).bulk_create_patients(items, 'tester')
+
+        assert [result['status'] for result in results] == ['invalid', 'invalid', 'invalid', 'created', 'created']
+        assert sorted(patient['id'] for patient in repo.patients.values()) == [13, 14]
+
+    def test_bulk_update_validates_merged_patient(self):
+        """Test partial updates are checked against the stored patient"""
+        patients = [make_patient(i, _id=ObjectId()) for i in range(3)]
+        repo = FakeRepository(patients)
+        items = [
+            {'patient_id': str(patients[0]['_id']), 'stroke': 1},
+            {'patient_id': str(patients[1]['_id']), 'age': 400},
+            {'patient_id': str(patients[2]['_id']), 'age': 40},
+            {'patient_id': str(ObjectId()), 'age': 50},
+            {'patient_id': str(patients[0]['_id']), 'id': 9}
+        ]
+
+        results = PatientService(repo).bulk_update_patients(items, 'tester')
+
+        assert [result['status'] for result in results] == ['updated', 'invalid', 'unchanged', 'not_found', 'invalid']
+        assert repo.queries == [('get_patients_by_ids', 4), ('bulk_write', 1)]
+        assert repo.patients[patients[0]['_id']]['stroke'] == 1
+        assert repo.deltas == [{'stroke': 1}]
+
+    def test_bulk_update_compares_encrypted_fields_as_plaintext(self, monkeypatch):
+        """Test resending a stored email is 'unchanged' rather than re-encrypted"""
+        encryption = EncryptionService(EncryptionService.generate_key())
+        monkeypatch.setattr(patient_service, 'encryption_service', encryption)
+        patient = make_patient(1, _id=ObjectId(), email=encryption.encrypt('ann@example.com'))
+        repo = FakeRepository([patient])
+
+        results = PatientService(repo).bulk_update_patients(
+            [{'patient_id': str(patient['_id']), 'email': 'ann@example.com'}], 'tester'
+        )
+
+        assert results[0]['status'] == 'unchanged'
+        assert repo.queries == [('get_patients_by_ids', 1)]
+
+    def test_bulk_delete(self):
+        """Test deleted patients are removed from the statistics"""
+        patients = [make_patient(i, _id=ObjectId(), stroke=1) for i in range(2)]
+        repo = FakeRepository(patients)
+        ids = [str(patients[0]['_id']), str(patients[1]['_id']), str(ObjectId()), 'nope']
+
+        results = PatientService(repo).bulk_delete_patients(ids, 'tester')
+
+        assert [result['status'] for result in results] == ['deleted', 'deleted', 'not_found', 'invalid']
+        assert repo.patients == {}
+        assert repo.deltas[0]['total'] == -2
+        assert repo.deltas[0]['stroke'] == -2
+
+class TestGetPatients:
+    """Test paginated listing"""
+
+    def test_count_runs_on_the_executor(self):
+        """Test the total is counted on the query pool while the page is fetched"""
+        repo = FakeRepository([make_patient(i, _id=ObjectId()) for i in range(3)])
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='query') as executor:
+            patients, total, page_info = PatientService(repo, executor=executor).get_patients(per_page=2)
+
+        assert (len(patients), total, page_info['has_next']) == (2, 3, False)
+        assert dict(repo.queries) == {'count_patients': 'query_0',
+                                      'get_patients_page': threading.current_thread().name}
+
+    def test_without_executor(self):
+        """Test every query runs on the calling thread when there is no pool"""
+        repo = FakeRepository([make_patient(1, _id=ObjectId())])
+
+        _, total, _ = PatientService(repo).get_patients()
+
+        assert total == 1
+        assert {thread for _, thread in repo.queries} == {threading.current_thread().name}
@@ -1,10 +1,14 @@
 """
 Unit tests for security functions
 """
+import io
+import random
 import pytest
+import pandas as pd
 from app.security.validation import (
     validate_email, validate_username, sanitize_input,
-    validate_patient_data, validate_password_strength
+    validate_patient_data, validate_password_strength,
+    validate_patient_frame, frame_error_messages, sanitize_frame
 )
 from app.security.password import password_service
 
@@ -159,3 +163,60 @@ class TestPatientDataValidation:
             'stroke': 0
         }
 
+class TestPatientFrameValidation:
+    """Test column-wise patient validation matches the row validator"""
+    
+    FIELD_VALUES = {
+        'age': [45.0, -5, 150, 'abc', '67', None, float('nan'), 0, 120],
+        'gender': ['Male', 'Female', 'Other', 'Invalid', None, 1],
+        'hypertension': [0, 1, '0', '1', 2, 1.0, True, None],
+        'heart_disease': [0, 1, '1', 'yes', None],
+        'ever_married': ['Yes', 'No', 'yes', None],
+        'work_type': ['Private', 'Self-employed', 'Children', 'Teacher', None],
+        'Residence_type': ['Urban', 'Rural', 'City'],
+        'avg_glucose_level': [106.5, 600, -1, '99.5', 'high', float('nan')],
+        'bmi': [28.5, 101, 'N/A', float('nan'), '30'],
+        'smoking_status': ['never smoked', 'SMOKES', 'Unknown', 'sometimes', '<script>'],
+        'stroke': [0, 1, '0', 3, None]
+    }
+    
+    def _assert_matches_row_validator(self, frame):
+        """Messages per row must equal validate_patient_data on the records"""
+        expected = [validate_patient_data(record) for record in frame.to_dict('records')]
+        actual = [[] for _ in range(len(frame))]
+        for position, messages in frame_error_messages(validate_patient_frame(frame)):
+            actual[position] = messages
+        assert actual == expected
+    
+    def test_mixed_values_match_row_validator(self):
+        """Test mixed-type columns produce identical messages"""
+        rng = random.Random(42)
+        records = [
+            {field: rng.choice(values) for field, values in self.FIELD_VALUES.items()}
+            for _ in range(500)
+        ]
+        self._assert_matches_row_validator(pd.DataFrame(records, dtype=object))
+    
+    def test_csv_frame_matches_row_validator(self):
+        """Test typed columns read from CSV produce identical messages"""
+        csv = io.StringIO(
+            'id,gender,age,hypertension,heart_disease,ever_married,work_type,Residence_type,avg_glucose_level,bmi,smoking_status,stroke\n'
+            '1,Male,67,0,1,Yes,Private,Urban,228.69,36.6,formerly smoked,1\n'
+            '2,Female,61,0,0,Yes,Self-employed,Rural,202.21,N/A,never smoked,1\n'
+            '3,Robot,130,0,0,Maybe,Private,Urban,600,120,Unknown,0\n'
+        )
+        self._assert_matches_row_validator(pd.read_csv(csv))
+    
+    def test_missing_columns_use_row_defaults(self):
+        """Test absent columns are treated like missing dictionary keys"""
+        frame = pd.DataFrame({'gender': ['Male'], 'smoking_status': ['smokes']})
+        self._assert_matches_row_validator(frame)
+    
+    def test_sanitize_frame(self):
+        """Test only string values are escaped"""
+        frame = pd.DataFrame({'note': ['<b>', None, 5], 'age': [1.0, 2.0, 3.0]}, dtype=object)
+        sanitized = sanitize_frame(frame)
+        
+        assert sanitized['note'].tolist() == [sanitize_input('<b>'), None, 5]
+        assert sanitized['age'].tolist() == [1.0, 2.0, 3.0]
+        assert frame['note'][0] == '<b>'